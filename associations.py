@@ -0,0 +1,246 @@
+from sqlalchemy import select, insert, update, delete, exists, inspect, func, bindparam
+from models import (
+    db, Country, NetflixContent, Person, Genre,
+    ContentCountry, ContentPerson, ContentGenre, CountrySummary
+)
+from content_changes import on_content_change, on_content_rebuild, content_batches
+from summaries import upsert_counts
+
+# Роли в ContentPerson
+DIRECTOR = 'director'
+CAST = 'cast'
+
+# Ограничение на число параметров в одном IN (...) для SQLite
+IN_CHUNK_SIZE = 500
+
+# Количество записей контента, обрабатываемых за один шаг полного пересчёта
+REBUILD_BATCH_SIZE = 5000
+
+# Поля контента, из которых строятся связи
+ASSOCIATION_FIELDS = ('country_id', 'director', 'cast', 'listed_in')
+
+
+def chunked(items, size=IN_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def split_names(value):
+    # 'United States, India, France' -> ['United States', 'India', 'France'] без пустых значений и повторов
+    if not value:
+        return []
+    return list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+
+
+def column_key(model, field):
+    return inspect(model).columns[field].key
+
+
+def resolve_names(connection, model, names):
+    # Идентификаторы по названиям; недостающие строки справочника добавляются одним executemany
+    names = list(dict.fromkeys(names))
+    known = {}
+    for batch in chunked(names):
+        known.update(connection.execute(select(model.name, model.identifier).where(model.name.in_(batch))).all())
+    missing = [name for name in names if name not in known]
+    if missing:
+        name_key = column_key(model, 'name')
+        connection.execute(insert(model.__table__), [{name_key: name} for name in missing])
+        for batch in chunked(missing):
+            known.update(connection.execute(
+                select(model.name, model.identifier).where(model.name.in_(batch))
+            ).all())
+    return known
+
+
+def insert_links(connection, model, rows):
+    if rows:
+        keys = {field: column_key(model, field) for field in rows[0]}
+        connection.execute(insert(model.__table__), [
+            {keys[field]: value for field, value in row.items()} for row in rows
+        ])
+
+
+def add_links(connection, rows):
+    # rows — словари с полями show_id, country_id, director, cast, listed_in.
+    # Возвращает изменение количества контента по отдельным странам.
+    country_ids = {row['country_id'] for row in rows if row['country_id'] is not None}
+    country_names = {}
+    for batch in chunked(country_ids):
+        country_names.update(connection.execute(
+            select(Country.identifier, Country.name).where(Country.identifier.in_(batch))
+        ).all())
+
+    countries = {row['show_id']: split_names(country_names.get(row['country_id'])) for row in rows}
+    people = {row['show_id']: [(name, DIRECTOR) for name in split_names(row['director'])] +
+                              [(name, CAST) for name in split_names(row['cast'])] for row in rows}
+    genres = {row['show_id']: split_names(row['listed_in']) for row in rows}
+
+    country_map = resolve_names(connection, Country, (name for names in countries.values() for name in names))
+    person_map = resolve_names(connection, Person, (name for names in people.values() for name, _ in names))
+    genre_map = resolve_names(connection, Genre, (name for names in genres.values() for name in names))
+
+    # Разные названия могут вести к одной строке Country, поэтому пары (show_id, country_id) собираются во множество
+    country_links = {(show_id, country_map[name]) for show_id, names in countries.items() for name in names}
+    insert_links(connection, ContentCountry, [
+        {'show_id': show_id, 'country_id': country_id} for show_id, country_id in country_links
+    ])
+    insert_links(connection, ContentPerson, [
+        {'show_id': show_id, 'person_id': person_map[name], 'role': role}
+        for show_id, names in people.items() for name, role in names
+    ])
+    insert_links(connection, ContentGenre, [
+        {'show_id': show_id, 'genre_id': genre_map[name]}
+        for show_id, names in genres.items() for name in names
+    ])
+
+    deltas = {}
+    for _, country_id in country_links:
+        deltas[country_id] = deltas.get(country_id, 0) + 1
+    return deltas
+
+
+@on_content_change(ASSOCIATION_FIELDS)
+def apply_association_changes(connection, removed=(), added=()):
+    # Изменённая запись теряет все связи и получает их заново по новым значениям полей
+    country_deltas = {}
+    stale_people = set()
+    stale_genres = set()
+    for ids in chunked({row['show_id'] for row in removed}):
+        for country_id in connection.execute(
+                select(ContentCountry.country_id).where(ContentCountry.show_id.in_(ids))).scalars():
+            country_deltas[country_id] = country_deltas.get(country_id, 0) - 1
+        stale_people.update(connection.execute(
+            select(ContentPerson.person_id).where(ContentPerson.show_id.in_(ids))).scalars())
+        stale_genres.update(connection.execute(
+            select(ContentGenre.genre_id).where(ContentGenre.show_id.in_(ids))).scalars())
+        for model in (ContentCountry, ContentPerson, ContentGenre):
+            connection.execute(delete(model.__table__).where(model.show_id.in_(ids)))
+
+    if added:
+        for country_id, delta in add_links(connection, added).items():
+            country_deltas[country_id] = country_deltas.get(country_id, 0) + delta
+
+    upsert_counts(connection, CountrySummary, ('country_id',), [
+        {'country_id': country_id, 'content_count': count}
+        for country_id, count in country_deltas.items() if count
+    ])
+
+    # Персоны и жанры существуют только как значения полей контента; без связей они удаляются
+    for model, column, stale in ((Person, ContentPerson.person_id, stale_people),
+                                 (Genre, ContentGenre.genre_id, stale_genres)):
+        for ids in chunked(stale):
+            connection.execute(delete(model.__table__).where(
+                model.identifier.in_(ids),
+                ~exists().where(column == model.identifier)
+            ))
+
+
+@on_content_rebuild
+def rebuild_associations(connection):
+    # Полный пересчёт связей; используется после полной загрузки CSV
+    for model in (ContentCountry, ContentPerson, ContentGenre, CountrySummary, Person, Genre):
+        connection.execute(delete(model.__table__))
+
+    for rows in content_batches(connection, ('show_id',) + ASSOCIATION_FIELDS, REBUILD_BATCH_SIZE):
+        add_links(connection, rows)
+
+    connection.execute(insert(CountrySummary.__table__).from_select(
+        [CountrySummary.country_id, CountrySummary.content_count],
+        select(
+            ContentCountry.country_id,
+            func.count()
+        ).group_by(
+            ContentCountry.country_id
+        )
+    ))
+
+
+def rederive_associations(connection, show_ids):
+    # Пересчёт связей указанных записей по текущим значениям полей: та же процедура, что при изменении записи
+    rows = []
+    columns = [NetflixContent.show_id.label('show_id')] + [
+        getattr(NetflixContent, field).label(field) for field in ASSOCIATION_FIELDS
+    ]
+    for ids in chunked(show_ids):
+        rows.extend(row._asdict() for row in connection.execute(
+            select(*columns).where(NetflixContent.show_id.in_(ids))
+        ))
+    if rows:
+        apply_association_changes(connection, rows, rows)
+
+
+def replace_country_name(connection, country_id, old_name, new_name):
+    # Вызывается после переименования (new_name) или удаления (new_name=None) строки справочника стран.
+    # Составные названия стран контента вроде "United States, India" содержат отдельные страны по названию,
+    # поэтому в них заменяется или убирается old_name, после чего связи затронутых записей строятся заново.
+    # Если новое составное название уже есть в справочнике, записи переводятся на эту строку
+    if old_name == new_name:
+        return
+    affected = set(connection.execute(
+        select(ContentCountry.show_id).where(ContentCountry.country_id == country_id)
+    ).scalars())
+    affected.update(connection.execute(
+        select(NetflixContent.show_id).where(NetflixContent.country_id == country_id)
+    ).scalars())
+
+    combos = set()
+    for ids in chunked(affected):
+        combos.update(connection.execute(
+            select(NetflixContent.country_id).where(
+                NetflixContent.show_id.in_(ids), NetflixContent.country_id != country_id
+            ).distinct()
+        ).scalars())
+    combo_names = {}
+    for ids in chunked(combos):
+        combo_names.update(connection.execute(
+            select(Country.identifier, Country.name).where(Country.identifier.in_(ids))
+        ).all())
+
+    renamed = {}
+    for combo_id, name in combo_names.items():
+        names = [new_name if part == old_name else part for part in split_names(name)
+                 if new_name is not None or part != old_name]
+        combo_name = ', '.join(dict.fromkeys(names))
+        if combo_name != name:
+            renamed[combo_id] = combo_name
+    existing = {}
+    for names in chunked({name for name in renamed.values() if name}):
+        existing.update(connection.execute(
+            select(Country.name, func.min(Country.identifier)).where(Country.name.in_(names)).group_by(Country.name)
+        ).all())
+
+    # Переименования и переводы записей на другую строку — по одному выражению на все строки (executemany)
+    names = []
+    moves = []
+    for combo_id, combo_name in renamed.items():
+        target_id = existing.get(combo_name)
+        if combo_name and (target_id is None or target_id == combo_id):
+            names.append({'combo_id': combo_id, 'combo_name': combo_name})
+        else:
+            moves.append({'combo_id': combo_id, 'target_id': target_id})
+    if names:
+        connection.execute(update(Country.__table__).where(
+            Country.identifier == bindparam('combo_id')
+        ).values({column_key(Country, 'name'): bindparam('combo_name')}), names)
+    if moves:
+        connection.execute(update(NetflixContent.__table__).where(
+            NetflixContent.country_id == bindparam('combo_id')
+        ).values({column_key(NetflixContent, 'country_id'): bindparam('target_id')}), moves)
+    for ids in chunked([move['combo_id'] for move in moves if move['target_id'] is not None]):
+        connection.execute(delete(Country.__table__).where(Country.identifier.in_(ids)))
+
+    rederive_associations(connection, affected)
+
+
+def ensure_associations():
+    # Базы, созданные до появления связей, заполняются при первом запуске
+    has_content = db.session.execute(select(NetflixContent.show_id).limit(1)).first() is not None
+    has_links = any(
+        db.session.execute(select(model.show_id).limit(1)).first() is not None
+        for model in (ContentCountry, ContentPerson, ContentGenre)
+    )
+    if has_content and not has_links:
+        rebuild_associations(db.session.connection())
+        db.session.commit()
@@ -0,0 +1,107 @@
+# Асинхронный режим для читающих эндпоинтов: ASGI-приложение на драйвере aiosqlite.
+# Запуск: uvicorn async_app:application --port 8000
+# Ждущие клиенты и запросы к базе не занимают поток: ожидание ввода-вывода — await в цикле событий,
+# соединения с базой — пул aiosqlite размером DATABASE_READ_POOL_SIZE.
+# Обработчики те же, что в structures/views.py (маршруты, ETag, кэш, формат JSON не меняются):
+# каждый выполняется в AsyncSession.run_sync, где db.session — синхронный фасад асинхронной сессии.
+# Изменяющие запросы и потоковая выгрузка остаются за синхронным приложением (app.py).
+from werkzeug.exceptions import NotFound, MethodNotAllowed
+from werkzeug.test import EnvironBuilder
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from config import app
+from models import db
+from database import READER, READ_METHODS, configure_sqlite
+from init_db import init_database
+import structures.views  # noqa: F401  регистрация маршрутов
+
+# Эндпоинты, которые асинхронный режим не обслуживает: HTML-страница и потоковая выгрузка
+SYNC_ONLY_ENDPOINTS = {'index', 'export_content', 'static'}
+
+
+def create_read_engine():
+    # Тот же файл базы, что у пула чтения Flask-SQLAlchemy (путь уже приведён к instance/), через aiosqlite
+    with app.app_context():
+        engine = db.engines.get(READER, db.engine)
+    read_engine = create_async_engine(
+        engine.url.set(drivername='sqlite+aiosqlite'),
+        pool_size=app.config['DATABASE_READ_POOL_SIZE'],
+        max_overflow=0,
+        pool_timeout=app.config['DATABASE_POOL_TIMEOUT'],
+    )
+    configure_sqlite(read_engine.sync_engine, app.config, readonly=True)
+    return read_engine
+
+
+read_engine = None
+
+
+def dispatch(session, environ):
+    # Выполняется в run_sync: ввод-вывод сессии уходит в aiosqlite, поток цикла событий не блокируется
+    with app.request_context(environ):
+        db.session.registry.set(session)
+        try:
+            response = app.full_dispatch_request()
+        except Exception as error:
+            response = app.handle_exception(error)
+        return response.status, response.headers.to_wsgi_list(), response.get_data()
+
+
+def plain_response(status, message):
+    return status, [('Content-Type', 'application/json')], app.json.dumps({'message': message}).encode()
+
+
+def environ_from_scope(scope):
+    builder = EnvironBuilder(
+        path=scope['path'],
+        query_string=scope['query_string'].decode('latin-1'),
+        method=scope['method'],
+        headers=[(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']],
+    )
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+async def handle(scope):
+    if scope['method'] not in READ_METHODS:
+        return plain_response('405 METHOD NOT ALLOWED', 'Изменения принимает синхронное приложение (app.py)')
+    try:
+        endpoint, _ = app.url_map.bind('localhost').match(scope['path'], method='GET')
+    except NotFound:
+        return plain_response('404 NOT FOUND', 'Не найдено')
+    except MethodNotAllowed:
+        return plain_response('405 METHOD NOT ALLOWED', 'Метод не поддерживается')
+    if endpoint in SYNC_ONLY_ENDPOINTS:
+        return plain_response('404 NOT FOUND', 'Эндпоинт доступен только в синхронном приложении (app.py)')
+    async with AsyncSession(read_engine) as session:
+        return await session.run_sync(dispatch, environ_from_scope(scope))
+
+
+async def lifespan(receive, send):
+    global read_engine
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            init_database()
+            read_engine = create_read_engine()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await read_engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    status, headers, body = await handle(scope)
+    await send({
+        'type': 'http.response.start',
+        'status': int(status.split()[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
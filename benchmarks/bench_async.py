@@ -0,0 +1,134 @@
+# Медленные клиенты: синхронный сервер Flask (поток на соединение) против async_app.py (uvicorn, aiosqlite).
+# Каждый клиент отправляет заголовки запроса с задержкой, как медленная сеть, и ждёт ответ.
+# Выводятся время, задержки и наибольшее число потоков ОС в процессе сервера.
+# Запуск из корня проекта: python benchmarks/bench_async.py [клиентов] [задержка, с]
+# Нужны uvicorn и aiosqlite
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROUTES = [
+    '/api/content?limit=20',
+    '/api/content-types',
+    '/api/genres?limit=50',
+    '/api/stats/content-by-country',
+    '/api/stats/query?group_by=type,rating&metric=count',
+]
+
+SYNC_SERVER = (
+    "import sys; sys.path.insert(0, {root!r}); "
+    "from app import app; from init_db import init_database; init_database(); "
+    "app.run(port={port}, threaded=True)"
+)
+ASYNC_SERVER = [sys.executable, '-m', 'uvicorn', 'async_app:application', '--log-level', 'warning', '--port']
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def thread_count(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('Threads:'):
+                return int(line.split()[1])
+    return 0
+
+
+async def wait_ready(port, deadline=60):
+    started = time.perf_counter()
+    while time.perf_counter() - started < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError('сервер не запустился')
+
+
+async def slow_client(port, route, delay):
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {route} HTTP/1.1\r\nHost: 127.0.0.1\r\n'.encode())
+    await writer.drain()
+    await asyncio.sleep(delay)
+    writer.write(b'Connection: close\r\n\r\n')
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response.startswith(b'HTTP/1.1 200') or response.startswith(b'HTTP/1.0 200'), time.perf_counter() - started
+
+
+async def sample_threads(pid, peak, stop):
+    while not stop.is_set():
+        peak[0] = max(peak[0], thread_count(pid))
+        await asyncio.sleep(0.05)
+
+
+async def run_clients(pid, port, clients, delay):
+    peak = [thread_count(pid)]
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_threads(pid, peak, stop))
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *[slow_client(port, ROUTES[number % len(ROUTES)], delay) for number in range(clients)],
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    latencies = sorted(latency for result in results if not isinstance(result, BaseException)
+                       for ok, latency in [result] if ok)
+    failed = clients - len(latencies)
+    return elapsed, latencies, failed, peak[0]
+
+
+def report(name, elapsed, latencies, failed, threads):
+    def percentile(percent):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))] if latencies else float('nan')
+    print(f"{name}: {elapsed:.2f} с, ответов {len(latencies)}, ошибок {failed}, "
+          f"p50 {percentile(50):.2f} с, p99 {percentile(99):.2f} с, потоков сервера до {threads}")
+
+
+def measure(name, command, port, clients, delay, env):
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_ready(port))
+        asyncio.run(run_clients(server.pid, port, len(ROUTES), 0))  # прогрев кэшей и пулов
+        report(name, *asyncio.run(run_clients(server.pid, port, clients, delay)))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+    # Серверы работают с временной копией базы, чтобы не трогать instance/dataset.db
+    work_dir = tempfile.mkdtemp(prefix='bench_async_')
+    shutil.copy(os.path.join(ROOT, 'instance', 'dataset.db'), work_dir)
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(work_dir, 'dataset.db'))
+    print(f"Клиентов: {clients}, задержка отправки запроса: {delay} с")
+
+    port = free_port()
+    measure('sync (Flask, поток на соединение)', [sys.executable, '-c', SYNC_SERVER.format(root=ROOT, port=port)],
+            port, clients, delay, env)
+    port = free_port()
+    measure('async (uvicorn + aiosqlite)', ASYNC_SERVER + [str(port)], port, clients, delay, env)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
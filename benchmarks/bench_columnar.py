@@ -0,0 +1,66 @@
+# Сравнение ответов /api/stats/* на SQL и на движке NumPy (columnar.py): совпадение и время.
+# Запуск из корня проекта: python benchmarks/bench_columnar.py [число повторов]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from columnar import np, columnar_engine
+from structures.cache import stats_cache
+
+ROUTES = [
+    '/api/stats/content-by-country',
+    '/api/stats/min-max-avg-duration',
+    '/api/stats/content-by-type-and-rating',
+    '/api/stats/avg-duration',
+    '/api/stats/min-duration',
+    '/api/stats/max-duration',
+    '/api/stats/histogram?measure=duration_minutes&type=Movie&width=10',
+    '/api/stats/histogram?measure=duration_seasons&type=TV%20Show&width=1',
+    '/api/stats/percentiles?measure=duration_minutes&by=type&p=50,90,99',
+    '/api/stats/percentiles?measure=year_added&p=0.1,50,100',
+    '/api/stats/percentiles?measure=release_year&by=rating&p=10,50,90',
+]
+
+
+def timed_get(client, route, repeats):
+    # Кэш результатов очищается, чтобы каждый запрос считался заново
+    timings = []
+    for _ in range(repeats):
+        stats_cache.entries.clear()
+        started = time.perf_counter()
+        response = client.get(route)
+        timings.append(time.perf_counter() - started)
+    return response.get_data(), min(timings)
+
+
+def main():
+    if np is None:
+        print("NumPy не установлен: движок недоступен")
+        sys.exit(1)
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    client = app.test_client()
+
+    different = 0
+    for route in ROUTES:
+        app.config["COLUMNAR_ENGINE"] = False
+        sql_data, sql_time = timed_get(client, route, repeats)
+        app.config["COLUMNAR_ENGINE"] = True
+        # Построение снимка (в фоне, до его готовности отвечает SQL) не входит в замер
+        client.get(route)
+        columnar_engine.wait()
+        numpy_data, numpy_time = timed_get(client, route, repeats)
+        same = sql_data == numpy_data
+        different += not same
+        print(f"{'ok' if same else '!!'} {route}")
+        print(f"   SQL: {sql_time * 1000:.2f} мс, NumPy: {numpy_time * 1000:.2f} мс (x{sql_time / numpy_time:.1f})")
+
+    if different:
+        print(f"Ответы различаются: {different}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# Чтение под нагрузкой записи: пропускная способность GET-запросов при разном числе потоков,
+# пока отдельный поток изменяет каталог через /api/content/bulk, и число ошибок "database is locked".
+# Запуск из корня проекта: python benchmarks/bench_concurrency.py [секунд на замер] [потоки через запятую]
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import app
+
+# Бенчмарк работает с временной копией базы, чтобы не трогать instance/dataset.db
+work_dir = tempfile.mkdtemp(prefix='bench_concurrency_')
+shutil.copy(os.path.join(app.instance_path, 'dataset.db'), work_dir)
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(work_dir, "dataset.db")
+
+import app as application  # noqa: F401  регистрация маршрутов
+from init_db import init_database
+from models import db, NetflixContent
+
+init_database()
+
+READ_ROUTES = [
+    '/api/content?limit=50',
+    '/api/content?type=Movie&limit=50',
+    '/api/search?q=love&limit=20',
+    '/api/genres?limit=100',
+]
+
+
+def show_ids(count):
+    with app.app_context():
+        return db.session.execute(db.select(NetflixContent.show_id).limit(count)).scalars().all()
+
+
+def reader(client, routes, deadline, results):
+    done = errors = 0
+    index = 0
+    while time.perf_counter() < deadline:
+        response = client.get(routes[index % len(routes)])
+        index += 1
+        if response.status_code == 200:
+            done += 1
+        else:
+            errors += 1
+    results.append((done, errors))
+
+
+def writer(client, ids, deadline, results):
+    # Изменение пакета из 50 записей раз в 20 мс
+    done = errors = 0
+    year = 2000
+    while time.perf_counter() < deadline:
+        year += 1
+        batch = ids[(done * 50) % len(ids):][:50]
+        response = client.put('/api/content/bulk', json=[
+            {'show_id': show_id, 'release_year': year % 50 + 1970} for show_id in batch
+        ])
+        if response.status_code == 200:
+            done += 1
+        else:
+            errors += 1
+        time.sleep(0.02)
+    results.append((done, errors))
+
+
+def measure(threads, seconds, ids):
+    # Каждый поток читает по своему списку маршрутов с уникальным параметром, чтобы обойти кэш результатов
+    deadline = time.perf_counter() + seconds
+    read_results = []
+    write_results = []
+    workers = [
+        threading.Thread(target=reader, args=(app.test_client(), [f'{route}&t={number}' for route in READ_ROUTES],
+                                              deadline, read_results))
+        for number in range(threads)
+    ]
+    workers.append(threading.Thread(target=writer, args=(app.test_client(), ids, deadline, write_results)))
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    reads = sum(done for done, _ in read_results)
+    read_errors = sum(errors for _, errors in read_results)
+    writes, write_errors = write_results[0]
+    return reads / seconds, read_errors, writes, write_errors
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    thread_counts = [int(value) for value in sys.argv[2].split(',')] if len(sys.argv) > 2 else [1, 2, 4, 8]
+    ids = show_ids(2000)
+    print(f"Пул чтения: {app.config['DATABASE_READ_POOL_SIZE']} соединений, "
+          f"journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+    for threads in thread_counts:
+        rate, read_errors, writes, write_errors = measure(threads, seconds, ids)
+        print(f"потоков {threads}: {rate:.0f} чтений/с, ошибок чтения {read_errors}; "
+              f"пакетов записи {writes}, ошибок записи {write_errors}")
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
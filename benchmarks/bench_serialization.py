@@ -0,0 +1,58 @@
+# Сравнение быстрой сериализации списка контента с выводом схемы marshmallow.
+# Запуск из корня проекта: python benchmarks/bench_serialization.py [число повторов]
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db, NetflixContent
+from structures.serializers import contents_schema, dump_contents, content_query
+
+
+def schema_path():
+    return contents_schema.dump(NetflixContent.query.all())
+
+
+def fast_path():
+    return dump_contents(db.session.execute(content_query()).all())
+
+
+def best_of(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with app.test_request_context():
+        expected = json.dumps(schema_path(), sort_keys=True)
+        actual = json.dumps(fast_path(), sort_keys=True)
+        if expected != actual:
+            print("Результаты сериализации различаются!")
+            sys.exit(1)
+
+        schema_time = best_of(schema_path, repeats)
+        fast_time = best_of(fast_path, repeats)
+
+    client = app.test_client()
+    started = time.perf_counter()
+    for _ in range(repeats):
+        client.get('/api/content')
+    endpoint_time = (time.perf_counter() - started) / repeats
+
+    print(f"Записей: {len(json.loads(actual))}")
+    print(f"marshmallow + ленивые связи: {schema_time * 1000:.1f} мс")
+    print(f"быстрый путь + один JOIN:    {fast_time * 1000:.1f} мс (x{schema_time / fast_time:.1f})")
+    print(f"GET /api/content целиком:    {endpoint_time * 1000:.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+# Набор бенчмарков на синтетических каталогах (generate_catalog.py): загрузка CSV, каждый запрос главной
+# страницы, сама главная страница и маршруты API на свежей базе для каждого размера каталога.
+# Результаты пишутся в JSON; с --compare новый прогон сравнивается с прежним, замедление выше порога — код 1.
+# Запуск из корня проекта:
+#   python benchmarks/bench_suite.py [--sizes 10000,100000,1000000] [--repeats 5] [--output путь.json]
+#                                    [--compare прежний.json] [--threshold 1.25] [--min-delta 0.001] [--seed 0]
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_SIZES = [10000, 100000]
+
+ROUTES = [
+    '/api/content?limit=50',
+    '/api/content?fields=show_id,title,release_year&after=s5000&limit=50',
+    '/api/content/s1',
+    '/api/content-types',
+    '/api/countries?limit=100',
+    '/api/ratings',
+    '/api/genres?limit=100',
+    # Имя подставляется после загрузки: персоны генерируются, точное совпадение нужно с существующей
+    '/api/people?name={person}&limit=50',
+    '/api/search?q=love&limit=20',
+    '/api/stats/content-by-country',
+    '/api/stats/min-max-avg-duration',
+    '/api/stats/content-by-type-and-rating',
+    '/api/stats/avg-duration',
+    '/api/stats/min-duration',
+    '/api/stats/max-duration',
+    '/api/stats/histogram?measure=duration_minutes&type=Movie&width=10',
+    '/api/stats/percentiles?measure=duration_minutes&by=type&p=50,90,99',
+    '/api/stats/query?group_by=type,rating&metric=count,avg:duration_minutes',
+    '/api/stats/query?group_by=country&metric=count&order_by=-count&limit=10',
+    '/api/stats/percentiles?measure=duration_minutes&by=type&exact=0',
+    '/api/stats/top?measure=duration_minutes&by=rating&k=10',
+    '/api/dashboard/content-types',
+    '/api/dashboard/countries',
+    '/api/dashboard/ratings',
+]
+
+
+def timings(function, repeats):
+    values = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        values.append(time.perf_counter() - started)
+    return {'min': min(values), 'median': statistics.median(values)}
+
+
+def run_size(csv_path, repeats):
+    # Выполняется в отдельном процессе: база из DATABASE_URL создаётся с нуля
+    from app import app
+    from init_db import init_database
+    from sqlalchemy import func, select
+    from models import db, ContentType, Person, ContentPerson
+    from upload_db import upload_data_from_csv
+    from structures.cache import stats_cache
+    from columnar import columnar_engine
+    from structures.dashboard import DASHBOARD_QUERIES, fragment_cache
+
+    init_database()
+    results = {}
+    with app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        upload_data_from_csv(csv_path)
+        results['import'] = time.perf_counter() - started
+
+    with app.app_context():
+        type_ids = {content_type.name: content_type.identifier for content_type in ContentType.query.all()}
+        results['dashboard'] = {
+            f'{name} ({query.__name__})': timings(lambda: query(type_ids), repeats)
+            for name, query in DASHBOARD_QUERIES.items()
+        }
+        person = db.session.execute(
+            select(Person.name).join(ContentPerson, ContentPerson.person_id == Person.identifier)
+            .group_by(Person.identifier).order_by(func.count().desc(), Person.name).limit(1)
+        ).scalar()
+        db.session.remove()
+
+    # Кэши результатов и фрагментов очищаются перед каждым запросом, чтобы замерялся расчёт, а не кэш
+    client = app.test_client()
+
+    def get(route):
+        stats_cache.entries.clear()
+        fragment_cache.entries.clear()
+        response = client.get(route)
+        if response.status_code != 200:
+            raise RuntimeError(f'{route}: {response.status_code}')
+
+    results['index'] = timings(lambda: get('/'), repeats)
+    # Главная страница из кэша фрагментов
+    results['index_cached'] = timings(lambda: client.get('/'), repeats)
+    results['routes'] = {}
+    for route in ROUTES:
+        url = route.format(person=quote(person or ''))
+        # Первый запрос запускает построение снимка NumPy и прогревает кэш страниц SQLite
+        get(url)
+        columnar_engine.wait()
+        results['routes'][route] = timings(lambda: get(url), repeats)
+    return results
+
+
+def measure_size(size, seed, repeats):
+    from benchmarks.generate_catalog import write_catalog
+
+    work_dir = tempfile.mkdtemp(prefix=f'bench_suite_{size}_')
+    try:
+        csv_path = os.path.join(work_dir, 'catalog.csv')
+        started = time.perf_counter()
+        write_catalog(csv_path, size, seed)
+        generated = time.perf_counter() - started
+
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(work_dir, 'dataset.db'))
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run-size', csv_path, '--repeats', str(repeats)],
+            cwd=ROOT, env=env, check=True, capture_output=True, text=True
+        ).stdout
+        results = json.loads(output.strip().splitlines()[-1])
+        results['generate'] = generated
+        results['database_bytes'] = os.path.getsize(os.path.join(work_dir, 'dataset.db'))
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metrics(results):
+    # Плоский список (название, секунды) для сравнения прогонов: лучшее время из повторов меньше зависит от шума
+    for size, result in results.items():
+        yield f'{size} import', result['import']
+        yield f'{size} index', result['index']['min']
+        if 'index_cached' in result:
+            yield f'{size} index_cached', result['index_cached']['min']
+        for group in ('dashboard', 'routes'):
+            for name, value in result[group].items():
+                yield f'{size} {name}', value['min']
+
+
+def compare(current, previous_path, threshold, min_delta):
+    with open(previous_path, encoding='utf-8') as previous_file:
+        previous = dict(metrics(json.load(previous_file)['results']))
+    regressions = 0
+    for name, value in metrics(current):
+        before = previous.get(name)
+        if before and value / before > threshold and value - before > min_delta:
+            regressions += 1
+            print(f'!! {name}: {before * 1000:.2f} мс -> {value * 1000:.2f} мс (x{value / before:.2f})')
+    print(f'Замедлений больше чем в {threshold} раза: {regressions}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)))
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    parser.add_argument('--compare')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    # Разница меньше этой (в секундах) не считается замедлением: шум измерений быстрых запросов
+    parser.add_argument('--min-delta', type=float, default=0.001)
+    parser.add_argument('--run-size', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size:
+        print(json.dumps(run_size(args.run_size, args.repeats)))
+        return
+
+    results = {}
+    for size in [int(value) for value in args.sizes.split(',')]:
+        results[str(size)] = result = measure_size(size, args.seed, args.repeats)
+        print(f"{size} строк: генерация {result['generate']:.2f} с, загрузка {result['import']:.2f} с, "
+              f"главная страница {result['index']['median'] * 1000:.1f} мс")
+        for group in ('dashboard', 'routes'):
+            for name, value in result[group].items():
+                print(f"   {name}: {value['median'] * 1000:.2f} мс")
+
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as output_file:
+        json.dump({
+            'commit': git_commit(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeats': args.repeats,
+            'results': results,
+        }, output_file, ensure_ascii=False, indent=2)
+    print(f'Результаты: {output}')
+
+    if args.compare and compare(results, args.compare, args.threshold, args.min_delta):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
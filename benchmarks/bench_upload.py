@@ -0,0 +1,146 @@
+# Сравнение пакетного загрузчика upload_data_from_csv с прежней построчной загрузкой через ORM.
+# Запуск из корня проекта: python benchmarks/bench_upload.py [путь к csv] [число повторов]
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import app
+
+# Бенчмарк работает с временной копией базы, чтобы не трогать instance/dataset.db
+work_dir = tempfile.mkdtemp(prefix='bench_upload_')
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(work_dir, "dataset.db")
+
+from init_db import init_database
+from models import db, ContentType, Country, Rating, NetflixContent
+
+from upload_db import upload_data_from_csv
+
+init_database()
+
+
+def legacy_upload_data_from_csv(path):
+    # Прежний вариант загрузки: объект ORM на строку и commit на каждое новое значение справочника
+    import csv
+
+    db.session.query(NetflixContent).delete()
+    db.session.query(ContentType).delete()
+    db.session.query(Country).delete()
+    db.session.query(Rating).delete()
+    db.session.commit()
+
+    content_types = {}
+    countries = {}
+    ratings = {}
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            type_name = row['type'].strip() if row['type'] else 'Неизвестно'
+            if type_name not in content_types:
+                content_type = ContentType(type_name)
+                db.session.add(content_type)
+                db.session.commit()
+                content_types[type_name] = content_type
+
+            country_name = row['country'].strip() if row['country'] else None
+            country_id = None
+            if country_name:
+                if country_name not in countries:
+                    country = Country(country_name)
+                    db.session.add(country)
+                    db.session.commit()
+                    countries[country_name] = country
+                country_id = countries[country_name].identifier
+
+            rating_name = row['rating'].strip() if row['rating'] else 'Не указан'
+            if rating_name not in ratings:
+                rating = Rating(rating_name)
+                db.session.add(rating)
+                db.session.commit()
+                ratings[rating_name] = rating
+
+            date_added = None
+            if row['date_added'] and row['date_added'].strip():
+                try:
+                    date_added = datetime.strptime(row['date_added'].strip(), '%B %d, %Y').date()
+                except ValueError:
+                    try:
+                        date_added = datetime.strptime(row['date_added'].strip(), '%Y-%m-%d').date()
+                    except ValueError:
+                        print(f"Не удалось обработать дату: {row['date_added']}")
+
+            release_year = None
+            if row['release_year'] and row['release_year'].strip():
+                try:
+                    release_year = int(row['release_year'])
+                except ValueError:
+                    print(f"Не удалось обработать год: {row['release_year']}")
+
+            duration_minutes = None
+            duration_seasons = None
+            if row['duration'] and row['duration'].strip():
+                duration = row['duration'].strip()
+                if 'min' in duration:
+                    try:
+                        duration_minutes = int(duration.replace('min', '').strip())
+                    except ValueError:
+                        print(f"Не удалось обработать длительность в минутах: {duration}")
+                elif 'Season' in duration or 'Seasons' in duration:
+                    try:
+                        duration_seasons = int(duration.replace('Seasons', '').replace('Season', '').strip())
+                    except ValueError:
+                        print(f"Не удалось обработать количество сезонов: {duration}")
+
+            db.session.add(NetflixContent(
+                show_id=row['show_id'].strip(),
+                title=row['title'].strip(),
+                type_id=content_types[type_name].identifier,
+                director=row['director'].strip() if row['director'] else None,
+                cast=row['cast'].strip() if row['cast'] else None,
+                country_id=country_id,
+                date_added=date_added,
+                release_year=release_year,
+                rating_id=ratings[rating_name].identifier,
+                duration_minutes=duration_minutes,
+                duration_seasons=duration_seasons
+            ))
+            print(f"Добавлен контент: {row['title']}")
+
+        db.session.commit()
+
+
+def measure(loader, path, repeats):
+    timings = []
+    for _ in range(repeats):
+        with app.app_context():
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                loader(path)
+            timings.append(time.perf_counter() - started)
+    return min(timings), sum(timings) / len(timings)
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/netflix_titles.csv"
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    try:
+        legacy_best, legacy_avg = measure(legacy_upload_data_from_csv, path, repeats)
+        bulk_best, bulk_avg = measure(upload_data_from_csv, path, repeats)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Файл: {path}, повторов: {repeats}")
+    print(f"Построчная загрузка: лучшее {legacy_best:.3f} с, среднее {legacy_avg:.3f} с")
+    print(f"Пакетная загрузка:   лучшее {bulk_best:.3f} с, среднее {bulk_avg:.3f} с")
+    print(f"Ускорение: x{legacy_best / bulk_best:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Проверка планов запросов главной страницы и /api/stats/*: EXPLAIN QUERY PLAN для каждого
+# выполненного SQL-запроса и поиск полных просмотров таблицы контента без индекса.
+# Запуск из корня проекта: python benchmarks/check_query_plans.py
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from config import app
+
+# Проверка выполняется на копии базы: init_database применяет к ней миграции
+work_dir = tempfile.mkdtemp(prefix='check_plans_')
+shutil.copy(os.path.join(app.instance_path, 'dataset.db'), os.path.join(work_dir, 'dataset.db'))
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(work_dir, "dataset.db")
+# Проверяются планы SQL-пути /api/stats/*, поэтому движок на NumPy выключается
+app.config["COLUMNAR_ENGINE"] = False
+
+import app as application  # noqa: F401  регистрация маршрутов
+from init_db import init_database
+from models import db, NetflixContent
+
+ROUTES = [
+    '/',
+    '/api/stats/content-by-country',
+    '/api/stats/min-max-avg-duration',
+    '/api/stats/content-by-type-and-rating',
+    '/api/stats/avg-duration',
+    '/api/stats/min-duration',
+    '/api/stats/max-duration',
+]
+
+CONTENT_TABLE = NetflixContent.__tablename__
+
+
+def is_full_scan(detail):
+    # 'SCAN Контент' — просмотр всей таблицы; 'SCAN Контент USING ... INDEX' — просмотр индекса
+    return detail.startswith('SCAN') and CONTENT_TABLE in detail and 'USING' not in detail
+
+
+def main():
+    init_database()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and CONTENT_TABLE in statement:
+            statements.append((statement, parameters))
+
+    full_scans = 0
+    try:
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            client = app.test_client()
+            for route in ROUTES:
+                statements.clear()
+                client.get(route)
+                print(f"== {route}")
+                for statement, parameters in list(statements):
+                    with db.engine.connect() as connection:
+                        plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+                    print('   ' + ' '.join(statement.split())[:110])
+                    for _, _, _, detail in plan:
+                        marker = '!!' if is_full_scan(detail) else '  '
+                        full_scans += is_full_scan(detail)
+                        print(f"   {marker} {detail}")
+            event.remove(db.engine, 'before_cursor_execute', capture)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if full_scans:
+        print(f"Полных просмотров таблицы {CONTENT_TABLE}: {full_scans}")
+        sys.exit(1)
+    print("Все запросы используют индексы")
+
+
+if __name__ == '__main__':
+    main()
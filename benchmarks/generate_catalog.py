@@ -0,0 +1,112 @@
+# Генератор синтетического каталога в формате data/netflix_titles.csv для бенчмарков.
+# Распределения берутся из исходного CSV: строка-образец задаёт тип, страну, рейтинг, длительность и жанры
+# (с их совместным распределением), остальные поля собираются из словарей исходных значений.
+# Режиссёров и актёров тем больше, чем больше каталог, как в реальных данных.
+# Строки пишутся потоком, без накопления в памяти; при одном seed вывод одинаков.
+# Запуск из корня проекта: python benchmarks/generate_catalog.py <число строк> <путь к csv> [seed]
+import csv
+import os
+import random
+import re
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_PATH = os.path.join(ROOT, 'data', 'netflix_titles.csv')
+
+FIELDS = ['show_id', 'type', 'title', 'director', 'cast', 'country', 'date_added',
+          'release_year', 'rating', 'duration', 'listed_in', 'description']
+
+# Доля персон из исходного CSV; остальные — новые сочетания имён и фамилий
+KNOWN_PEOPLE_SHARE = 0.5
+
+
+class CatalogModel:
+    # Образцы строк и словари значений исходного CSV
+    def __init__(self, path=SOURCE_PATH):
+        with open(path, encoding='utf-8', newline='') as source:
+            self.rows = list(csv.DictReader(source))
+        self.dates_added = [row['date_added'].strip() for row in self.rows]
+        self.release_years = [row['release_year'] for row in self.rows]
+        self.descriptions = [row['description'] for row in self.rows]
+        self.title_words = [word for row in self.rows for word in row['title'].split()]
+        people = {name.strip() for row in self.rows for field in ('director', 'cast')
+                  for name in row[field].split(',') if name.strip()}
+        self.people = sorted(people)
+        self.first_names = sorted({name.split()[0] for name in people})
+        self.last_names = sorted({name.split()[-1] for name in people if len(name.split()) > 1})
+
+    def person(self, rng):
+        if rng.random() < KNOWN_PEOPLE_SHARE:
+            return rng.choice(self.people)
+        return f'{rng.choice(self.first_names)} {rng.choice(self.last_names)}'
+
+    def people_field(self, rng, sample):
+        # Сохраняется число имён образца и пустые значения
+        count = len([name for name in sample.split(',') if name.strip()])
+        return ', '.join(dict.fromkeys(self.person(rng) for _ in range(count)))
+
+    def title(self, rng, number):
+        words = [rng.choice(self.title_words) for _ in range(rng.randint(1, 4))]
+        # Часть названий повторяется с номером, как продолжения и сезоны
+        if number % 7 == 0:
+            words.append(str(rng.randint(2, 9)))
+        return ' '.join(words)
+
+    def shifted_year(self, rng, year, date_added):
+        # Год выпуска образца со случайным сдвигом, не позже года добавления
+        if not year.isdigit():
+            return year
+        value = int(year) + rng.choice((-2, -1, 0, 0, 0, 1))
+        added = re.search(r'\d{4}$', date_added)
+        if added:
+            value = min(value, int(added.group()))
+        return str(value)
+
+    def row(self, rng, number):
+        sample = rng.choice(self.rows)
+        date_added = rng.choice(self.dates_added)
+        return {
+            'show_id': f's{number}',
+            'type': sample['type'],
+            'title': self.title(rng, number),
+            'director': self.people_field(rng, sample['director']),
+            'cast': self.people_field(rng, sample['cast']),
+            'country': sample['country'],
+            'date_added': date_added,
+            'release_year': self.shifted_year(rng, rng.choice(self.release_years), date_added),
+            'rating': sample['rating'],
+            'duration': sample['duration'],
+            'listed_in': sample['listed_in'],
+            'description': rng.choice(self.descriptions),
+        }
+
+
+def generate_rows(count, seed=0, model=None):
+    model = model or CatalogModel()
+    rng = random.Random(seed)
+    for number in range(1, count + 1):
+        yield model.row(rng, number)
+
+
+def write_catalog(path, count, seed=0):
+    with open(path, 'w', encoding='utf-8', newline='') as target:
+        writer = csv.DictWriter(target, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in generate_rows(count, seed):
+            writer.writerow(row)
+
+
+def main():
+    if len(sys.argv) < 3:
+        print('Использование: python benchmarks/generate_catalog.py <число строк> <путь к csv> [seed]')
+        sys.exit(1)
+    count = int(sys.argv[1])
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    started = datetime.now()
+    write_catalog(sys.argv[2], count, seed)
+    print(f'Записано строк: {count} в {sys.argv[2]} за {(datetime.now() - started).total_seconds():.2f} с')
+
+
+if __name__ == '__main__':
+    main()
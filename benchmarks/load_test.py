@@ -0,0 +1,294 @@
+# Нагрузочный тест по HTTP: запускает приложение локально на копии базы и подаёт смешанный поток чтения и записи
+# из нескольких клиентов. Выводит пропускную способность, задержки p50/p95/p99 и долю ошибок по операциям,
+# а также число ошибок блокировки SQLite ("database is locked") в журнале сервера.
+# Запуск из корня проекта:
+#   python benchmarks/load_test.py [--clients 16] [--duration 20] [--mix mixed | index=1,content_list=5,update=1]
+#                                  [--env SQLITE_JOURNAL_MODE=DELETE] [--server-command "..."] [--url http://...]
+#                                  [--output результаты.json]
+# --env задаёт переменные окружения сервера (профиль базы в config.py), --server-command — другой сервер
+# (по умолчанию встроенный многопоточный сервер Flask), --url — уже запущенный сервер без копии базы.
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FLASK_SERVER = (
+    "import sys; sys.path.insert(0, {root!r}); "
+    "from app import app; from init_db import init_database; init_database(); "
+    "app.run(host='127.0.0.1', port={port}, threaded=True)"
+)
+
+# Строка журнала сервера при ошибке блокировки
+LOCK_ERROR = 'database is locked'
+
+
+class Workload:
+    # Операции нагрузки: название -> функция (rng) -> (метод, путь, тело JSON или None).
+    # Изменения затрагивают существующие записи, новые записи создаются с префиксом load- и затем удаляются.
+    # Если созданных записей нет, delete превращается в create
+    def __init__(self, show_ids):
+        self.show_ids = show_ids
+        self.created = []
+        self.lock = threading.Lock()
+        self.counter = 0
+
+    def new_show_id(self):
+        with self.lock:
+            self.counter += 1
+            return f'load-{os.getpid()}-{self.counter}'
+
+    def index(self, rng):
+        return 'GET', '/', None
+
+    def content_list(self, rng):
+        # Случайная страница списка: фильтров у /api/content нет, есть курсор after
+        return 'GET', f"/api/content?limit=50&after={rng.choice(self.show_ids)}", None
+
+    def content_item(self, rng):
+        return 'GET', f'/api/content/{rng.choice(self.show_ids)}', None
+
+    def search(self, rng):
+        return 'GET', f"/api/search?q={rng.choice(['love', 'war', 'family', 'school', 'murder', 'dog'])}&limit=20", None
+
+    def stats(self, rng):
+        return 'GET', rng.choice([
+            '/api/stats/content-by-country',
+            '/api/stats/min-max-avg-duration',
+            '/api/stats/content-by-type-and-rating',
+            '/api/stats/histogram?measure=duration_minutes&width=10',
+            '/api/stats/query?group_by=type,rating&metric=count',
+        ]), None
+
+    def update(self, rng):
+        return 'PUT', f'/api/content/{rng.choice(self.show_ids)}', {'release_year': rng.randint(1990, 2021)}
+
+    def create(self, rng):
+        show_id = self.new_show_id()
+        return 'POST', '/api/content', {
+            'show_id': show_id, 'title': f'Load test {show_id}', 'type_id': 1,
+            'release_year': rng.randint(1990, 2021), 'duration_minutes': rng.randint(60, 180)
+        }
+
+    def delete(self, rng):
+        with self.lock:
+            show_id = self.created.pop(0) if self.created else None
+        if show_id is None:
+            return self.create(rng)
+        return 'DELETE', f'/api/content/{show_id}', None
+
+    def completed(self, method, path, body, status):
+        # Удалять можно только записи, создание которых уже завершилось
+        if method == 'POST' and path == '/api/content' and status == 200:
+            with self.lock:
+                self.created.append(body['show_id'])
+
+    def bulk_update(self, rng):
+        return 'PUT', '/api/content/bulk', [
+            {'show_id': show_id, 'release_year': rng.randint(1990, 2021)} for show_id in rng.sample(self.show_ids, 20)
+        ]
+
+
+# Готовые смеси: операция -> вес
+MIXES = {
+    'read': {'index': 1, 'content_list': 5, 'content_item': 5, 'search': 2, 'stats': 3},
+    'mixed': {'index': 1, 'content_list': 5, 'content_item': 5, 'search': 2, 'stats': 3,
+              'update': 2, 'create': 1, 'delete': 1, 'bulk_update': 1},
+    'write': {'content_item': 2, 'update': 4, 'create': 2, 'delete': 2, 'bulk_update': 2},
+}
+
+
+def parse_mix(value):
+    if value in MIXES:
+        return MIXES[value]
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if not hasattr(Workload, name.strip()):
+            raise SystemExit(f'Неизвестная операция {name}')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def wait_ready(host, port, timeout=120):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit('Сервер не запустился')
+
+
+def request(connection, method, path, body):
+    headers = {}
+    data = None
+    if body is not None:
+        data = json.dumps(body).encode()
+        headers['Content-Type'] = 'application/json'
+    connection.request(method, path, body=data, headers=headers)
+    response = connection.getresponse()
+    response.read()
+    return response.status
+
+
+def client(host, port, workload, mix, deadline, seed, samples):
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    connection = http.client.HTTPConnection(host, port, timeout=60)
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, body = getattr(workload, name)(rng)
+        started = time.perf_counter()
+        try:
+            status = request(connection, method, path, body)
+        except (OSError, http.client.HTTPException):
+            status = None
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=60)
+        samples.append((name, status, time.perf_counter() - started))
+        workload.completed(method, path, body, status)
+    connection.close()
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def summarize(samples, duration):
+    operations = {}
+    for name, status, latency in samples:
+        operations.setdefault(name, []).append((status, latency))
+    operations['всего'] = [(status, latency) for _, status, latency in samples]
+
+    report = {}
+    for name, results in operations.items():
+        latencies = sorted(latency for _, latency in results)
+        statuses = {}
+        for status, _ in results:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(count for status, count in statuses.items() if status == 'None' or int(status) >= 500)
+        report[name] = {
+            'requests': len(results),
+            'throughput': len(results) / duration,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'error_rate': errors / len(results),
+            'statuses': statuses,
+        }
+    return report
+
+
+def print_report(report, lock_errors):
+    print(f"{'операция':<14}{'запросов':>10}{'в секунду':>11}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}"
+          f"{'ошибок':>9}  коды ответа")
+    for name, row in report.items():
+        print(f"{name:<14}{row['requests']:>10}{row['throughput']:>11.1f}{row['p50'] * 1000:>10.1f}"
+              f"{row['p95'] * 1000:>10.1f}{row['p99'] * 1000:>10.1f}{row['error_rate']:>8.1%}  {row['statuses']}")
+    if lock_errors is not None:
+        print(f'Ошибок блокировки SQLite в журнале сервера: {lock_errors}')
+
+
+def fetch_show_ids(host, port, count=500):
+    connection = http.client.HTTPConnection(host, port, timeout=60)
+    connection.request('GET', f'/api/content?limit={count}')
+    items = json.loads(connection.getresponse().read())['items']
+    connection.close()
+    return [item['show_id'] for item in items]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--mix', default='mixed')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--env', action='append', default=[], help='KEY=VALUE для процесса сервера')
+    parser.add_argument('--server-command', help='команда сервера; {port} заменяется портом')
+    parser.add_argument('--url', help='уже запущенный сервер')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    server = None
+    work_dir = None
+    log_path = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        # Сервер работает с временной копией базы, чтобы не трогать instance/dataset.db
+        work_dir = tempfile.mkdtemp(prefix='load_test_')
+        shutil.copy(os.path.join(ROOT, 'instance', 'dataset.db'), work_dir)
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(work_dir, 'dataset.db'))
+        env.update(item.split('=', 1) for item in args.env)
+        host, port = '127.0.0.1', free_port()
+        if args.server_command:
+            command = args.server_command.format(port=port)
+            shell = True
+        else:
+            command = [sys.executable, '-c', FLASK_SERVER.format(root=ROOT, port=port)]
+            shell = False
+        log_path = os.path.join(work_dir, 'server.log')
+        with open(log_path, 'w') as log:
+            server = subprocess.Popen(command, cwd=ROOT, env=env, shell=shell, stdout=log, stderr=subprocess.STDOUT)
+
+    try:
+        wait_ready(host, port)
+        workload = Workload(fetch_show_ids(host, port))
+        samples = []
+        deadline = time.perf_counter() + args.duration
+        clients = [
+            threading.Thread(target=client, args=(host, port, workload, mix, deadline, args.seed + number, samples))
+            for number in range(args.clients)
+        ]
+        started = time.perf_counter()
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        report = summarize(samples, time.perf_counter() - started)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    lock_errors = None
+    if log_path is not None:
+        with open(log_path, encoding='utf-8', errors='replace') as log:
+            lock_errors = log.read().count(LOCK_ERROR)
+    print(f'Клиентов: {args.clients}, {args.duration} с, смесь: {mix}')
+    print_report(report, lock_errors)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump({'clients': args.clients, 'duration': args.duration, 'mix': mix, 'env': args.env,
+                       'server_command': args.server_command, 'lock_errors': lock_errors, 'operations': report},
+                      output_file, ensure_ascii=False, indent=2)
+    if work_dir is not None:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+import copy
+import math
+from threading import Lock, Thread
+from flask import g
+from sqlalchemy import select
+from config import app
+from database import READER
+from models import db, NetflixContent, ContentType, Rating, Country, ContentCountry
+from versioning import get_catalog_version, on_catalog_change, CONTENT_TYPES, COUNTRIES, RATINGS
+
+# NumPy необязателен: без него /api/stats/* считаются запросами SQL
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Числовые столбцы контента, загружаемые в массивы
+COLUMNS = ('type_id', 'rating_id', 'release_year', 'duration_minutes', 'duration_seasons', 'year_added')
+
+# Столбцы, по которым строятся гистограммы и процентили
+MEASURES = ('duration_minutes', 'duration_seasons', 'release_year', 'year_added')
+
+# Справочники снимка по областям каталога: изменение только этих областей перечитывает справочник,
+# а не массивы столбцов
+LOOKUPS = {
+    CONTENT_TYPES: ('content_types', ContentType),
+    RATINGS: ('ratings', Rating),
+    COUNTRIES: ('countries', Country),
+}
+
+# Сколько последних изменений каталога помнит процесс, чтобы обновить снимок без перестроения
+KNOWN_CHANGES_LIMIT = 1000
+
+
+def percentile_rank(percent, count):
+    # Номер значения (с 1) в упорядоченной выборке для процентиля по методу ближайшего ранга
+    return min(count, max(1, math.ceil(percent * count / 100)))
+
+
+def truncated_bucket(values, width):
+    # Деление с отбрасыванием дробной части, как целочисленное деление в SQLite
+    return np.sign(values) * (np.abs(values) // width) * width
+
+
+def load_lookup(connection, model):
+    return dict(connection.execute(select(model.identifier, model.name)).all())
+
+
+def grouped(keys, values):
+    # Уникальные ключи по возрастанию и границы групп в values, упорядоченных по ключу
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    values = values[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return keys[starts], values, starts
+
+
+class ColumnarSnapshot:
+    # Числовые столбцы каталога в массивах NumPy для одной версии каталога.
+    # Пустые значения хранятся как 0 с отдельной маской present.
+    # Версия читается в той же транзакции, что и данные, поэтому снимок ей соответствует
+    def __init__(self, connection):
+        self.version = get_catalog_version(connection)
+        rows = connection.execute(select(*[getattr(NetflixContent, column) for column in COLUMNS])).all()
+        self.values = {}
+        self.present = {}
+        for index, column in enumerate(COLUMNS):
+            raw = [row[index] for row in rows]
+            self.present[column] = np.fromiter((value is not None for value in raw), dtype=bool, count=len(raw))
+            self.values[column] = np.fromiter((value or 0 for value in raw), dtype=np.int64, count=len(raw))
+
+        self.link_countries = np.fromiter(
+            connection.execute(select(ContentCountry.country_id)).scalars(), dtype=np.int64
+        )
+        for attribute, model in LOOKUPS.values():
+            setattr(self, attribute, load_lookup(connection, model))
+
+    def with_lookups(self, connection, version, scopes):
+        # Снимок новой версии с теми же массивами и перечитанными справочниками областей scopes
+        snapshot = copy.copy(self)
+        snapshot.version = version
+        for scope in scopes:
+            attribute, model = LOOKUPS[scope]
+            setattr(snapshot, attribute, load_lookup(connection, model))
+        return snapshot
+
+    def type_mask(self, type_name):
+        # Отбор по названию типа, как JOIN с таблицей типов и фильтр по названию
+        if type_name is None:
+            return np.ones(len(self.values['type_id']), dtype=bool)
+        type_ids = [identifier for identifier, name in self.content_types.items() if name == type_name]
+        return self.present['type_id'] & np.isin(self.values['type_id'], type_ids)
+
+    def measure(self, column, type_name):
+        mask = self.type_mask(type_name) & self.present[column]
+        return self.values[column][mask]
+
+    def duration_by_release_year(self, type_name):
+        # (год, min, max, avg, количество) по убыванию года, как /api/stats/min-max-avg-duration
+        mask = self.type_mask(type_name) & self.present['duration_minutes'] & self.present['release_year']
+        years, durations, starts = grouped(self.values['release_year'][mask], self.values['duration_minutes'][mask])
+        if not len(years):
+            return []
+        counts = np.diff(np.append(starts, len(durations)))
+        mins = np.minimum.reduceat(durations, starts)
+        maxs = np.maximum.reduceat(durations, starts)
+        sums = np.add.reduceat(durations, starts)
+        return [
+            (int(year), int(low), int(high), int(total) / int(count), int(count))
+            for year, low, high, total, count in zip(years, mins, maxs, sums, counts)
+        ][::-1]
+
+    def duration_summary(self, type_name):
+        # (min, max, avg) длительности в минутах; None, если значений нет
+        durations = self.measure('duration_minutes', type_name)
+        if not len(durations):
+            return None, None, None
+        return int(durations.min()), int(durations.max()), int(durations.sum()) / len(durations)
+
+    def count_by_type_and_rating(self):
+        # (тип, рейтинг, количество) по названию типа и убыванию количества
+        mask = self.present['type_id'] & self.present['rating_id']
+        type_ids = self.values['type_id'][mask]
+        rating_ids = self.values['rating_id'][mask]
+        if not len(type_ids):
+            return []
+        # Пара идентификаторов кодируется одним числом, чтобы группировать одномерный массив
+        base = int(rating_ids.max()) - int(rating_ids.min()) + 1
+        codes, counts = np.unique((type_ids - type_ids.min()) * base + (rating_ids - rating_ids.min()),
+                                  return_counts=True)
+        pairs = zip((codes // base + type_ids.min()).tolist(), (codes % base + rating_ids.min()).tolist())
+        totals = {}
+        for (type_id, rating_id), count in zip(pairs, counts.tolist()):
+            if type_id in self.content_types and rating_id in self.ratings:
+                key = (self.content_types[type_id], self.ratings[rating_id])
+                totals[key] = totals.get(key, 0) + count
+        return sorted(((type_name, rating_name, count) for (type_name, rating_name), count in totals.items()),
+                      key=lambda row: (row[0], -row[2], row[1]))
+
+    def count_by_country(self):
+        # (страна, количество) по отдельным странам, по убыванию количества
+        country_ids, counts = np.unique(self.link_countries, return_counts=True)
+        totals = {}
+        for country_id, count in zip(country_ids.tolist(), counts.tolist()):
+            if country_id in self.countries:
+                name = self.countries[country_id]
+                totals[name] = totals.get(name, 0) + count
+        return sorted(totals.items(), key=lambda row: (-row[1], row[0]))
+
+    def histogram(self, column, type_name, width):
+        # (начало корзины, количество) по возрастанию начала корзины
+        buckets, counts = np.unique(truncated_bucket(self.measure(column, type_name), width), return_counts=True)
+        return list(zip(buckets.tolist(), counts.tolist()))
+
+    def percentiles(self, column, key, percents):
+        # {значение разреза: (количество, [процентили])} по методу ближайшего ранга, как sketches.exact_percentiles;
+        # key — столбец разреза или None для всего каталога (значение разреза 0)
+        mask = self.present[column] if key is None else self.present[column] & self.present[key]
+        if not mask.any():
+            return {}
+        keys = self.values[key][mask] if key is not None else np.zeros(int(mask.sum()), dtype=np.int64)
+        groups, values, starts = grouped(keys, self.values[column][mask])
+        ends = np.append(starts[1:], len(values))
+        result = {}
+        for group, start, end in zip(groups.tolist(), starts.tolist(), ends.tolist()):
+            group_values = np.sort(values[start:end])
+            count = end - start
+            result[group] = (count, [int(group_values[percentile_rank(percent, count) - 1]) for percent in percents])
+        return result
+
+
+class ColumnarEngine:
+    # Снимок обновляется при первом чтении после изменения версии каталога.
+    # Если с версии снимка менялись только справочники (известные изменения этого процесса), они перечитываются
+    # в транзакции запроса, массивы остаются прежними. Иначе, в том числе при изменении из другого процесса
+    # (версия хранится в базе), снимок строится заново в фоновом потоке на соединении пула чтения,
+    # а до его готовности запросы считаются SQL. Блокировка не держится во время чтения базы:
+    # в async_app.py запросы выполняются в одном потоке
+    def __init__(self):
+        self.snapshot = None
+        self.known_changes = {}
+        self.building = False
+        self.builder = None
+        self.lock = Lock()
+
+    def record_change(self, version, scopes):
+        with self.lock:
+            self.known_changes[version] = scopes
+            for old_version in sorted(self.known_changes)[:-KNOWN_CHANGES_LIMIT]:
+                del self.known_changes[old_version]
+
+    def changed_lookups(self, version, current_version):
+        # Области справочников, изменённые между версиями, или None, если нужно перестроить массивы
+        if current_version - version > KNOWN_CHANGES_LIMIT:
+            return None
+        changed = set()
+        with self.lock:
+            for changed_version in range(version + 1, current_version + 1):
+                scopes = self.known_changes.get(changed_version)
+                if scopes is None or not scopes <= LOOKUPS.keys():
+                    return None
+                changed |= scopes
+        return changed
+
+    def current(self):
+        version = g.catalog_version if 'catalog_version' in g else get_catalog_version()
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        if snapshot is not None and snapshot.version > version:
+            # Транзакция запроса началась до последнего изменения
+            return None
+        if READER not in db.engines:
+            # База в памяти: одно соединение на процесс, снимок строится в запросе
+            return self.publish(ColumnarSnapshot(db.session.connection()))
+        if snapshot is not None and snapshot.version < version:
+            scopes = self.changed_lookups(snapshot.version, version)
+            if scopes is not None:
+                return self.publish(snapshot.with_lookups(db.session.connection(), version, scopes))
+        self.start_build()
+        return None
+
+    def publish(self, snapshot):
+        with self.lock:
+            if self.snapshot is None or self.snapshot.version < snapshot.version:
+                self.snapshot = snapshot
+        return snapshot
+
+    def start_build(self):
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+            self.builder = Thread(target=self.build, name='columnar-snapshot', daemon=True)
+        self.builder.start()
+
+    def wait(self):
+        # Ожидание фонового построения: для бенчмарков, которым нужен снимок, а не ответ SQL
+        builder = self.builder
+        if builder is not None:
+            builder.join()
+
+    def build(self):
+        try:
+            with app.app_context():
+                with db.engines[READER].connect() as connection:
+                    snapshot = ColumnarSnapshot(connection)
+            self.publish(snapshot)
+        except Exception:
+            app.logger.exception('Не удалось построить столбцовый снимок каталога')
+        finally:
+            with self.lock:
+                self.building = False
+
+
+columnar_engine = ColumnarEngine()
+on_catalog_change(columnar_engine.record_change)
+
+
+def columnar_snapshot():
+    # None, если движок выключен в конфигурации, NumPy не установлен или снимок текущей версии ещё строится
+    if np is None or not app.config.get('COLUMNAR_ENGINE', True):
+        return None
+    return columnar_engine.current()
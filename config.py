@@ -1,6 +1,47 @@
+import os
 from flask import Flask
 
 app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///dataset.db"
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///dataset.db")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Максимальное число ответов /api/stats/* в кэше результатов
+app.config["STATS_CACHE_SIZE"] = 256
+
+# Максимальное число отрисованных разделов главной страницы в кэше фрагментов (structures/dashboard.py)
+app.config["FRAGMENT_CACHE_SIZE"] = 32
+
+# Ответы /api/stats/* из столбцов каталога в массивах NumPy (columnar.py); без NumPy используется SQL
+app.config["COLUMNAR_ENGINE"] = True
+
+# Профиль базы данных (database.py); значения переопределяются переменными окружения с тем же именем.
+# WAL позволяет читать во время записи; synchronous = NORMAL в WAL не теряет целостность при сбое процесса
+app.config["SQLITE_JOURNAL_MODE"] = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+app.config["SQLITE_SYNCHRONOUS"] = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+# Сколько миллисекунд соединение ждёт снятия чужой блокировки, прежде чем вернуть "database is locked"
+app.config["SQLITE_BUSY_TIMEOUT"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))
+# Кэш страниц на соединение: отрицательное значение — в КиБ (64 МиБ)
+app.config["SQLITE_CACHE_SIZE"] = int(os.environ.get("SQLITE_CACHE_SIZE", -65536))
+# Размер файла базы, читаемого через mmap (256 МиБ); 0 — без mmap
+app.config["SQLITE_MMAP_SIZE"] = int(os.environ.get("SQLITE_MMAP_SIZE", 268435456))
+# Соединения для читающих запросов; запись идёт через одно соединение
+app.config["DATABASE_READ_POOL_SIZE"] = int(os.environ.get("DATABASE_READ_POOL_SIZE", 8))
+# Сколько секунд запрос ждёт свободное соединение пула
+app.config["DATABASE_POOL_TIMEOUT"] = int(os.environ.get("DATABASE_POOL_TIMEOUT", 30))
+
+# Метрики запросов на /metrics (structures/metrics.py)
+app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") != "0"
+# Сколько повторов одного SQL в запросе считается вероятным N+1
+app.config["N_PLUS_ONE_THRESHOLD"] = int(os.environ.get("N_PLUS_ONE_THRESHOLD", 10))
+
+# Журнал медленных SQL-запросов (structures/slow_queries.py): порог в миллисекундах, отрицательный — выключен
+app.config["SLOW_QUERY_MS"] = float(os.environ.get("SLOW_QUERY_MS", 100))
+# Файл журнала (по умолчанию instance/slow_queries.log), его размер до ротации и число старых файлов
+app.config["SLOW_QUERY_LOG"] = os.environ.get("SLOW_QUERY_LOG")
+app.config["SLOW_QUERY_LOG_BYTES"] = int(os.environ.get("SLOW_QUERY_LOG_BYTES", 10485760))
+app.config["SLOW_QUERY_LOG_BACKUPS"] = int(os.environ.get("SLOW_QUERY_LOG_BACKUPS", 5))
+# Сколько разных запросов хранит сводка /api/debug/slow-queries
+app.config["SLOW_QUERY_TOP_SIZE"] = 200
+# Эндпоинт /api/debug/slow-queries отвечает только при этом флаге или в режиме отладки (FLASK_DEBUG=1,
+# app.run(debug=True)): он показывает текст запросов и очищает сводку без авторизации
+app.config["SLOW_QUERY_DEBUG_ENDPOINT"] = os.environ.get("SLOW_QUERY_DEBUG_ENDPOINT", "0") == "1"
@@ -0,0 +1,122 @@
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+from models import NetflixContent
+
+# Поля записи контента, которые получают обработчики изменений
+CONTENT_FIELDS = [attr.key for attr in inspect(NetflixContent).column_attrs]
+
+# Обработчики handler(connection, removed, added), вызываемые в той же транзакции, что и изменение.
+# removed и added — словари с полями CONTENT_FIELDS для удалённых и добавленных версий записей;
+# изменение записи передаётся как удаление старой версии и добавление новой.
+# Элементы списка — (handler, поля, от которых зависит обработчик)
+change_handlers = []
+
+# Обработчики handler(connection) для полного пересчёта после полной загрузки каталога
+rebuild_handlers = []
+
+
+def on_content_change(fields):
+    # Изменение записи, не затронувшее fields, обработчику не передаётся (например, новое название для сводок)
+    def decorator(handler):
+        change_handlers.append((handler, frozenset(fields)))
+        return handler
+    return decorator
+
+
+def on_content_rebuild(handler):
+    rebuild_handlers.append(handler)
+    return handler
+
+
+def apply_content_changes(connection, removed=(), added=()):
+    # Вызывается один раз на flush сессии ORM и пакетными операциями (загрузчик CSV, /api/content/bulk)
+    if not removed and not added:
+        return
+    previous = {row['show_id']: row for row in removed}
+    updated = [(previous[row['show_id']], row) for row in added if row['show_id'] in previous]
+    for handler, fields in change_handlers:
+        unchanged = {
+            current['show_id'] for old, current in updated
+            if all(old.get(field) == current.get(field) for field in fields)
+        }
+        if unchanged:
+            handler_removed = [row for row in removed if row['show_id'] not in unchanged]
+            handler_added = [row for row in added if row['show_id'] not in unchanged]
+        else:
+            handler_removed, handler_added = removed, added
+        if handler_removed or handler_added:
+            handler(connection, handler_removed, handler_added)
+
+
+def rebuild_content_derived(connection):
+    for handler in rebuild_handlers:
+        handler(connection)
+
+
+def content_batches(connection, fields, size):
+    # Записи контента (словари с полями fields) порциями по size в порядке show_id; для полных пересчётов
+    columns = [getattr(NetflixContent, field).label(field) for field in fields]
+    last_show_id = None
+    while True:
+        statement = select(*columns).order_by(NetflixContent.show_id).limit(size)
+        if last_show_id is not None:
+            statement = statement.where(NetflixContent.show_id > last_show_id)
+        rows = [row._asdict() for row in connection.execute(statement)]
+        if not rows:
+            return
+        yield rows
+        last_show_id = rows[-1]['show_id']
+
+
+def content_values(target):
+    return {field: getattr(target, field) for field in CONTENT_FIELDS}
+
+
+def previous_values(target):
+    state = inspect(target)
+    values = {}
+    for field in CONTENT_FIELDS:
+        history = state.attrs[field].history
+        values[field] = history.deleted[0] if history.deleted else getattr(target, field)
+    return values
+
+
+# Изменения через ORM (обработчики API) копятся в сессии и передаются обработчикам одним пакетом
+# после каждого flush, в той же транзакции: каскадное удаление тысяч записей — один вызов обработчика
+
+PENDING_CHANGES = 'content_changes'
+
+
+def pending_changes(target):
+    return object_session(target).info.setdefault(PENDING_CHANGES, ([], []))
+
+
+@event.listens_for(NetflixContent, 'after_insert')
+def content_inserted(mapper, connection, target):
+    pending_changes(target)[1].append(content_values(target))
+
+
+@event.listens_for(NetflixContent, 'after_update')
+def content_updated(mapper, connection, target):
+    previous = previous_values(target)
+    current = content_values(target)
+    if previous != current:
+        removed, added = pending_changes(target)
+        removed.append(previous)
+        added.append(current)
+
+
+@event.listens_for(NetflixContent, 'after_delete')
+def content_deleted(mapper, connection, target):
+    pending_changes(target)[0].append(content_values(target))
+
+
+@event.listens_for(Session, 'after_flush')
+def apply_pending_changes(session, flush_context):
+    removed, added = session.info.pop(PENDING_CHANGES, ((), ()))
+    apply_content_changes(session.connection(), removed, added)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_pending_changes(session):
+    session.info.pop(PENDING_CHANGES, None)
@@ -0,0 +1,89 @@
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+# Ключ привязки пула соединений только для чтения (SQLALCHEMY_BINDS)
+READER = 'reader'
+
+# Методы запросов, которые не изменяют каталог и обслуживаются пулом чтения
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def is_memory_database(uri):
+    url = make_url(uri)
+    return url.drivername.startswith('sqlite') and url.database in (None, '', ':memory:')
+
+
+def configure_engines(app):
+    # Вызывается до db.init_app: один пишущий экземпляр соединения и пул соединений для чтения к тому же файлу.
+    # В базе в памяти у каждого соединения свои данные, поэтому там остаётся одно соединение без разделения
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if is_memory_database(uri):
+        return
+    timeout = app.config['DATABASE_POOL_TIMEOUT']
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    options.setdefault('pool_size', 1)
+    options.setdefault('max_overflow', 0)
+    options.setdefault('pool_timeout', timeout)
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    binds.setdefault(READER, {
+        'url': uri,
+        'pool_size': app.config['DATABASE_READ_POOL_SIZE'],
+        'max_overflow': 0,
+        'pool_timeout': timeout,
+    })
+
+
+def apply_pragmas(config, readonly):
+    def connect(dbapi_connection, connection_record):
+        # Транзакции открываются событием begin, а не драйвером sqlite3
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        if not readonly:
+            cursor.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+            cursor.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT'])}")
+        cursor.execute(f"PRAGMA cache_size = {int(config['SQLITE_CACHE_SIZE'])}")
+        cursor.execute(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}")
+        cursor.execute('PRAGMA temp_store = MEMORY')
+        if readonly:
+            cursor.execute('PRAGMA query_only = ON')
+        cursor.close()
+    return connect
+
+
+def begin_transaction(statement):
+    def begin(connection):
+        connection.exec_driver_sql(statement)
+    return begin
+
+
+def setup_engines(app, db):
+    # Вызывается после db.init_app. Пишущая транзакция сразу берёт блокировку записи (BEGIN IMMEDIATE):
+    # при конфликте с другим процессом она ждёт busy_timeout, а не падает при повышении блокировки.
+    # Читающая транзакция в WAL видит один снимок базы на весь запрос и не мешает записи
+    with app.app_context():
+        engines = db.engines
+    for key, engine in engines.items():
+        configure_sqlite(engine, app.config, readonly=key == READER)
+
+
+def configure_sqlite(engine, config, readonly):
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', apply_pragmas(config, readonly))
+        event.listen(engine, 'begin', begin_transaction('BEGIN' if readonly else 'BEGIN IMMEDIATE'))
+
+
+def is_read_request():
+    return has_request_context() and request.method in READ_METHODS
+
+
+class RoutingSession(Session):
+    # Читающие запросы HTTP идут в пул соединений для чтения, всё остальное (изменяющие обработчики,
+    # загрузчик CSV, инициализация базы) — в пишущее соединение
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and READER in self._db.engines and is_read_request() \
+                and not self._flushing and not isinstance(clause, UpdateBase):
+            return self._db.engines[READER]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -1,14 +1,53 @@
 from config import app
-from models import db, ma
+from sqlalchemy import inspect, text
+from models import db, ma, NetflixContent
+from summaries import ensure_summaries
+from search import ensure_search_index
+from associations import ensure_associations
+from sketches import ensure_sketches
+from database import configure_engines, setup_engines
 
 # Инициализация приложения с базой данных и marshmallow
+configure_engines(app)
 db.init_app(app)
+setup_engines(app, db)
 ma.init_app(app)
 
+# Обновление схемы существующего dataset.db: новые столбцы и индексы
+def upgrade_database():
+    table = NetflixContent.__table__
+    columns = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    if 'Год добавления' not in columns:
+        with db.engine.begin() as connection:
+            connection.execute(text('ALTER TABLE "Контент" ADD COLUMN "Год добавления" INTEGER'))
+            connection.execute(text(
+                'UPDATE "Контент" SET "Год добавления" = CAST(strftime(\'%Y\', "Дата добавления") AS INTEGER) '
+                'WHERE "Дата добавления" IS NOT NULL'
+            ))
+    # Жанры и описание заполняются следующей загрузкой CSV (LOADER_VERSION в upload_db.py)
+    for name in ('Жанры', 'Описание'):
+        if name not in columns:
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE "Контент" ADD COLUMN "{name}" TEXT'))
+    existing = {index['name'] for index in inspect(db.engine).get_indexes(table.name)}
+    missing = [index for index in table.indexes if index.name not in existing]
+    for index in missing:
+        index.create(bind=db.engine)
+    if missing:
+        # Статистика нужна планировщику SQLite, чтобы выбирать новые индексы
+        with db.engine.begin() as connection:
+            connection.execute(text('ANALYZE'))
+
+
 # Создание таблиц базы данных
 def init_database():
     with app.app_context():
         db.create_all()
+        upgrade_database()
+        ensure_summaries()
+        ensure_search_index()
+        ensure_associations()
+        ensure_sketches()
 
 if __name__ == "__main__":
     init_database()
@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
+from sqlalchemy import event
+from database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 ma = Marshmallow()
 
 class ContentType(db.Model):
@@ -56,13 +58,28 @@ class NetflixContent(db.Model):
     rating_id = db.Column('Рейтинг', db.Integer, db.ForeignKey('Рейтинг.ID'), nullable=True)
     duration_minutes = db.Column('Длительность (минуты)', db.Integer, nullable=True)
     duration_seasons = db.Column('Количество сезонов', db.Integer, nullable=True)
+    # Год из date_added; заполняется в fill_year_added и при загрузке CSV
+    year_added = db.Column('Год добавления', db.Integer, nullable=True)
+    listed_in = db.Column('Жанры', db.Text, nullable=True)
+    description = db.Column('Описание', db.Text, nullable=True)
+
+    # Индексы под фильтры и группировки главной страницы и /api/stats/*
+    __table_args__ = (
+        db.Index('ix_content_type_year', 'Тип', 'Год выпуска', 'Длительность (минуты)'),
+        db.Index('ix_content_type_duration', 'Тип', 'Длительность (минуты)'),
+        db.Index('ix_content_type_rating', 'Тип', 'Рейтинг'),
+        db.Index('ix_content_country', 'Страна'),
+        db.Index('ix_content_release_year', 'Год выпуска'),
+        db.Index('ix_content_year_added', 'Год добавления', 'Тип'),
+    )
 
     type_rel = db.relationship("ContentType", back_populates="contents")
     country_rel = db.relationship("Country", back_populates="contents")
     rating_rel = db.relationship("Rating", back_populates="contents")
 
     def __init__(self, show_id, title, type_id, director, cast, country_id,
-                 date_added, release_year, rating_id, duration_minutes, duration_seasons):
+                 date_added, release_year, rating_id, duration_minutes, duration_seasons,
+                 listed_in=None, description=None):
         self.show_id = show_id
         self.title = title
         self.type_id = type_id
@@ -74,7 +91,202 @@ class NetflixContent(db.Model):
         self.rating_id = rating_id
         self.duration_minutes = duration_minutes
         self.duration_seasons = duration_seasons
+        self.listed_in = listed_in
+        self.description = description
 
     def __repr__(self):
         duration_str = f"{self.duration_minutes} мин." if self.duration_minutes else f"{self.duration_seasons} сезон(ов)"
         return f'ID: {self.show_id}, Название: {self.title}, Тип: {self.type_id}, Год: {self.release_year}, Длительность: {duration_str}\n'
+
+
+@event.listens_for(NetflixContent, 'before_insert')
+@event.listens_for(NetflixContent, 'before_update')
+def fill_year_added(mapper, connection, target):
+    # date_added — объект date: строки 'YYYY-MM-DD' из API разбираются до записи (structures/bulk.parse_date)
+    target.year_added = int(str(target.date_added)[:4]) if target.date_added else None
+
+
+class ContentFingerprint(db.Model):
+    __tablename__ = 'Отпечаток контента'
+    show_id = db.Column('ID', db.String(20), primary_key=True)
+    row_hash = db.Column('Хэш', db.String(40), nullable=False)
+
+    def __init__(self, show_id, row_hash):
+        self.show_id = show_id
+        self.row_hash = row_hash
+
+    def __repr__(self):
+        return f'ID: {self.show_id}, Хэш: {self.row_hash}\n'
+
+
+class SourceFingerprint(db.Model):
+    __tablename__ = 'Источник данных'
+    path = db.Column('Путь', db.String(500), primary_key=True)
+    size = db.Column('Размер', db.Integer, nullable=False)
+    mtime = db.Column('Время изменения', db.Float, nullable=False)
+    content_hash = db.Column('Хэш', db.String(64), nullable=False)
+    loader_version = db.Column('Версия загрузчика', db.Integer, nullable=False)
+
+    def __init__(self, path, size, mtime, content_hash, loader_version):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.content_hash = content_hash
+        self.loader_version = loader_version
+
+    def __repr__(self):
+        return f'Путь: {self.path}, Размер: {self.size}, Хэш: {self.content_hash}\n'
+
+
+class CatalogVersion(db.Model):
+    __tablename__ = 'Версия каталога'
+    identifier = db.Column('ID', db.Integer, primary_key=True)
+    version = db.Column('Версия', db.Integer, nullable=False)
+
+    def __init__(self, identifier, version):
+        self.identifier = identifier
+        self.version = version
+
+    def __repr__(self):
+        return f'ID: {self.identifier}, Версия: {self.version}\n'
+
+
+# Сводные таблицы для главной страницы. Поддерживаются инкрементально при изменении контента (summaries.py)
+
+class ReleaseYearSummary(db.Model):
+    __tablename__ = 'Сводка по годам выпуска'
+    # Год выпуска 0 — год не указан; тип 0 — тип не указан
+    release_year = db.Column('Год выпуска', db.Integer, primary_key=True)
+    type_id = db.Column('Тип', db.Integer, primary_key=True)
+    content_count = db.Column('Количество', db.Integer, nullable=False, default=0)
+    minutes_count = db.Column('Количество с длительностью', db.Integer, nullable=False, default=0)
+    minutes_sum = db.Column('Сумма длительностей', db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'Год: {self.release_year}, Тип: {self.type_id}, Количество: {self.content_count}\n'
+
+
+class YearAddedSummary(db.Model):
+    __tablename__ = 'Сводка по годам добавления'
+    year_added = db.Column('Год добавления', db.String(4), primary_key=True)
+    type_id = db.Column('Тип', db.Integer, primary_key=True)
+    content_count = db.Column('Количество', db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'Год: {self.year_added}, Тип: {self.type_id}, Количество: {self.content_count}\n'
+
+
+class CountrySummary(db.Model):
+    __tablename__ = 'Сводка по странам'
+    # Количество контента по отдельным странам из ContentCountry; поддерживается в associations.py
+    country_id = db.Column('Страна', db.Integer, primary_key=True)
+    content_count = db.Column('Количество', db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'Страна: {self.country_id}, Количество: {self.content_count}\n'
+
+
+class SearchDocument(db.Model):
+    __tablename__ = 'Поисковый документ'
+    # identifier совпадает с rowid записи в полнотекстовой таблице FTS5 (search.py)
+    identifier = db.Column('ID', db.Integer, primary_key=True)
+    show_id = db.Column('ID контента', db.String(20), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f'ID: {self.identifier}, ID контента: {self.show_id}\n'
+
+
+# Многозначные поля контента (страны, режиссёры и актёры, жанры) в виде связей многие-ко-многим.
+# Заполняются из текстовых полей обработчиками изменений контента (associations.py).
+
+class Person(db.Model):
+    __tablename__ = 'Персона'
+    identifier = db.Column('ID', db.Integer, primary_key=True)
+    name = db.Column('Имя', db.String(200), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f'ID: {self.identifier}, Имя: {self.name}\n'
+
+
+class Genre(db.Model):
+    __tablename__ = 'Жанр'
+    identifier = db.Column('ID', db.Integer, primary_key=True)
+    name = db.Column('Название', db.String(100), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f'ID: {self.identifier}, Название: {self.name}\n'
+
+
+class ContentCountry(db.Model):
+    __tablename__ = 'Страна контента'
+    # Отдельная страна из списка в поле страны контента; страны — строки справочника Country
+    show_id = db.Column('ID контента', db.String(20), db.ForeignKey('Контент.ID'), primary_key=True)
+    country_id = db.Column('Страна', db.Integer, db.ForeignKey('Страна.ID'), primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_content_country_country', 'Страна', 'ID контента'),
+    )
+
+    def __repr__(self):
+        return f'ID контента: {self.show_id}, Страна: {self.country_id}\n'
+
+
+class ContentPerson(db.Model):
+    __tablename__ = 'Участник контента'
+    # Роль: 'director' или 'cast'
+    show_id = db.Column('ID контента', db.String(20), db.ForeignKey('Контент.ID'), primary_key=True)
+    person_id = db.Column('Персона', db.Integer, db.ForeignKey('Персона.ID'), primary_key=True)
+    role = db.Column('Роль', db.String(20), primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_content_person_person', 'Персона', 'Роль', 'ID контента'),
+    )
+
+    def __repr__(self):
+        return f'ID контента: {self.show_id}, Персона: {self.person_id}, Роль: {self.role}\n'
+
+
+class ContentGenre(db.Model):
+    __tablename__ = 'Жанр контента'
+    show_id = db.Column('ID контента', db.String(20), db.ForeignKey('Контент.ID'), primary_key=True)
+    genre_id = db.Column('Жанр', db.Integer, db.ForeignKey('Жанр.ID'), primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_content_genre_genre', 'Жанр', 'ID контента'),
+    )
+
+    def __repr__(self):
+        return f'ID контента: {self.show_id}, Жанр: {self.genre_id}\n'
+
+
+# Квантильные эскизы и топ-списки по длительности; поддерживаются инкрементально (sketches.py).
+# measure — столбец контента, dimension и value — разрез: ('all', 0), ('type', type_id),
+# ('release_year', год) или ('rating', rating_id)
+
+class QuantileSketch(db.Model):
+    __tablename__ = 'Квантильный эскиз'
+    measure = db.Column('Показатель', db.String(20), primary_key=True)
+    dimension = db.Column('Разрез', db.String(20), primary_key=True)
+    value = db.Column('Значение разреза', db.Integer, primary_key=True)
+    bucket = db.Column('Корзина', db.Integer, primary_key=True)
+    content_count = db.Column('Количество', db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'{self.measure} по {self.dimension}={self.value}: корзина {self.bucket}, {self.content_count}\n'
+
+
+class TopContent(db.Model):
+    __tablename__ = 'Топ контента'
+    measure = db.Column('Показатель', db.String(20), primary_key=True)
+    dimension = db.Column('Разрез', db.String(20), primary_key=True)
+    value = db.Column('Значение разреза', db.Integer, primary_key=True)
+    show_id = db.Column('ID контента', db.String(20), primary_key=True)
+    measure_value = db.Column('Значение', db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_top_content_rank', 'Показатель', 'Разрез', 'Значение разреза', 'Значение'),
+        db.Index('ix_top_content_show', 'ID контента'),
+    )
+
+    def __repr__(self):
+        return f'{self.measure} по {self.dimension}={self.value}: {self.show_id} ({self.measure_value})\n'
@@ -0,0 +1,130 @@
+import re
+from sqlalchemy import select, insert, delete, text, bindparam, inspect
+from models import db, NetflixContent, SearchDocument
+from content_changes import on_content_change, on_content_rebuild
+
+# Полнотекстовый индекс FTS5 по названию, людям, жанрам и описанию.
+# rowid записи индекса совпадает с SearchDocument.identifier, что позволяет удалять записи по show_id без полного просмотра.
+SEARCH_TABLE = 'Поиск контента'
+
+# Поля контента, попадающие в индекс, в порядке столбцов FTS5
+SEARCH_FIELDS = ('title', 'director', 'cast', 'listed_in', 'description')
+
+# Веса столбцов для bm25: совпадение в названии важнее совпадения в описании
+SEARCH_WEIGHTS = (10.0, 4.0, 3.0, 2.0, 1.0)
+
+# Ограничение на число параметров в одном IN (...) для SQLite
+IN_CHUNK_SIZE = 500
+
+CREATE_SEARCH_TABLE = f'''
+CREATE VIRTUAL TABLE IF NOT EXISTS "{SEARCH_TABLE}" USING fts5(
+    title, director, "cast", listed_in, description,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+'''
+
+INSERT_SEARCH_ROWS = text(
+    f'INSERT INTO "{SEARCH_TABLE}" (rowid, title, director, "cast", listed_in, description) '
+    'VALUES (:rowid, :title, :director, :cast, :listed_in, :description)'
+)
+
+DELETE_SEARCH_ROWS = text(f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid IN :ids').bindparams(
+    bindparam('ids', expanding=True)
+)
+
+
+def chunked(items, size=IN_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def document_ids(connection, show_ids):
+    found = {}
+    for ids in chunked(show_ids):
+        found.update(connection.execute(
+            select(SearchDocument.show_id, SearchDocument.identifier).where(SearchDocument.show_id.in_(ids))
+        ).all())
+    return found
+
+
+@on_content_change(SEARCH_FIELDS)
+def apply_search_changes(connection, removed=(), added=()):
+    # Изменённая запись удаляется из индекса и добавляется заново под тем же rowid
+    removed_ids = {row['show_id'] for row in removed}
+    added_rows = {row['show_id']: row for row in added}
+    documents = document_ids(connection, removed_ids | set(added_rows))
+
+    stale = [documents[show_id] for show_id in removed_ids if show_id in documents]
+    for ids in chunked(stale):
+        connection.execute(DELETE_SEARCH_ROWS, {'ids': ids})
+
+    gone = [show_id for show_id in removed_ids if show_id not in added_rows and show_id in documents]
+    for ids in chunked(gone):
+        connection.execute(delete(SearchDocument).where(SearchDocument.show_id.in_(ids)))
+
+    new = [show_id for show_id in added_rows if show_id not in documents]
+    if new:
+        show_id_key = inspect(SearchDocument).columns['show_id'].key
+        connection.execute(insert(SearchDocument.__table__), [{show_id_key: show_id} for show_id in new])
+        documents.update(document_ids(connection, new))
+
+    if added_rows:
+        connection.execute(INSERT_SEARCH_ROWS, [
+            dict({field: row.get(field) for field in SEARCH_FIELDS}, rowid=documents[show_id])
+            for show_id, row in added_rows.items()
+        ])
+
+
+@on_content_rebuild
+def rebuild_search_index(connection):
+    # Полный пересчёт индекса; используется после полной загрузки CSV
+    connection.execute(text(f'DELETE FROM "{SEARCH_TABLE}"'))
+    connection.execute(delete(SearchDocument))
+    connection.execute(insert(SearchDocument).from_select(
+        [SearchDocument.show_id], select(NetflixContent.show_id)
+    ))
+    connection.execute(text(
+        f'INSERT INTO "{SEARCH_TABLE}" (rowid, title, director, "cast", listed_in, description) '
+        'SELECT d."ID", c."Название", c."Режиссер", c."Актеры", c."Жанры", c."Описание" '
+        'FROM "Поисковый документ" d JOIN "Контент" c ON c."ID" = d."ID контента"'
+    ))
+    connection.execute(text(f'INSERT INTO "{SEARCH_TABLE}" ("{SEARCH_TABLE}") VALUES (\'optimize\')'))
+
+
+def match_expression(query):
+    # Пользовательский ввод не передаётся в синтаксис FTS5 напрямую: каждое слово берётся в кавычки,
+    # последнее ищется по префиксу, чтобы поиск работал при наборе
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_statement(expression, statement, limit, offset):
+    # statement — выборка контента (content_query()); результаты упорядочены по релевантности bm25
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    matches = text(
+        f'SELECT d."ID контента" AS show_id, d."ID" AS document_id, bm25("{SEARCH_TABLE}", {weights}) AS rank '
+        f'FROM "{SEARCH_TABLE}" JOIN "Поисковый документ" d ON d."ID" = "{SEARCH_TABLE}".rowid '
+        f'WHERE "{SEARCH_TABLE}" MATCH :expression ORDER BY rank, document_id LIMIT :limit OFFSET :offset'
+    ).columns(show_id=db.String, document_id=db.Integer, rank=db.Float).bindparams(
+        expression=expression, limit=limit, offset=offset
+    ).subquery('matches')
+    return statement.join(matches, matches.c.show_id == NetflixContent.show_id).order_by(
+        matches.c.rank, matches.c.document_id
+    )
+
+
+def ensure_search_index():
+    # Индекс создаётся при первом запуске и заполняется, если каталог уже загружен
+    db.session.execute(text(CREATE_SEARCH_TABLE))
+    db.session.commit()
+    has_content = db.session.execute(select(NetflixContent.show_id).limit(1)).first() is not None
+    has_documents = db.session.execute(select(SearchDocument.identifier).limit(1)).first() is not None
+    if has_content and not has_documents:
+        rebuild_search_index(db.session.connection())
+        db.session.commit()
@@ -0,0 +1,332 @@
+import heapq
+import math
+from sqlalchemy import select, insert, delete, inspect, func, literal, literal_column, tuple_, union_all
+from models import db, NetflixContent, QuantileSketch, TopContent
+from content_changes import on_content_change, on_content_rebuild, content_batches
+from summaries import upsert_counts
+from columnar import percentile_rank
+
+# Показатели, по которым ведутся эскизы и топ-списки
+MEASURES = ('duration_minutes', 'duration_seasons')
+
+# Разрезы: название -> поле контента ('all' — весь каталог, значение разреза 0)
+BREAKDOWNS = {'all': None, 'type': 'type_id', 'release_year': 'release_year', 'rating': 'rating_id'}
+
+# Относительная точность квантилей: оценка отличается от точного значения не больше чем на 1%.
+# Корзина i содержит значения из (GAMMA^(i-1), GAMMA^i], как в DDSketch; удаление — уменьшение счётчика корзины
+SKETCH_ACCURACY = 0.01
+GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+# Корзина для нулевых и отрицательных значений
+ZERO_BUCKET = -1000000
+
+# Сколько записей с наибольшим значением хранится в каждом разрезе
+TOP_K = 100
+
+# Ограничение на число параметров в одном IN (...) для SQLite
+IN_CHUNK_SIZE = 500
+# Сколько разрезов обрабатывается одним запросом (три параметра на разрез, подзапрос на разрез при пересчёте)
+GROUP_CHUNK_SIZE = 100
+
+# Количество записей контента, обрабатываемых за один шаг полного пересчёта
+REBUILD_BATCH_SIZE = 5000
+
+SKETCH_FIELDS = ('show_id', 'type_id', 'release_year', 'rating_id') + MEASURES
+
+
+def chunked(items, size=IN_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def bucket_of(value):
+    if value <= 0:
+        return ZERO_BUCKET
+    return math.ceil(math.log(value) / math.log(GAMMA))
+
+
+def bucket_estimate(bucket):
+    if bucket == ZERO_BUCKET:
+        return 0.0
+    return 2 * GAMMA ** bucket / (GAMMA + 1)
+
+
+def row_groups(row):
+    for dimension, field in BREAKDOWNS.items():
+        if field is None:
+            yield dimension, 0
+        elif row[field] is not None:
+            yield dimension, row[field]
+
+
+class Ranked:
+    # Элемент ограниченной кучи: меньше тот, кто ниже в топе (меньшее значение, при равенстве — больший show_id)
+    __slots__ = ('value', 'show_id')
+
+    def __init__(self, value, show_id):
+        self.value = value
+        self.show_id = show_id
+
+    def __lt__(self, other):
+        return (self.value, other.show_id) < (other.value, self.show_id)
+
+
+def push_bounded(heap, item, size=TOP_K):
+    if len(heap) < size:
+        heapq.heappush(heap, item)
+    elif heap[0] < item:
+        heapq.heapreplace(heap, item)
+
+
+def group_key():
+    return tuple_(TopContent.measure, TopContent.dimension, TopContent.value)
+
+
+def insert_rows(connection, model, rows):
+    if rows:
+        columns = inspect(model).columns
+        keys = {field: columns[field].key for field in rows[0]}
+        connection.execute(insert(model.__table__), [
+            {keys[field]: value for field, value in row.items()} for row in rows
+        ])
+
+
+def top_statement(measure, dimension, value, k):
+    # Точный топ по таблице контента: по убыванию значения, при равенстве — по show_id
+    column = getattr(NetflixContent, measure)
+    statement = select(
+        literal(measure), literal(dimension), literal(value), NetflixContent.show_id, column
+    ).where(
+        column.isnot(None)
+    ).order_by(
+        column.desc(), NetflixContent.show_id
+    ).limit(k)
+    if BREAKDOWNS[dimension] is not None:
+        statement = statement.where(getattr(NetflixContent, BREAKDOWNS[dimension]) == value)
+    return statement
+
+
+def top_from_content(connection, measure, dimension, value, k):
+    return [(show_id, amount) for _, _, _, show_id, amount
+            in connection.execute(top_statement(measure, dimension, value, k))]
+
+
+def refill_groups(connection, groups):
+    # Разрезы пересчитываются по таблице контента: по запросу с LIMIT на разрез (по индексам), объединённых в один
+    columns = [TopContent.measure, TopContent.dimension, TopContent.value, TopContent.show_id,
+               TopContent.measure_value]
+    for batch in chunked(sorted(groups), GROUP_CHUNK_SIZE):
+        connection.execute(delete(TopContent.__table__).where(group_key().in_(batch)))
+        parts = [top_statement(*group, TOP_K).subquery().select() for group in batch]
+        connection.execute(insert(TopContent.__table__).from_select(
+            columns, union_all(*parts) if len(parts) > 1 else parts[0]
+        ))
+
+
+def group_bounds(connection, groups):
+    # {разрез: (число записей, наименьшее значение)} одним запросом на порцию разрезов (по индексу ix_top_content_rank)
+    result = {}
+    for batch in chunked(groups, GROUP_CHUNK_SIZE):
+        result.update(((measure, dimension, value), (size, lowest)) for measure, dimension, value, size, lowest in
+                      connection.execute(select(
+                          TopContent.measure, TopContent.dimension, TopContent.value,
+                          func.count(), func.min(TopContent.measure_value)
+                      ).where(
+                          group_key().in_(batch)
+                      ).group_by(
+                          TopContent.measure, TopContent.dimension, TopContent.value
+                      )))
+    return result
+
+
+def trim_groups(connection, groups):
+    # Удаление записей за пределами TOP_K во всех переданных разрезах одним запросом на порцию
+    for batch in chunked(groups, GROUP_CHUNK_SIZE):
+        ranked = select(
+            literal_column('rowid').label('row_id'),
+            func.row_number().over(
+                partition_by=(TopContent.measure, TopContent.dimension, TopContent.value),
+                order_by=(TopContent.measure_value.desc(), TopContent.show_id)
+            ).label('position')
+        ).where(group_key().in_(batch)).subquery()
+        connection.execute(delete(TopContent.__table__).where(
+            literal_column('rowid').in_(select(ranked.c.row_id).where(ranked.c.position > TOP_K))
+        ))
+
+
+def add_candidates(connection, candidates):
+    # В заполненный разрез попадают только записи не ниже его наименьшего значения (равные разбирает обрезка);
+    # переполненные разрезы обрезаются
+    bounds = group_bounds(connection, list(candidates))
+    rows = []
+    overflow = []
+    for group, items in candidates.items():
+        size, lowest = bounds.get(group, (0, None))
+        accepted = [item for item in items if size < TOP_K or item['measure_value'] >= lowest]
+        if size + len(accepted) > TOP_K:
+            overflow.append(group)
+        rows.extend(accepted)
+    insert_rows(connection, TopContent, rows)
+    trim_groups(connection, overflow)
+
+
+def update_top(connection, removed, added):
+    # Разрезы, из топа которых ушла запись, пересчитываются по таблице контента (она уже изменена);
+    # в остальные новые значения добавляются как кандидаты с обрезкой до TOP_K
+    stale = set()
+    for ids in chunked({row['show_id'] for row in removed}):
+        stale.update(tuple(group) for group in connection.execute(
+            select(TopContent.measure, TopContent.dimension, TopContent.value).where(TopContent.show_id.in_(ids))
+        ))
+        connection.execute(delete(TopContent.__table__).where(TopContent.show_id.in_(ids)))
+
+    candidates = {}
+    for row in added:
+        for measure in MEASURES:
+            if row[measure] is None:
+                continue
+            for dimension, value in row_groups(row):
+                group = (measure, dimension, value)
+                if group not in stale:
+                    candidates.setdefault(group, []).append(
+                        {'measure': measure, 'dimension': dimension, 'value': value,
+                         'show_id': row['show_id'], 'measure_value': row[measure]}
+                    )
+
+    if stale:
+        refill_groups(connection, stale)
+    if candidates:
+        add_candidates(connection, candidates)
+
+
+@on_content_change(SKETCH_FIELDS)
+def apply_sketch_changes(connection, removed=(), added=()):
+    deltas = {}
+    for sign, rows in ((-1, removed), (1, added)):
+        for row in rows:
+            for measure in MEASURES:
+                if row[measure] is None:
+                    continue
+                bucket = bucket_of(row[measure])
+                for dimension, value in row_groups(row):
+                    key = (measure, dimension, value, bucket)
+                    deltas[key] = deltas.get(key, 0) + sign
+
+    upsert_counts(connection, QuantileSketch, ('measure', 'dimension', 'value', 'bucket'), [
+        {'measure': measure, 'dimension': dimension, 'value': value, 'bucket': bucket, 'content_count': count}
+        for (measure, dimension, value, bucket), count in deltas.items() if count
+    ])
+    update_top(connection, removed, added)
+
+
+@on_content_rebuild
+def rebuild_sketches(connection):
+    # Полный пересчёт за один проход по контенту; для топов — ограниченные кучи размера TOP_K
+    connection.execute(delete(QuantileSketch.__table__))
+    connection.execute(delete(TopContent.__table__))
+
+    counts = {}
+    heaps = {}
+    for rows in content_batches(connection, SKETCH_FIELDS, REBUILD_BATCH_SIZE):
+        for row in rows:
+            for measure in MEASURES:
+                if row[measure] is None:
+                    continue
+                bucket = bucket_of(row[measure])
+                for dimension, value in row_groups(row):
+                    key = (measure, dimension, value, bucket)
+                    counts[key] = counts.get(key, 0) + 1
+                    push_bounded(heaps.setdefault((measure, dimension, value), []), Ranked(row[measure], row['show_id']))
+
+    insert_rows(connection, QuantileSketch, [
+        {'measure': measure, 'dimension': dimension, 'value': value, 'bucket': bucket, 'content_count': count}
+        for (measure, dimension, value, bucket), count in counts.items()
+    ])
+    insert_rows(connection, TopContent, [
+        {'measure': measure, 'dimension': dimension, 'value': value,
+         'show_id': item.show_id, 'measure_value': item.value}
+        for (measure, dimension, value), heap in heaps.items() for item in heap
+    ])
+
+
+def sketch_percentiles(measure, dimension, percents):
+    # {значение разреза: (количество, [оценки процентилей])} по корзинам эскиза
+    buckets = {}
+    for value, bucket, count in db.session.execute(
+            select(QuantileSketch.value, QuantileSketch.bucket, QuantileSketch.content_count).where(
+                QuantileSketch.measure == measure, QuantileSketch.dimension == dimension
+            ).order_by(QuantileSketch.value, QuantileSketch.bucket)):
+        buckets.setdefault(value, []).append((bucket, count))
+
+    result = {}
+    for value, group in buckets.items():
+        total = sum(count for _, count in group)
+        estimates = []
+        for percent in percents:
+            rank = percentile_rank(percent, total)
+            seen = 0
+            for bucket, count in group:
+                seen += count
+                if seen >= rank:
+                    estimates.append(round(bucket_estimate(bucket), 2))
+                    break
+        result[value] = (total, estimates)
+    return result
+
+
+def exact_percentiles(measure, dimension, percents):
+    # То же по всем значениям из таблицы контента; для проверки точности эскиза
+    column = getattr(NetflixContent, measure)
+    group = getattr(NetflixContent, BREAKDOWNS[dimension]) if BREAKDOWNS[dimension] else None
+    statement = select(column).where(column.isnot(None))
+    if group is not None:
+        statement = select(group, column).where(column.isnot(None), group.isnot(None)).order_by(group)
+
+    values = {}
+    for row in db.session.execute(statement):
+        values.setdefault(row[0] if group is not None else 0, []).append(row[-1])
+
+    result = {}
+    for value, group_values in values.items():
+        group_values.sort()
+        result[value] = (len(group_values), [
+            group_values[percentile_rank(percent, len(group_values)) - 1] for percent in percents
+        ])
+    return result
+
+
+def sketch_top(measure, dimension, k):
+    # {значение разреза: [(show_id, значение)]} из хранимых топов
+    result = {}
+    for value, show_id, amount in db.session.execute(
+            select(TopContent.value, TopContent.show_id, TopContent.measure_value).where(
+                TopContent.measure == measure, TopContent.dimension == dimension
+            ).order_by(TopContent.value, TopContent.measure_value.desc(), TopContent.show_id)):
+        items = result.setdefault(value, [])
+        if len(items) < k:
+            items.append((show_id, amount))
+    return result
+
+
+def exact_top(measure, dimension, k):
+    connection = db.session.connection()
+    field = BREAKDOWNS[dimension]
+    if field is None:
+        values = [0]
+    else:
+        column = getattr(NetflixContent, field)
+        values = db.session.execute(
+            select(column).where(column.isnot(None), getattr(NetflixContent, measure).isnot(None))
+            .distinct().order_by(column)
+        ).scalars().all()
+    return {value: [tuple(row) for row in top_from_content(connection, measure, dimension, value, k)]
+            for value in values}
+
+
+def ensure_sketches():
+    # Базы, созданные до появления эскизов, заполняются при первом запуске
+    has_content = db.session.execute(select(NetflixContent.show_id).limit(1)).first() is not None
+    has_sketch = db.session.execute(select(QuantileSketch.measure).limit(1)).first() is not None
+    if has_content and not has_sketch:
+        rebuild_sketches(db.session.connection())
+        db.session.commit()
@@ -0,0 +1,207 @@
+from datetime import date
+from sqlalchemy import select, insert, update, delete
+from models import db, ContentType, Country, Rating, NetflixContent
+from content_changes import CONTENT_FIELDS, apply_content_changes
+from structures.serializers import content_query, dump_contents
+
+# Ограничение на число параметров в одном IN (...) для SQLite
+IN_CHUNK_SIZE = 500
+
+# Максимальное число show_id в одном запросе /api/content?ids= и /api/content/lookup
+MAX_LOOKUP_IDS = 1000
+
+# Типы полей, которые можно передавать в /api/content/bulk
+FIELD_TYPES = {
+    'show_id': str,
+    'title': str,
+    'type_id': int,
+    'director': str,
+    'cast': str,
+    'country_id': int,
+    'date_added': date,
+    'release_year': int,
+    'rating_id': int,
+    'duration_minutes': int,
+    'duration_seasons': int,
+    'listed_in': str,
+    'description': str,
+}
+REQUIRED_FIELDS = ('show_id', 'title', 'type_id')
+NOT_NULL_FIELDS = ('title', 'type_id')
+REFERENCES = {'type_id': ContentType, 'country_id': Country, 'rating_id': Rating}
+
+
+def chunked(items, size=IN_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def existing_ids(column, values):
+    found = set()
+    for ids in chunked(set(values)):
+        found.update(db.session.execute(select(column).where(column.in_(ids))).scalars())
+    return found
+
+
+def parse_date(value):
+    # Дата из JSON в формате 'YYYY-MM-DD'; None, если это не строка или формат неверный
+    try:
+        return date.fromisoformat(value) if isinstance(value, str) else None
+    except ValueError:
+        return None
+
+
+def convert_fields(item, errors):
+    # Проверка типов полей; дата принимается в формате 'YYYY-MM-DD'
+    values = {}
+    for field, value in item.items():
+        expected = FIELD_TYPES.get(field)
+        if expected is None:
+            errors.append(f'Неизвестное поле {field}')
+        elif value is None:
+            if field in NOT_NULL_FIELDS or field == 'show_id':
+                errors.append(f'Поле {field} не может быть пустым')
+            values[field] = None
+        elif expected is date:
+            values[field] = parse_date(value)
+            if values[field] is None:
+                errors.append(f'Поле {field} должно быть датой в формате YYYY-MM-DD')
+        elif expected is int and (isinstance(value, bool) or not isinstance(value, int)):
+            errors.append(f'Поле {field} должно быть целым числом')
+        elif expected is str and not isinstance(value, str):
+            errors.append(f'Поле {field} должно быть строкой')
+        else:
+            values[field] = value
+    return values
+
+
+def validate_items(items, creating):
+    # Проверка всего пакета до записи. Возвращает нормализованные значения и ошибки по каждому элементу.
+    values = []
+    errors = []
+    if not isinstance(items, list):
+        return values, None
+    for item in items:
+        item_errors = []
+        if not isinstance(item, dict):
+            item_errors.append('Элемент должен быть объектом')
+            item = {}
+        item_values = convert_fields(item, item_errors)
+        required = REQUIRED_FIELDS if creating else ('show_id',)
+        for field in required:
+            if field not in item:
+                item_errors.append(f'Отсутствует обязательное поле {field}')
+        values.append(item_values)
+        errors.append(item_errors)
+
+    seen = set()
+    for item_values, item_errors in zip(values, errors):
+        # Отсутствующий или неверный show_id уже отмечен ошибкой и повтором не считается
+        show_id = item_values.get('show_id')
+        if show_id is None:
+            continue
+        if show_id in seen:
+            item_errors.append(f'show_id {show_id} повторяется в пакете')
+        seen.add(show_id)
+
+    stored = existing_ids(NetflixContent.show_id, [v['show_id'] for v in values if v.get('show_id')])
+    for item_values, item_errors in zip(values, errors):
+        show_id = item_values.get('show_id')
+        if show_id is None:
+            continue
+        if creating and show_id in stored:
+            item_errors.append(f'Контент {show_id} уже существует')
+        elif not creating and show_id not in stored:
+            item_errors.append(f'Контент {show_id} не найден')
+
+    for field, model in REFERENCES.items():
+        known = existing_ids(model.identifier, [v[field] for v in values if v.get(field) is not None])
+        for item_values, item_errors in zip(values, errors):
+            if item_values.get(field) is not None and item_values[field] not in known:
+                item_errors.append(f'{field} {item_values[field]} не найден')
+
+    return values, errors
+
+
+def validate_ids(items):
+    errors = []
+    if not isinstance(items, list):
+        return None
+    stored = existing_ids(NetflixContent.show_id, [item for item in items if isinstance(item, str)])
+    seen = set()
+    for show_id in items:
+        item_errors = []
+        if not isinstance(show_id, str):
+            item_errors.append('Ожидается строка show_id')
+        elif show_id in seen:
+            item_errors.append(f'show_id {show_id} повторяется в пакете')
+        elif show_id not in stored:
+            item_errors.append(f'Контент {show_id} не найден')
+        if isinstance(show_id, str):
+            seen.add(show_id)
+        errors.append(item_errors)
+    return errors
+
+
+def item_results(show_ids, errors, status):
+    results = []
+    for index, (show_id, item_errors) in enumerate(zip(show_ids, errors)):
+        result = {'index': index, 'show_id': show_id}
+        if item_errors:
+            result.update(status='invalid', errors=item_errors)
+        else:
+            result['status'] = status
+        results.append(result)
+    return results
+
+
+def with_year_added(row):
+    row['year_added'] = row['date_added'].year if row.get('date_added') else None
+    return row
+
+
+def load_rows(show_ids):
+    rows = {}
+    columns = [getattr(NetflixContent, field) for field in CONTENT_FIELDS]
+    for ids in chunked(show_ids):
+        for row in db.session.execute(select(*columns).where(NetflixContent.show_id.in_(ids))):
+            rows[row.show_id] = row._asdict()
+    return rows
+
+
+# Применение проверенного пакета набором executemany в текущей транзакции.
+# Производные данные (сводки и т. п.) обновляются через apply_content_changes.
+
+def bulk_create(values):
+    rows = [with_year_added({field: item.get(field) for field in FIELD_TYPES}) for item in values]
+    db.session.execute(insert(NetflixContent).execution_options(render_nulls=True), rows)
+    apply_content_changes(db.session.connection(), added=[dict(row) for row in rows])
+
+
+def bulk_update(values):
+    previous = load_rows([item['show_id'] for item in values])
+    rows = [with_year_added(dict(previous[item['show_id']], **item)) for item in values]
+    db.session.execute(update(NetflixContent), rows)
+    apply_content_changes(db.session.connection(), removed=list(previous.values()), added=rows)
+
+
+def bulk_delete(show_ids):
+    previous = load_rows(show_ids)
+    for ids in chunked(show_ids):
+        db.session.execute(delete(NetflixContent).where(NetflixContent.show_id.in_(ids)))
+    apply_content_changes(db.session.connection(), removed=list(previous.values()))
+
+
+def lookup_contents(show_ids):
+    # Контент по списку show_id одним запросом IN на порцию с соединёнными справочниками.
+    # Порядок элементов совпадает с порядком запроса, повторы отбрасываются.
+    show_ids = list(dict.fromkeys(show_ids))
+    rows = {}
+    for ids in chunked(show_ids):
+        for row in db.session.execute(content_query().where(NetflixContent.show_id.in_(ids))):
+            rows[row.show_id] = row
+    return {
+        'items': dump_contents([rows[show_id] for show_id in show_ids if show_id in rows]),
+        'missing': [show_id for show_id in show_ids if show_id not in rows]
+    }
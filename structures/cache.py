@@ -0,0 +1,103 @@
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from flask import request, g, make_response
+from config import app
+from versioning import get_catalog_version, on_catalog_change
+
+# Сколько последних изменений каталога помнит процесс для проверки записей кэша
+KNOWN_CHANGES_LIMIT = 1000
+
+
+class ResultCache:
+    # Кэш результатов с ограниченным размером и вытеснением давно не использованных записей (LRU).
+    # Запись помнит версию каталога, при которой посчитана, и области каталога, от которых зависит.
+    # Изменения этого процесса удаляют только записи затронутых областей; если версия каталога
+    # изменилась в другом процессе, запись считается устаревшей.
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.known_changes = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def is_fresh(self, version, current_version, scopes):
+        if current_version - version > KNOWN_CHANGES_LIMIT:
+            return False
+        for changed in range(version + 1, current_version + 1):
+            changed_scopes = self.known_changes.get(changed)
+            if changed_scopes is None or changed_scopes & scopes:
+                return False
+        return True
+
+    def get(self, key, current_version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, version, scopes = entry
+                if version == current_version or self.is_fresh(version, current_version, scopes):
+                    self.entries[key] = (value, current_version, scopes)
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, version, scopes):
+        with self.lock:
+            self.entries[key] = (value, version, scopes)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, version, scopes):
+        with self.lock:
+            self.known_changes[version] = scopes
+            while len(self.known_changes) > KNOWN_CHANGES_LIMIT:
+                self.known_changes.popitem(last=False)
+            for key in [key for key, (_, _, entry_scopes) in self.entries.items() if entry_scopes & scopes]:
+                del self.entries[key]
+                self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / requests if requests else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+stats_cache = ResultCache(app.config.get('STATS_CACHE_SIZE', 256))
+on_catalog_change(stats_cache.invalidate)
+
+
+def cached_result(*scopes):
+    # Кэширование ответа по эндпоинту и параметрам запроса; scopes — области каталога, от которых он зависит
+    scopes = frozenset(scopes)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.endpoint, tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))))
+            version = g.catalog_version if 'catalog_version' in g else get_catalog_version()
+            cached = stats_cache.get(key, version)
+            if cached is not None:
+                data, mimetype = cached
+                return app.response_class(data, mimetype=mimetype)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                stats_cache.put(key, (response.get_data(), response.mimetype), version, scopes)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,202 @@
+from flask import get_template_attribute
+from sqlalchemy import func, select, exists
+from config import app
+from models import (
+    db, ContentType, Country, Rating, NetflixContent, ContentCountry,
+    ReleaseYearSummary, YearAddedSummary, CountrySummary
+)
+from structures.cache import ResultCache
+from versioning import on_catalog_change, CONTENT, CONTENT_TYPES, COUNTRIES, RATINGS
+
+# Запросы главной страницы. Каждый принимает словарь {название типа контента: ID}
+# и возвращает [заголовки, строки] для таблицы macros_table (templates/macros.html)
+
+
+def format_seasons(number):
+    if number is None:
+        return "неизвестно"
+
+    number = int(number)
+
+    last_digit = number % 10
+    last_two_digits = number % 100
+
+    if last_two_digits in range(11, 15):
+        return f"{number} сезонов"
+    elif last_digit == 1:
+        return f"{number} сезон"
+    elif last_digit in [2, 3, 4]:
+        return f"{number} сезона"
+    else:
+        return f"{number} сезонов"
+
+
+# Запрос 1: Сериалы за последний год
+def latest_series(type_ids):
+    # Максимальный год выпуска
+    max_year = db.session.query(
+        func.max(ReleaseYearSummary.release_year)
+    ).filter(
+        ReleaseYearSummary.release_year != 0
+    ).scalar()
+
+    headers = ["Название", "Год выпуска", "Рейтинг", "Длительность"]
+    data = db.session.query(
+        NetflixContent.title,
+        NetflixContent.release_year,
+        Rating.name,
+        NetflixContent.duration_seasons
+    ).join(
+        Rating, NetflixContent.rating_id == Rating.identifier
+    ).filter(
+        NetflixContent.release_year == max_year,
+        NetflixContent.type_id == type_ids.get('TV Show'),
+        NetflixContent.duration_seasons.isnot(None)
+    ).order_by(
+        NetflixContent.title.asc()
+    ).all()
+
+    return [headers, [
+        (title, year, rating, format_seasons(seasons))
+        for title, year, rating, seasons in data
+    ]]
+
+
+# Запрос 2: Страны-лидеры по количеству контента
+def top_countries(type_ids):
+    headers = ["Страна", "Количество контента"]
+    data = db.session.query(
+        Country.name,
+        func.sum(CountrySummary.content_count)
+    ).join(
+        CountrySummary, CountrySummary.country_id == Country.identifier
+    ).group_by(
+        Country.name
+    ).having(
+        func.sum(CountrySummary.content_count) > 100
+    ).order_by(
+        func.sum(CountrySummary.content_count).desc(), Country.name
+    ).all()
+    return [headers, data]
+
+
+# Запрос 3: Топ 1% фильмов с самой большой продолжительностью
+def longest_movies(type_ids):
+    headers = ["Название", "Год", "Длительность (мин)"]
+    movie_type_id = type_ids.get('Movie')
+
+    movies_with_duration = db.session.query(
+        func.sum(ReleaseYearSummary.minutes_count)
+    ).filter(
+        ReleaseYearSummary.type_id == movie_type_id
+    ).scalar() or 0
+
+    data = db.session.query(
+        NetflixContent.title,
+        NetflixContent.release_year,
+        NetflixContent.duration_minutes
+    ).filter(
+        NetflixContent.type_id == movie_type_id,
+        NetflixContent.duration_minutes.isnot(None)
+    ).order_by(
+        NetflixContent.duration_minutes.desc(),
+        NetflixContent.title.asc()
+    ).limit(
+        int(movies_with_duration * 0.01)
+    ).all()
+    return [headers, data]
+
+
+# Запрос 4: Количество добавлений по годам
+def additions_by_year(type_ids):
+    headers = ["Год добавления", "Фильмов", "Сериалов", "Всего"]
+    data = db.session.query(
+        YearAddedSummary.year_added,
+        func.sum(db.case((YearAddedSummary.type_id == type_ids.get('Movie'), YearAddedSummary.content_count),
+                         else_=0)),
+        func.sum(db.case((YearAddedSummary.type_id == type_ids.get('TV Show'), YearAddedSummary.content_count),
+                         else_=0)),
+        func.sum(YearAddedSummary.content_count)
+    ).group_by(
+        YearAddedSummary.year_added
+    ).order_by(
+        YearAddedSummary.year_added.desc()
+    ).all()
+    return [headers, data]
+
+
+# Запрос 5: Средняя длительность фильмов по годам выпуска
+def movie_duration_by_year(type_ids):
+    headers = ["Год выпуска", "Средняя длительность (мин)", "Количество фильмов"]
+    data = [
+        (year, minutes_sum / minutes_count, minutes_count)
+        for year, minutes_sum, minutes_count in db.session.query(
+            ReleaseYearSummary.release_year,
+            ReleaseYearSummary.minutes_sum,
+            ReleaseYearSummary.minutes_count
+        ).filter(
+            ReleaseYearSummary.type_id == type_ids.get('Movie'),
+            ReleaseYearSummary.release_year != 0,
+            ReleaseYearSummary.minutes_count > 0
+        ).order_by(
+            ReleaseYearSummary.release_year.desc()
+        )
+    ]
+    return [headers, data]
+
+
+# Разделы главной страницы: имя, заголовок, запрос и области каталога, от которых зависит результат
+DASHBOARD_SECTIONS = [
+    ('query1', 'Сериалы за последний год', latest_series, (CONTENT, CONTENT_TYPES, RATINGS)),
+    ('query2', 'Страны-лидеры по количеству контента', top_countries, (CONTENT, COUNTRIES)),
+    ('query3', '1% самых длинных фильмов', longest_movies, (CONTENT, CONTENT_TYPES)),
+    ('query4', 'Количество контента по годам', additions_by_year, (CONTENT, CONTENT_TYPES)),
+    ('query5', 'Средняя длительность фильмов по годам выпуска', movie_duration_by_year, (CONTENT, CONTENT_TYPES)),
+]
+
+DASHBOARD_QUERIES = {name: query for name, _, query, _ in DASHBOARD_SECTIONS}
+
+# Отрисованные таблицы разделов. Запись живёт до изменения областей каталога, от которых зависит раздел,
+# так что главная страница обычно собирается из готовых фрагментов без запросов к таблицам
+fragment_cache = ResultCache(app.config.get('FRAGMENT_CACHE_SIZE', 32))
+on_catalog_change(fragment_cache.invalidate)
+
+
+def content_type_ids():
+    return {name: identifier for identifier, name in db.session.execute(
+        select(ContentType.identifier, ContentType.name)
+    )}
+
+
+def dashboard_sections(version):
+    table = get_template_attribute('macros.html', 'macros_table')
+    type_ids = None
+    sections = []
+    for name, title, query, scopes in DASHBOARD_SECTIONS:
+        fragment = fragment_cache.get(name, version)
+        if fragment is None:
+            if type_ids is None:
+                type_ids = content_type_ids()
+            headers, data = query(type_ids)
+            fragment = table(title, headers, data)
+            fragment_cache.put(name, fragment, version, frozenset(scopes))
+        sections.append(fragment)
+    return sections
+
+
+# Списки для раскрывающихся блоков главной страницы: только названия, в порядке ID
+def content_type_names():
+    return db.session.scalars(select(ContentType.name).order_by(ContentType.identifier)).all()
+
+
+def country_names():
+    # Отдельные страны из связей ContentCountry, а не сочетания вроде "United States, India"
+    return db.session.scalars(
+        select(Country.name).where(
+            exists().where(ContentCountry.country_id == Country.identifier)
+        ).order_by(Country.identifier)
+    ).all()
+
+
+def rating_names():
+    return db.session.scalars(select(Rating.name).order_by(Rating.identifier)).all()
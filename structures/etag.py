@@ -0,0 +1,22 @@
+from functools import wraps
+from flask import request, make_response, g
+from versioning import get_catalog_version
+
+
+def catalog_etag(view):
+    # ETag читающих эндпоинтов строится по версии каталога.
+    # Если клиент прислал актуальный If-None-Match, ответ 304 отдаётся без обращения к таблицам контента.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.catalog_version = get_catalog_version()
+        etag = f'catalog-{g.catalog_version}'
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
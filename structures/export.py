@@ -0,0 +1,35 @@
+import csv
+import io
+from flask import current_app
+from models import db
+from structures.serializers import CONTENT_COLUMNS, dump_contents, plain_value
+
+# Число строк, которые курсор забирает из базы за одну выборку
+EXPORT_CHUNK_SIZE = 1000
+
+CSV_COLUMNS = CONTENT_COLUMNS + ['type_name', 'country_name', 'rating_name']
+
+
+def content_partitions(statement):
+    # Серверная выборка частями: в памяти одновременно находится только EXPORT_CHUNK_SIZE строк
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+    yield from result.partitions()
+
+
+def export_ndjson(statement):
+    # Одна запись контента в формате /api/content на строку
+    for rows in content_partitions(statement):
+        yield ''.join(current_app.json.dumps(item) + '\n' for item in dump_contents(rows))
+
+
+def export_csv(statement):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for rows in content_partitions(statement):
+        writer.writerows([plain_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
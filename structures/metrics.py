@@ -0,0 +1,241 @@
+from collections import Counter as StatementCounter
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+from flask import request, g, has_app_context, template_rendered, before_render_template
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import app
+
+# Метрики запросов в текстовом формате Prometheus (/metrics).
+# Значения хранятся в памяти процесса: при нескольких процессах сервера каждый отдаёт свои.
+# На запрос: число SQL-запросов и их время (события движка SQLAlchemy), время сериализации
+# (схемы marshmallow, функции dump_*, кодирование JSON), время отрисовки шаблонов и размер ответа
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+LABELS = ('route', 'method')
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def label_text(names, values):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+
+
+class Histogram:
+    def __init__(self, name, description, buckets, labels=LABELS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}
+        self.lock = Lock()
+
+    def observe(self, label_values, value):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.series.items()]
+        for label_values, counts, total, count in sorted(series):
+            labels = label_text(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, description, labels=LABELS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {}
+        self.lock = Lock()
+
+    def increment(self, label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self.lock:
+            values = sorted(self.values.items())
+        for label_values, value in values:
+            lines.append(f'{self.name}{{{label_text(self.labels, label_values)}}} {value}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Время обработки запроса', DURATION_BUCKETS)
+SQL_QUERIES = Histogram('http_request_sql_queries', 'Число SQL-запросов на запрос', QUERY_COUNT_BUCKETS)
+SQL_SECONDS = Histogram('http_request_sql_seconds', 'Время SQL-запросов на запрос', DURATION_BUCKETS)
+SERIALIZATION_SECONDS = Histogram('http_request_serialization_seconds',
+                                  'Время сериализации (marshmallow, dump_*, JSON) на запрос', DURATION_BUCKETS)
+RENDER_SECONDS = Histogram('http_request_render_seconds', 'Время отрисовки шаблонов на запрос', DURATION_BUCKETS)
+RESPONSE_BYTES = Histogram('http_response_size_bytes', 'Размер тела ответа', SIZE_BUCKETS)
+REQUESTS = Counter('http_requests_total', 'Число запросов', LABELS + ('status',))
+N_PLUS_ONE = Counter('http_request_n_plus_one_total',
+                     'Запросы, в которых один и тот же SQL выполнялся не меньше N_PLUS_ONE_THRESHOLD раз')
+
+REGISTRY = (REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS, SERIALIZATION_SECONDS, RENDER_SECONDS, RESPONSE_BYTES,
+            REQUESTS, N_PLUS_ONE)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'sql_seconds', 'serialization_seconds', 'render_seconds',
+                 'depth', 'statements', 'render_started')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.render_seconds = 0.0
+        self.depth = 0
+        self.statements = StatementCounter()
+        self.render_started = None
+
+
+def current_metrics():
+    if not has_app_context():
+        return None
+    return g.get('request_metrics')
+
+
+class SerializationTimer:
+    # Время вложенных вызовов (вложенные схемы marshmallow, dump_* внутри других) учитывается один раз
+    __slots__ = ('metrics', 'started')
+
+    def __enter__(self):
+        self.metrics = current_metrics()
+        if self.metrics is not None:
+            self.metrics.depth += 1
+            self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.metrics is not None:
+            self.metrics.depth -= 1
+            if not self.metrics.depth:
+                self.metrics.serialization_seconds += perf_counter() - self.started
+        return False
+
+
+def timed_serialization(function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with SerializationTimer():
+            return function(*args, **kwargs)
+    return wrapper
+
+
+class MetricsJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with SerializationTimer():
+            return super().dumps(obj, **kwargs)
+
+
+class TimedDumpMixin:
+    # Для схем marshmallow
+    def dump(self, obj, *, many=None):
+        with SerializationTimer():
+            return super().dump(obj, many=many)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def sql_started(connection, cursor, statement, parameters, context, executemany):
+    metrics = current_metrics()
+    if metrics is not None:
+        context.metrics_started = perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def sql_finished(connection, cursor, statement, parameters, context, executemany):
+    metrics = current_metrics()
+    if metrics is not None and hasattr(context, 'metrics_started'):
+        metrics.sql_seconds += perf_counter() - context.metrics_started
+        metrics.queries += 1
+        # Параметры передаются отдельно, поэтому повторы одного запроса с разными значениями дают один текст
+        metrics.statements[statement] += 1
+
+
+@before_render_template.connect_via(app)
+def render_started(sender, template, context, **extra):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.render_started = perf_counter()
+
+
+@template_rendered.connect_via(app)
+def render_finished(sender, template, context, **extra):
+    metrics = current_metrics()
+    if metrics is not None and metrics.render_started is not None:
+        metrics.render_seconds += perf_counter() - metrics.render_started
+        metrics.render_started = None
+
+
+def is_tracked():
+    return app.config.get('METRICS_ENABLED', True) and request.endpoint != 'metrics'
+
+
+@app.before_request
+def start_request_metrics():
+    if is_tracked():
+        g.request_metrics = RequestMetrics()
+
+
+@app.after_request
+def finish_request_metrics(response):
+    metrics = g.pop('request_metrics', None)
+    if metrics is None:
+        return response
+    labels = (request.url_rule.rule if request.url_rule is not None else 'unmatched', request.method)
+    REQUEST_SECONDS.observe(labels, perf_counter() - metrics.started)
+    SQL_QUERIES.observe(labels, metrics.queries)
+    SQL_SECONDS.observe(labels, metrics.sql_seconds)
+    SERIALIZATION_SECONDS.observe(labels, metrics.serialization_seconds)
+    RENDER_SECONDS.observe(labels, metrics.render_seconds)
+    size = response.calculate_content_length()
+    if size is not None:
+        RESPONSE_BYTES.observe(labels, size)
+    REQUESTS.increment(labels + (str(response.status_code),))
+
+    # Вероятный N+1: один и тот же SQL многократно в одном запросе, например ленивая загрузка в цикле
+    if metrics.statements:
+        statement, repeats = metrics.statements.most_common(1)[0]
+        if repeats >= app.config.get('N_PLUS_ONE_THRESHOLD', 10):
+            N_PLUS_ONE.increment(labels)
+            app.logger.warning('Возможный N+1 в %s %s: %d раз %s', request.method, labels[0], repeats,
+                               ' '.join(statement.split())[:300])
+    return response
+
+
+def metrics_text():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+app.json = MetricsJSONProvider(app)
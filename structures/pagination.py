@@ -0,0 +1,94 @@
+from flask import request, jsonify, abort, make_response
+from sqlalchemy import inspect, select
+from models import db
+from structures.serializers import plain_value
+
+# Размер страницы по умолчанию и верхняя граница для параметра limit
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def bad_request(message):
+    abort(make_response(jsonify({'message': message}), 400))
+
+
+class ListArgs:
+    def __init__(self, fields, limit, after):
+        self.fields = fields
+        self.limit = limit
+        self.after = after
+
+    @property
+    def paginated(self):
+        return self.limit is not None or self.after is not None
+
+
+def parse_limit(default=None):
+    limit = default
+    raw_limit = request.args.get('limit')
+    if raw_limit is not None:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            bad_request('Параметр limit должен быть целым числом')
+        if limit < 1:
+            bad_request('Параметр limit должен быть положительным')
+        limit = min(limit, MAX_LIMIT)
+    return limit
+
+
+def parse_list_args(model, key_column):
+    # Разбор параметров fields, limit и after списочных эндпоинтов
+    columns = [attr.key for attr in inspect(model).column_attrs]
+
+    fields = None
+    raw_fields = request.args.get('fields')
+    if raw_fields:
+        fields = list(dict.fromkeys(name.strip() for name in raw_fields.split(',') if name.strip()))
+        unknown = [name for name in fields if name not in columns]
+        if unknown:
+            bad_request(f"Неизвестные поля: {', '.join(unknown)}. Доступны: {', '.join(columns)}")
+
+    limit = parse_limit()
+
+    after = request.args.get('after')
+    if after is not None:
+        try:
+            after = key_column.type.python_type(after)
+        except ValueError:
+            bad_request('Некорректное значение курсора after')
+        if limit is None:
+            limit = DEFAULT_LIMIT
+
+    return ListArgs(fields, limit, after)
+
+
+def list_response(model, key_column, dump, args, statement, criteria=()):
+    # Список с курсорной (keyset) пагинацией по key_column и выборкой только запрошенных столбцов.
+    # Без limit и after возвращается весь список в прежнем формате. criteria — условия отбора строк.
+    if args.fields:
+        statement = select(key_column.label('_key'), *[getattr(model, name) for name in args.fields])
+    if criteria:
+        statement = statement.where(*criteria)
+
+    if args.after is not None:
+        statement = statement.where(key_column > args.after)
+    if args.paginated:
+        # Лишняя строка показывает, есть ли следующая страница
+        statement = statement.order_by(key_column).limit(args.limit + 1)
+
+    rows = db.session.execute(statement).all()
+
+    next_cursor = None
+    if args.paginated and len(rows) > args.limit:
+        rows = rows[:args.limit]
+        next_cursor = rows[-1]._key if args.fields else getattr(rows[-1], key_column.key)
+
+    if args.fields:
+        items = [{name: plain_value(getattr(row, name)) for name in args.fields} for row in rows]
+    else:
+        items = dump(rows)
+
+    if not args.paginated:
+        return jsonify(items)
+    return jsonify({'items': items, 'next_cursor': next_cursor})
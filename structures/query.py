@@ -0,0 +1,184 @@
+import re
+from functools import lru_cache
+from flask import request
+from sqlalchemy import select, func, bindparam
+from sqlalchemy.orm import aliased
+from models import (
+    NetflixContent, ContentType, Rating, Country, Person, Genre,
+    ContentCountry, ContentPerson, ContentGenre
+)
+from associations import DIRECTOR, CAST
+from columnar import MEASURES
+from structures.pagination import bad_request, parse_limit
+
+# Измерения /api/stats/query.
+# Однозначные: справочник, связанный внешним ключом контента, или столбец контента
+SCALAR_DIMENSIONS = {
+    'type': (ContentType, NetflixContent.type_id),
+    'rating': (Rating, NetflixContent.rating_id),
+    'release_year': (None, NetflixContent.release_year),
+    'year_added': (None, NetflixContent.year_added),
+}
+# Многозначные: таблица связей, её внешний ключ, справочник и роль (для персон)
+LINKED_DIMENSIONS = {
+    'country': (ContentCountry, 'country_id', Country, None),
+    'genre': (ContentGenre, 'genre_id', Genre, None),
+    'director': (ContentPerson, 'person_id', Person, DIRECTOR),
+    'actor': (ContentPerson, 'person_id', Person, CAST),
+}
+NUMERIC_FIELDS = set(MEASURES)
+
+AGGREGATES = {'avg': func.avg, 'sum': func.sum, 'min': func.min, 'max': func.max}
+
+OPERATORS = {
+    '=': lambda column, value: column == value,
+    '!=': lambda column, value: column != value,
+    '>': lambda column, value: column > value,
+    '>=': lambda column, value: column >= value,
+    '<': lambda column, value: column < value,
+    '<=': lambda column, value: column <= value,
+}
+FILTER_PATTERN = re.compile(r'^\s*(\w+)\s*(>=|<=|!=|=|>|<)\s*(.*?)\s*$')
+
+# Не больше стольких измерений в group_by
+MAX_GROUP_BY = 3
+
+
+def metric_label(metric):
+    return metric if metric == 'count' else metric.replace(':', '_')
+
+
+def parse_query_args():
+    # Разбор group_by, metric, filter, order_by и limit.
+    # Возвращает форму запроса (без значений фильтров — по ней кэшируется SQL), значения фильтров и limit
+    group_by = tuple(name.strip() for name in request.args.get('group_by', '').split(',') if name.strip())
+    for name in group_by:
+        if name not in SCALAR_DIMENSIONS and name not in LINKED_DIMENSIONS:
+            bad_request(f"Неизвестное измерение {name}. Доступны: "
+                        f"{', '.join(list(SCALAR_DIMENSIONS) + list(LINKED_DIMENSIONS))}")
+    if len(set(group_by)) != len(group_by) or len(group_by) > MAX_GROUP_BY:
+        bad_request(f'group_by: не больше {MAX_GROUP_BY} разных измерений')
+
+    metrics = tuple(name.strip() for name in request.args.get('metric', 'count').split(',') if name.strip())
+    for metric in metrics:
+        if metric == 'count':
+            continue
+        aggregate, _, field = metric.partition(':')
+        if aggregate not in AGGREGATES or field not in NUMERIC_FIELDS:
+            bad_request(f"Неизвестная метрика {metric}. Доступны: count и "
+                        f"{'|'.join(AGGREGATES)}:{'|'.join(MEASURES)}")
+    if not metrics or len(set(metrics)) != len(metrics):
+        bad_request('metric: нужна хотя бы одна метрика без повторов')
+
+    filters = []
+    values = []
+    for raw_filter in request.args.getlist('filter'):
+        for condition in raw_filter.split(';'):
+            if not condition.strip():
+                continue
+            match = FILTER_PATTERN.match(condition)
+            if match is None:
+                bad_request(f'Некорректный фильтр {condition}')
+            field, operator, value = match.groups()
+            if field in NUMERIC_FIELDS:
+                try:
+                    value = int(value)
+                except ValueError:
+                    bad_request(f'Значение фильтра {field} должно быть целым числом')
+            elif field in SCALAR_DIMENSIONS or field in LINKED_DIMENSIONS:
+                if operator not in ('=', '!='):
+                    bad_request(f'Для {field} доступны только = и !=')
+            else:
+                bad_request(f'Фильтр по полю {field} не поддерживается')
+            filters.append((field, operator))
+            values.append(value)
+
+    labels = list(group_by) + [metric_label(metric) for metric in metrics]
+    order_by = request.args.get('order_by')
+    if order_by is not None and order_by.lstrip('-') not in labels:
+        bad_request(f"order_by: одно из {', '.join(labels)}, '-' в начале — по убыванию")
+
+    limit = parse_limit()
+    shape = (group_by, metrics, tuple(filters), order_by, limit is not None)
+    return shape, values, limit
+
+
+def linked_names(name):
+    # Подзапрос show_id контента со значением многозначного измерения; своя копия таблиц на каждый вызов
+    link_model, key, dimension_model, role = LINKED_DIMENSIONS[name]
+    link = aliased(link_model)
+    dimension = aliased(dimension_model)
+    statement = select(link.show_id, dimension.name).join(dimension, dimension.identifier == getattr(link, key))
+    if role is not None:
+        statement = statement.where(link.role == role)
+    return statement.subquery()
+
+
+@lru_cache(maxsize=256)
+def compile_query(shape):
+    # Один SELECT по контенту с нужными JOIN; значения фильтров и limit передаются параметрами
+    group_by, metrics, filters, order_by, limited = shape
+    statement = select().select_from(NetflixContent)
+    columns = {}
+
+    def scalar_column(name):
+        if name not in columns:
+            model, foreign_key = SCALAR_DIMENSIONS[name]
+            if model is None:
+                columns[name] = foreign_key
+            else:
+                dimension = aliased(model)
+                nonlocal statement
+                statement = statement.outerjoin(dimension, foreign_key == dimension.identifier)
+                columns[name] = dimension.name
+        return columns[name]
+
+    for name in group_by:
+        if name in SCALAR_DIMENSIONS:
+            scalar_column(name)
+        else:
+            names = linked_names(name)
+            statement = statement.join(names, names.c.show_id == NetflixContent.show_id)
+            columns[name] = names.c.name
+
+    for index, (field, operator) in enumerate(filters):
+        value = bindparam(f'filter_{index}')
+        if field in NUMERIC_FIELDS:
+            statement = statement.where(OPERATORS[operator](getattr(NetflixContent, field), value))
+        elif field in SCALAR_DIMENSIONS:
+            column = scalar_column(field)
+            statement = statement.where(OPERATORS[operator](column, value))
+        else:
+            # Многозначное поле: = — среди значений есть указанное, != — указанного нет
+            names = linked_names(field)
+            matching = select(names.c.show_id).where(names.c.name == value)
+            statement = statement.where(
+                NetflixContent.show_id.in_(matching) if operator == '=' else NetflixContent.show_id.not_in(matching)
+            )
+
+    labelled = [columns[name].label(name) for name in group_by]
+    for metric in metrics:
+        if metric == 'count':
+            labelled.append(func.count().label('count'))
+        else:
+            aggregate, _, field = metric.partition(':')
+            labelled.append(AGGREGATES[aggregate](getattr(NetflixContent, field)).label(metric_label(metric)))
+    statement = statement.add_columns(*labelled).group_by(*[columns[name] for name in group_by])
+
+    # Порядок по умолчанию — по измерениям; они же разрешают равенство при сортировке по метрике
+    order = []
+    if order_by is not None:
+        column = next(column for column in labelled if column.name == order_by.lstrip('-'))
+        order.append(column.desc() if order_by.startswith('-') else column)
+    order.extend(columns[name] for name in group_by)
+    statement = statement.order_by(*order)
+    if limited:
+        statement = statement.limit(bindparam('limit'))
+    return statement
+
+
+def query_parameters(values, limit):
+    parameters = {f'filter_{index}': value for index, value in enumerate(values)}
+    if limit is not None:
+        parameters['limit'] = limit
+    return parameters
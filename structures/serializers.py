@@ -1,7 +1,12 @@
+from datetime import date
+from urllib.parse import quote
+from flask import url_for
+from sqlalchemy import inspect, select
 from models import ContentType, Country, Rating, NetflixContent, db, ma
+from structures.metrics import TimedDumpMixin, timed_serialization
 
 
-class ContentTypeSchema(ma.SQLAlchemyAutoSchema):
+class ContentTypeSchema(TimedDumpMixin, ma.SQLAlchemyAutoSchema):
     class Meta:
         model = ContentType
         load_instance = True
@@ -14,7 +19,7 @@ class ContentTypeSchema(ma.SQLAlchemyAutoSchema):
     )
 
 
-class CountrySchema(ma.SQLAlchemyAutoSchema):
+class CountrySchema(TimedDumpMixin, ma.SQLAlchemyAutoSchema):
     class Meta:
         model = Country
         load_instance = True
@@ -27,7 +32,7 @@ class CountrySchema(ma.SQLAlchemyAutoSchema):
     )
 
 
-class RatingSchema(ma.SQLAlchemyAutoSchema):
+class RatingSchema(TimedDumpMixin, ma.SQLAlchemyAutoSchema):
     class Meta:
         model = Rating
         load_instance = True
@@ -40,7 +45,7 @@ class RatingSchema(ma.SQLAlchemyAutoSchema):
     )
 
 
-class NetflixContentSchema(ma.SQLAlchemyAutoSchema):
+class NetflixContentSchema(TimedDumpMixin, ma.SQLAlchemyAutoSchema):
     class Meta:
         model = NetflixContent
         load_instance = True
@@ -68,4 +73,137 @@ countries_schema = CountrySchema(many=True)
 rating_schema = RatingSchema()
 ratings_schema = RatingSchema(many=True)
 content_schema = NetflixContentSchema()
-contents_schema = NetflixContentSchema(many=True)
\ No newline at end of file
+contents_schema = NetflixContentSchema(many=True)
+
+# Быстрая сериализация списков без диспетчеризации полей marshmallow.
+# Результат совпадает с выводом соответствующих схем.
+
+CONTENT_COLUMNS = [attr.key for attr in inspect(NetflixContent).column_attrs]
+
+
+class UrlTemplate:
+    # Ссылка строится через url_for один раз на список, затем в неё подставляется идентификатор.
+    # Заполнитель должен проходить конвертер маршрута, поэтому для <int:id> он числовой.
+    def __init__(self, endpoint, argument, placeholder):
+        url = url_for(endpoint, **{argument: placeholder})
+        self.prefix, self.suffix = url.split(str(placeholder))
+
+    def __call__(self, value):
+        return f'{self.prefix}{quote(str(value))}{self.suffix}'
+
+
+def plain_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class DimensionDumper:
+    def __init__(self, endpoint, collection_endpoint):
+        self.self_link = UrlTemplate(endpoint, 'id', 918273645)
+        self.collection_link = url_for(collection_endpoint)
+        self.cache = {}
+
+    def __call__(self, identifier, name):
+        # Значения справочников повторяются, поэтому словарь строится один раз на идентификатор
+        if identifier is None:
+            return None
+        result = self.cache.get(identifier)
+        if result is None:
+            result = {
+                '_links': {'collection': self.collection_link, 'self': self.self_link(identifier)},
+                'identifier': identifier,
+                'name': name,
+            }
+            self.cache[identifier] = result
+        return result
+
+
+def content_type_dumper():
+    return DimensionDumper('get_content_type', 'get_content_types')
+
+
+def country_dumper():
+    return DimensionDumper('get_country', 'get_countries')
+
+
+def rating_dumper():
+    return DimensionDumper('get_rating', 'get_ratings')
+
+
+def person_dumper():
+    return DimensionDumper('get_person', 'get_people')
+
+
+def genre_dumper():
+    return DimensionDumper('get_genre', 'get_genres')
+
+
+def dimension_query(model):
+    return select(model.identifier, model.name)
+
+
+@timed_serialization
+def dump_content_types(rows):
+    dump = content_type_dumper()
+    return [dump(identifier, name) for identifier, name in rows]
+
+
+@timed_serialization
+def dump_countries(rows):
+    dump = country_dumper()
+    return [dump(identifier, name) for identifier, name in rows]
+
+
+@timed_serialization
+def dump_ratings(rows):
+    dump = rating_dumper()
+    return [dump(identifier, name) for identifier, name in rows]
+
+
+@timed_serialization
+def dump_people(rows):
+    dump = person_dumper()
+    return [dump(identifier, name) for identifier, name in rows]
+
+
+@timed_serialization
+def dump_genres(rows):
+    dump = genre_dumper()
+    return [dump(identifier, name) for identifier, name in rows]
+
+
+def content_query():
+    # Контент вместе с названиями справочников одним запросом с JOIN вместо ленивой загрузки на каждую строку
+    return select(
+        *[getattr(NetflixContent, column) for column in CONTENT_COLUMNS],
+        ContentType.name.label('type_name'),
+        Country.name.label('country_name'),
+        Rating.name.label('rating_name'),
+    ).outerjoin(
+        ContentType, NetflixContent.type_id == ContentType.identifier
+    ).outerjoin(
+        Country, NetflixContent.country_id == Country.identifier
+    ).outerjoin(
+        Rating, NetflixContent.rating_id == Rating.identifier
+    )
+
+
+@timed_serialization
+def dump_contents(rows):
+    # rows — результат content_query()
+    self_link = UrlTemplate('get_content', 'show_id', '__show_id__')
+    collection_link = url_for('get_all_content')
+    dump_type = content_type_dumper()
+    dump_country = country_dumper()
+    dump_rating = rating_dumper()
+
+    result = []
+    for row in rows:
+        item = {column: plain_value(value) for column, value in zip(CONTENT_COLUMNS, row)}
+        item['type_rel'] = dump_type(row.type_id, row.type_name)
+        item['country_rel'] = dump_country(row.country_id, row.country_name)
+        item['rating_rel'] = dump_rating(row.rating_id, row.rating_name)
+        item['_links'] = {'collection': collection_link, 'self': self_link(row.show_id)}
+        result.append(item)
+    return result
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+from logging.handlers import RotatingFileHandler
+from threading import Lock
+from time import perf_counter
+from datetime import datetime
+from flask import request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import app
+
+# Журнал медленных SQL-запросов: запросы дольше SLOW_QUERY_MS пишутся в ротируемый файл (по строке JSON)
+# вместе с параметрами, маршрутом и планом EXPLAIN QUERY PLAN, а в памяти копится сводка по тексту запроса
+# для /api/debug/slow-queries. Параметры (значения полей каталога) в сводку не попадают, только в файл.
+# План снимается один раз на текст запроса, на том же соединении
+
+# Сколько символов параметров сохраняется (массовые вставки передают тысячи значений)
+MAX_PARAMETERS_LENGTH = 1000
+
+logger = logging.getLogger('slow_queries')
+logger.propagate = False
+logger_lock = Lock()
+
+
+class SlowQuery:
+    __slots__ = ('statement', 'count', 'total_ms', 'max_ms', 'routes', 'plan', 'last_seen')
+
+    def __init__(self, statement, plan):
+        self.statement = statement
+        self.plan = plan
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.routes = {}
+        self.last_seen = None
+
+    def as_dict(self):
+        return {
+            'statement': self.statement,
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3),
+            'max_ms': round(self.max_ms, 3),
+            'routes': self.routes,
+            'plan': self.plan,
+            'full_scans': full_scans(self.plan),
+            'last_seen': self.last_seen,
+        }
+
+
+class SlowQueryLog:
+    # Сводка медленных запросов по тексту SQL; при переполнении вытесняется запрос с наименьшим общим временем
+    def __init__(self, size):
+        self.size = size
+        self.entries = {}
+        self.lock = Lock()
+
+    def plan(self, statement):
+        with self.lock:
+            entry = self.entries.get(statement)
+            return entry.plan if entry is not None else None
+
+    def record(self, statement, plan, elapsed_ms, route):
+        with self.lock:
+            entry = self.entries.get(statement)
+            if entry is None:
+                if len(self.entries) >= self.size:
+                    del self.entries[min(self.entries.values(), key=lambda item: item.total_ms).statement]
+                entry = self.entries[statement] = SlowQuery(statement, plan)
+            entry.count += 1
+            entry.total_ms += elapsed_ms
+            entry.routes[route] = entry.routes.get(route, 0) + 1
+            entry.max_ms = max(entry.max_ms, elapsed_ms)
+            entry.last_seen = datetime.now().isoformat(timespec='seconds')
+
+    def top(self, limit, order_by):
+        with self.lock:
+            entries = [entry.as_dict() for entry in self.entries.values()]
+        entries.sort(key=lambda item: item[order_by], reverse=True)
+        return entries[:limit]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+slow_query_log = SlowQueryLog(app.config.get('SLOW_QUERY_TOP_SIZE', 200))
+
+ORDERS = ('total_ms', 'max_ms', 'avg_ms', 'count')
+
+
+def slow_query_logger():
+    # Файл создаётся при первом медленном запросе
+    if not logger.handlers:
+        with logger_lock:
+            if not logger.handlers:
+                path = app.config.get('SLOW_QUERY_LOG') or os.path.join(app.instance_path, 'slow_queries.log')
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                handler = RotatingFileHandler(path, maxBytes=app.config.get('SLOW_QUERY_LOG_BYTES', 10485760),
+                                              backupCount=app.config.get('SLOW_QUERY_LOG_BACKUPS', 5),
+                                              encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                logger.addHandler(handler)
+                logger.setLevel(logging.INFO)
+    return logger
+
+
+def full_scans(plan):
+    # Полный просмотр таблицы: SCAN без индекса (SCAN ... USING INDEX — просмотр по индексу)
+    return [line.strip() for line in plan or []
+            if line.strip().startswith('SCAN ') and ' USING ' not in line and 'CONSTANT ROW' not in line]
+
+
+def explain(connection, statement, parameters):
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        rows = cursor.fetchall()
+    except Exception as error:
+        return [f'план недоступен: {error}']
+    finally:
+        cursor.close()
+    # Строки плана: (id, parent, _, описание); вложенность по parent
+    depth = {0: 0}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, 0) + 1
+        lines.append('  ' * (depth[node_id] - 1) + detail)
+    return lines
+
+
+def parameters_text(parameters):
+    text = repr(parameters)
+    if len(text) > MAX_PARAMETERS_LENGTH:
+        text = text[:MAX_PARAMETERS_LENGTH] + '...'
+    return text
+
+
+def current_route():
+    if not has_request_context():
+        return 'вне запроса'
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    return f'{request.method} {rule}'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def slow_query_started(connection, cursor, statement, parameters, context, executemany):
+    context.slow_query_started = perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def slow_query_finished(connection, cursor, statement, parameters, context, executemany):
+    threshold = app.config.get('SLOW_QUERY_MS', 100)
+    if threshold < 0 or not hasattr(context, 'slow_query_started'):
+        return
+    elapsed_ms = (perf_counter() - context.slow_query_started) * 1000
+    if elapsed_ms < threshold:
+        return
+
+    statement = ' '.join(statement.split())
+    plan = slow_query_log.plan(statement)
+    if plan is None and not executemany:
+        plan = explain(connection, statement, parameters)
+    route = current_route()
+    slow_query_log.record(statement, plan, elapsed_ms, route)
+    slow_query_logger().info(json.dumps({
+        'time': datetime.now().isoformat(timespec='milliseconds'),
+        'duration_ms': round(elapsed_ms, 3),
+        'route': route,
+        'statement': statement,
+        'parameters': parameters_text(parameters),
+        'executemany': executemany,
+        'plan': plan,
+        'full_scans': full_scans(plan),
+    }, ensure_ascii=False))
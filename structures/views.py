@@ -1,235 +1,80 @@
-from flask import render_template, request, jsonify, make_response
+from flask import render_template, request, jsonify, abort, Response, stream_with_context, g
 from config import app
-from models import db, ContentType, Country, Rating, NetflixContent
-from sqlalchemy import func, desc, Integer
+from models import (
+    db, ContentType, Country, Rating, NetflixContent, CountrySummary,
+    Person, Genre, ContentCountry, ContentPerson, ContentGenre
+)
+from sqlalchemy import func, select
 from structures.serializers import (
-    content_type_schema, content_types_schema,
-    country_schema, countries_schema,
-    rating_schema, ratings_schema,
-    content_schema, contents_schema
+    content_type_schema, country_schema, rating_schema, content_schema,
+    dump_content_types, dump_countries, dump_ratings, dump_contents, dump_people, dump_genres,
+    dimension_query, content_query
 )
+from structures.pagination import parse_list_args, parse_limit, list_response, bad_request, DEFAULT_LIMIT
+from structures.export import export_ndjson, export_csv
+from structures.etag import catalog_etag
+from structures.cache import cached_result, stats_cache
+from structures.bulk import (
+    parse_date, validate_items, validate_ids, item_results, bulk_create, bulk_update, bulk_delete,
+    lookup_contents, MAX_LOOKUP_IDS
+)
+from search import match_expression, search_statement
+from associations import replace_country_name, DIRECTOR, CAST
+from columnar import columnar_snapshot, percentile_rank, MEASURES
+from structures.query import parse_query_args, compile_query, query_parameters
+from structures.dashboard import (
+    dashboard_sections, fragment_cache, content_type_names, country_names, rating_names
+)
+import sketches
+from structures.metrics import metrics_text
+from structures.slow_queries import slow_query_log, ORDERS as SLOW_QUERY_ORDERS
+from versioning import bump_catalog_version, CONTENT, CONTENT_TYPES, COUNTRIES, RATINGS
 
 
-@app.template_filter('format_seasons')
-def format_seasons_filter(number):
-    return format_seasons(number)
-
-def format_seasons(number):
-    if number is None:
-        return "неизвестно"
-
-    number = int(number)
-
-    last_digit = number % 10
-    last_two_digits = number % 100
-
-    if last_two_digits in range(11, 15):
-        return f"{number} сезонов"
-    elif last_digit == 1:
-        return f"{number} сезон"
-    elif last_digit in [2, 3, 4]:
-        return f"{number} сезона"
-    else:
-        return f"{number} сезонов"
-
 @app.route('/')
+@catalog_etag
 def index():
-    # Получаем список всех типов контента, стран и рейтингов
-    content_types = ContentType.query.all()
-    countries = Country.query.all()
-    ratings = Rating.query.all()
-
-    # Запрос 1: Сериалы за последний год
-    # Максимальный год выпуска
-    max_year = db.session.query(
-        func.max(NetflixContent.release_year)
-    ).filter(
-        NetflixContent.release_year.isnot(None)
-    ).scalar()
-
-    query1_headers = ["Название", "Год выпуска", "Рейтинг", "Длительность"]
-    query1_data = db.session.query(
-        NetflixContent.title,
-        NetflixContent.release_year,
-        Rating.name,
-        db.case(
-            (ContentType.name == 'TV Show', db.cast(NetflixContent.duration_seasons, db.String)),
-            else_='Неизвестно'
-        ).label('duration'),
-        ContentType.name.label('content_type')
-    ).join(
-        Rating, NetflixContent.rating_id == Rating.identifier
-    ).join(
-        ContentType, NetflixContent.type_id == ContentType.identifier
-    ).filter(
-        NetflixContent.release_year == max_year,
-        db.or_(
-            db.and_(ContentType.name == 'TV Show', NetflixContent.duration_seasons.isnot(None))
-        )
-    ).order_by(
-        NetflixContent.title.asc()
-    ).all()
-
-    formatted_query1_data = []
-    for title, year, rating, duration, content_type in query1_data:
-        if content_type == 'TV Show' and duration != 'Неизвестно':
-            try:
-                formatted_duration = format_seasons(int(duration))
-            except (ValueError, TypeError):
-                formatted_duration = duration
-        else:
-            formatted_duration = duration
-
-        formatted_query1_data.append((title, year, rating, formatted_duration))
-
-    # Запрос 2: Страны-лидеры по количеству контента
-    query2_headers = ["Страна", "Количество контента"]
-    query2_data = db.session.query(
-        Country.name,
-        func.count(NetflixContent.show_id)
-    ).join(
-        NetflixContent, NetflixContent.country_id == Country.identifier
-    ).group_by(
-        Country.name
-    ).having(
-        func.count(NetflixContent.show_id) > 100
-    ).order_by(
-        func.count(NetflixContent.show_id).desc()
-    ).all()
-
-    # Запрос 3: Топ 1% фильмов с самой большой продолжительностью
-    query3_headers = ["Название", "Год", "Длительность (мин)"]
-
-    query3_data = db.session.query(
-        NetflixContent.title,
-        NetflixContent.release_year,
-        NetflixContent.duration_minutes
-    ).join(
-        ContentType, NetflixContent.type_id == ContentType.identifier
-    ).filter(
-        ContentType.name == 'Movie',
-        NetflixContent.duration_minutes.isnot(None)
-    ).order_by(
-        NetflixContent.duration_minutes.desc()
-    ).limit(
-        db.session.query(
-            func.cast(func.count(NetflixContent.show_id) * 0.01, Integer)
-        ).join(
-            ContentType, NetflixContent.type_id == ContentType.identifier
-        ).filter(
-            ContentType.name == 'Movie',
-            NetflixContent.duration_minutes.isnot(None)
-        ).scalar_subquery()
-    ).all()
-
-    # Запрос 4: Количество добавлений по годам
-    query4_headers = ["Год добавления", "Фильмов", "Сериалов", "Всего"]
-
-    # Извлекаем год из даты добавления
-    year_extract = func.strftime('%Y', NetflixContent.date_added).label('year_added')
-
-    # Подзапрос для фильмов по годам
-    movies_subquery = db.session.query(
-        year_extract.label('year'),
-        func.count(NetflixContent.show_id).label('movie_count')
-    ).join(
-        ContentType, NetflixContent.type_id == ContentType.identifier
-    ).filter(
-        ContentType.name == 'Movie',
-        NetflixContent.date_added.isnot(None)
-    ).group_by(
-        year_extract
-    ).subquery()
-
-    # Подзапрос для сериалов по годам
-    series_subquery = db.session.query(
-        year_extract.label('year'),
-        func.count(NetflixContent.show_id).label('series_count')
-    ).join(
-        ContentType, NetflixContent.type_id == ContentType.identifier
-    ).filter(
-        ContentType.name == 'TV Show',
-        NetflixContent.date_added.isnot(None)
-    ).group_by(
-        year_extract
-    ).subquery()
-
-    # Подзапрос для общего количества контента по годам
-    total_subquery = db.session.query(
-        year_extract.label('year'),
-        func.count(NetflixContent.show_id).label('total_count')
-    ).filter(
-        NetflixContent.date_added.isnot(None)
-    ).group_by(
-        year_extract
-    ).subquery()
-
-    # Объединяем результаты с помощью full outer join через UNION
-    years_list = db.session.query(
-        year_extract.label('year')
-    ).filter(
-        NetflixContent.date_added.isnot(None)
-    ).group_by(
-        year_extract
-    ).order_by(
-        year_extract.desc()
-    ).subquery()
-
-    # Финальный запрос, объединяющий все подзапросы
-    query4_data = db.session.query(
-        years_list.c.year,
-        func.coalesce(movies_subquery.c.movie_count, 0).label('movie_count'),
-        func.coalesce(series_subquery.c.series_count, 0).label('series_count'),
-        func.coalesce(total_subquery.c.total_count, 0).label('total_count')
-    ).outerjoin(
-        movies_subquery, years_list.c.year == movies_subquery.c.year
-    ).outerjoin(
-        series_subquery, years_list.c.year == series_subquery.c.year
-    ).outerjoin(
-        total_subquery, years_list.c.year == total_subquery.c.year
-    ).order_by(
-        years_list.c.year.desc()
-    ).all()
-
-    # Запрос 5: Средняя длительность фильмов по годам выпуска
-    query5_headers = ["Год выпуска", "Средняя длительность (мин)", "Количество фильмов"]
-    query5_data = db.session.query(
-        NetflixContent.release_year,
-        func.avg(NetflixContent.duration_minutes).label('avg_duration'),
-        func.count(NetflixContent.show_id).label('movie_count')
-    ).join(
-        ContentType, NetflixContent.type_id == ContentType.identifier
-    ).filter(
-        ContentType.name == 'Movie',
-        NetflixContent.duration_minutes.isnot(None),
-        NetflixContent.release_year.isnot(None)
-    ).group_by(
-        NetflixContent.release_year
-    ).order_by(
-        NetflixContent.release_year.desc()
-    )
-
-    return render_template('index.html',
-                           content_types=content_types,
-                           countries=countries,
-                           ratings=ratings,
-                           query1=[query1_headers, formatted_query1_data],
-                           query2=[query2_headers, query2_data],
-                           query3=[query3_headers, query3_data],
-                           query4=[query4_headers, query4_data],
-                           query5=[query5_headers, query5_data])
+    # Таблицы разделов берутся из кэша фрагментов по версии каталога (structures/dashboard.py);
+    # списки типов, стран и рейтингов страница загружает сама при раскрытии блока
+    return render_template('index.html', sections=dashboard_sections(g.catalog_version))
+
+
+# Списки названий для раскрывающихся блоков главной страницы
+# curl -i http://127.0.0.1:5000/api/dashboard/content-types
+@app.route('/api/dashboard/content-types', methods=['GET'])
+@catalog_etag
+@cached_result(CONTENT_TYPES)
+def dashboard_content_types():
+    return jsonify({'items': content_type_names()})
+
+# curl -i http://127.0.0.1:5000/api/dashboard/countries
+@app.route('/api/dashboard/countries', methods=['GET'])
+@catalog_etag
+@cached_result(CONTENT, COUNTRIES)
+def dashboard_countries():
+    return jsonify({'items': country_names()})
+
+# curl -i http://127.0.0.1:5000/api/dashboard/ratings
+@app.route('/api/dashboard/ratings', methods=['GET'])
+@catalog_etag
+@cached_result(RATINGS)
+def dashboard_ratings():
+    return jsonify({'items': rating_names()})
 
 
 # ContentType API Endpoints
 # curl -i http://127.0.0.1:5000/api/content-types
+# curl -i "http://127.0.0.1:5000/api/content-types?limit=10&after=<id>&fields=name"
 @app.route('/api/content-types', methods=['GET'])
+@catalog_etag
 def get_content_types():
-    all_content_types = ContentType.query.all()
-    result = content_types_schema.dump(all_content_types)
-    return jsonify(result)
+    args = parse_list_args(ContentType, ContentType.identifier)
+    return list_response(ContentType, ContentType.identifier, dump_content_types, args,
+                         dimension_query(ContentType))
 
 # curl -i http://127.0.0.1:5000/api/content-types/<id>
 @app.route('/api/content-types/<int:id>', methods=['GET'])
+@catalog_etag
 def get_content_type(id):
     content_type = ContentType.query.get_or_404(id)
     return content_type_schema.dump(content_type)
@@ -240,6 +85,7 @@ def add_content_type():
     name = request.json['name']
     new_content_type = ContentType(name)
     db.session.add(new_content_type)
+    bump_catalog_version(CONTENT_TYPES)
     db.session.commit()
     return content_type_schema.dump(new_content_type)
 
@@ -248,6 +94,7 @@ def add_content_type():
 def update_content_type(id):
     content_type = ContentType.query.get_or_404(id)
     content_type.name = request.json['name']
+    bump_catalog_version(CONTENT_TYPES)
     db.session.commit()
     return content_type_schema.dump(content_type)
 
@@ -256,30 +103,46 @@ def update_content_type(id):
 def delete_content_type(id):
     content_type = ContentType.query.get_or_404(id)
     db.session.delete(content_type)
+    bump_catalog_version(CONTENT_TYPES, CONTENT)
     db.session.commit()
     return jsonify({'message': 'Content type deleted'})
 
 
 # Country API Endpoints
 # curl -i http://127.0.0.1:5000/api/countries
+# curl -i "http://127.0.0.1:5000/api/countries?limit=50&after=<id>&fields=name"
 @app.route('/api/countries', methods=['GET'])
+@catalog_etag
 def get_countries():
-    all_countries = Country.query.all()
-    result = countries_schema.dump(all_countries)
-    return jsonify(result)
+    args = parse_list_args(Country, Country.identifier)
+    return list_response(Country, Country.identifier, dump_countries, args,
+                         dimension_query(Country))
 
 # curl -i http://127.0.0.1:5000/api/countries/<id>
 @app.route('/api/countries/<int:id>', methods=['GET'])
+@catalog_etag
 def get_country(id):
     country = Country.query.get_or_404(id)
     return country_schema.dump(country)
 
+# Контент, в котором участвует страна (в том числе вместе с другими странами)
+# curl -i "http://127.0.0.1:5000/api/countries/<id>/content?limit=100&after=<show_id>"
+@app.route('/api/countries/<int:id>/content', methods=['GET'])
+@catalog_etag
+def get_country_content(id):
+    Country.query.get_or_404(id)
+    args = parse_list_args(NetflixContent, NetflixContent.show_id)
+    return list_response(NetflixContent, NetflixContent.show_id, dump_contents, args, content_query(), (
+        NetflixContent.show_id.in_(select(ContentCountry.show_id).where(ContentCountry.country_id == id)),
+    ))
+
 # curl -i -H "Content-Type: application/json" -X POST http://127.0.0.1:5000/api/countries -d '{"name": "New Country"}'
 @app.route('/api/countries', methods=['POST'])
 def add_country():
     name = request.json['name']
     new_country = Country(name)
     db.session.add(new_country)
+    bump_catalog_version(COUNTRIES)
     db.session.commit()
     return country_schema.dump(new_country)
 
@@ -287,7 +150,12 @@ def add_country():
 @app.route('/api/countries/<int:id>', methods=['PUT'])
 def update_country(id):
     country = Country.query.get_or_404(id)
+    old_name = country.name
     country.name = request.json['name']
+    db.session.flush()
+    # Новое название попадает в составные названия стран контента и в связи с отдельными странами
+    replace_country_name(db.session.connection(), id, old_name, country.name)
+    bump_catalog_version(COUNTRIES, CONTENT)
     db.session.commit()
     return country_schema.dump(country)
 
@@ -295,21 +163,29 @@ def update_country(id):
 @app.route('/api/countries/<int:id>', methods=['DELETE'])
 def delete_country(id):
     country = Country.query.get_or_404(id)
+    name = country.name
     db.session.delete(country)
+    db.session.flush()
+    # Контент только этой страны удаляется каскадом, из составных названий страна убирается
+    replace_country_name(db.session.connection(), id, name, None)
+    bump_catalog_version(COUNTRIES, CONTENT)
     db.session.commit()
     return jsonify({'message': 'Country deleted'})
 
 
 # Rating API Endpoints
 # curl -i http://127.0.0.1:5000/api/ratings
+# curl -i "http://127.0.0.1:5000/api/ratings?limit=10&after=<id>&fields=name"
 @app.route('/api/ratings', methods=['GET'])
+@catalog_etag
 def get_ratings():
-    all_ratings = Rating.query.all()
-    result = ratings_schema.dump(all_ratings)
-    return jsonify(result)
+    args = parse_list_args(Rating, Rating.identifier)
+    return list_response(Rating, Rating.identifier, dump_ratings, args,
+                         dimension_query(Rating))
 
 # curl -i http://127.0.0.1:5000/api/ratings/<id>
 @app.route('/api/ratings/<int:id>', methods=['GET'])
+@catalog_etag
 def get_rating(id):
     rating = Rating.query.get_or_404(id)
     return rating_schema.dump(rating)
@@ -320,6 +196,7 @@ def add_rating():
     name = request.json['name']
     new_rating = Rating(name)
     db.session.add(new_rating)
+    bump_catalog_version(RATINGS)
     db.session.commit()
     return rating_schema.dump(new_rating)
 
@@ -328,6 +205,7 @@ def add_rating():
 def update_rating(id):
     rating = Rating.query.get_or_404(id)
     rating.name = request.json['name']
+    bump_catalog_version(RATINGS)
     db.session.commit()
     return rating_schema.dump(rating)
 
@@ -336,25 +214,135 @@ def update_rating(id):
 def delete_rating(id):
     rating = Rating.query.get_or_404(id)
     db.session.delete(rating)
+    bump_catalog_version(RATINGS, CONTENT)
     db.session.commit()
     return jsonify({'message': 'Rating deleted'})
 
 
+# People and Genre API Endpoints
+# Персоны и жанры заполняются из полей контента и изменяются только вместе с ним
+# curl -i http://127.0.0.1:5000/api/people
+# curl -i "http://127.0.0.1:5000/api/people?name=Tom%20Hanks"
+@app.route('/api/people', methods=['GET'])
+@catalog_etag
+def get_people():
+    args = parse_list_args(Person, Person.identifier)
+    name = request.args.get('name')
+    return list_response(Person, Person.identifier, dump_people, args, dimension_query(Person),
+                         (Person.name == name,) if name is not None else ())
+
+# curl -i http://127.0.0.1:5000/api/people/<id>
+@app.route('/api/people/<int:id>', methods=['GET'])
+@catalog_etag
+def get_person(id):
+    person = Person.query.get_or_404(id)
+    return jsonify(dump_people([(person.identifier, person.name)])[0])
+
+# Контент с участием персоны; role=director или role=cast ограничивает роль
+# curl -i "http://127.0.0.1:5000/api/people/<id>/content?role=director"
+@app.route('/api/people/<int:id>/content', methods=['GET'])
+@catalog_etag
+def get_person_content(id):
+    Person.query.get_or_404(id)
+    args = parse_list_args(NetflixContent, NetflixContent.show_id)
+    links = select(ContentPerson.show_id).where(ContentPerson.person_id == id)
+    role = request.args.get('role')
+    if role is not None:
+        if role not in (DIRECTOR, CAST):
+            bad_request(f'Параметр role должен быть {DIRECTOR} или {CAST}')
+        links = links.where(ContentPerson.role == role)
+    return list_response(NetflixContent, NetflixContent.show_id, dump_contents, args, content_query(), (
+        NetflixContent.show_id.in_(links),
+    ))
+
+# curl -i http://127.0.0.1:5000/api/genres
+@app.route('/api/genres', methods=['GET'])
+@catalog_etag
+def get_genres():
+    args = parse_list_args(Genre, Genre.identifier)
+    return list_response(Genre, Genre.identifier, dump_genres, args, dimension_query(Genre))
+
+# curl -i http://127.0.0.1:5000/api/genres/<id>
+@app.route('/api/genres/<int:id>', methods=['GET'])
+@catalog_etag
+def get_genre(id):
+    genre = Genre.query.get_or_404(id)
+    return jsonify(dump_genres([(genre.identifier, genre.name)])[0])
+
+# curl -i "http://127.0.0.1:5000/api/genres/<id>/content?limit=100&after=<show_id>"
+@app.route('/api/genres/<int:id>/content', methods=['GET'])
+@catalog_etag
+def get_genre_content(id):
+    Genre.query.get_or_404(id)
+    args = parse_list_args(NetflixContent, NetflixContent.show_id)
+    return list_response(NetflixContent, NetflixContent.show_id, dump_contents, args, content_query(), (
+        NetflixContent.show_id.in_(select(ContentGenre.show_id).where(ContentGenre.genre_id == id)),
+    ))
+
+
 # Netflix Content API Endpoints
 # curl -i http://127.0.0.1:5000/api/content
+# Постранично, с выборкой только нужных полей:
+# curl -i "http://127.0.0.1:5000/api/content?ids=s1,s2,s3"
+# curl -i "http://127.0.0.1:5000/api/content?limit=100&after=<show_id>&fields=title,release_year"
 @app.route('/api/content', methods=['GET'])
+@catalog_etag
 def get_all_content():
-    all_content = NetflixContent.query.all()
-    result = contents_schema.dump(all_content)
-    return jsonify(result)
+    raw_ids = request.args.get('ids')
+    if raw_ids is not None:
+        return content_lookup([show_id.strip() for show_id in raw_ids.split(',') if show_id.strip()])
+    args = parse_list_args(NetflixContent, NetflixContent.show_id)
+    return list_response(NetflixContent, NetflixContent.show_id, dump_contents, args,
+                         content_query())
+
+# Получение многих записей по show_id за один запрос; для длинных списков — POST с телом
+# curl -i -H "Content-Type: application/json" -X POST http://127.0.0.1:5000/api/content/lookup -d '{"ids": ["s1", "s2", "s3"]}'
+@app.route('/api/content/lookup', methods=['POST'])
+def lookup_content():
+    body = request.json
+    show_ids = body.get('ids') if isinstance(body, dict) else None
+    if not isinstance(show_ids, list) or not all(isinstance(show_id, str) for show_id in show_ids):
+        bad_request('Ожидается объект вида {"ids": ["s1", "s2"]}')
+    return content_lookup(show_ids)
+
+def content_lookup(show_ids):
+    if len(show_ids) > MAX_LOOKUP_IDS:
+        bad_request(f'За один запрос можно получить не более {MAX_LOOKUP_IDS} записей')
+    return jsonify(lookup_contents(show_ids))
+
+# Потоковая выгрузка всего каталога
+# curl -i "http://127.0.0.1:5000/api/content/export?format=ndjson"
+# curl -i "http://127.0.0.1:5000/api/content/export?format=csv"
+@app.route('/api/content/export', methods=['GET'])
+@catalog_etag
+def export_content():
+    export_format = request.args.get('format', 'ndjson')
+    if export_format == 'ndjson':
+        return Response(stream_with_context(export_ndjson(content_query())),
+                        mimetype='application/x-ndjson')
+    if export_format == 'csv':
+        return Response(stream_with_context(export_csv(content_query())),
+                        mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=netflix_content.csv'})
+    bad_request('Параметр format должен быть ndjson или csv')
 
 # curl -i http://127.0.0.1:5000/api/content/<show_id>
 @app.route('/api/content/<string:show_id>', methods=['GET'])
+@catalog_etag
 def get_content(show_id):
     content = NetflixContent.query.get_or_404(show_id)
     return content_schema.dump(content)
 
-# curl -i -H "Content-Type: application/json" -X POST http://127.0.0.1:5000/api/content -d '{"show_id": "1", "title": "New Show", "type_id": 1, "director": "Director Name", "cast": "Cast Name", "country_id": 1, "date_added": "2023-01-01", "release_year": 2023, "rating_id": 1, "duration_minutes": 120, "duration_seasons": 3}'
+def parse_date_added(value):
+    # Столбец Date принимает только объект date, а из JSON приходит строка 'YYYY-MM-DD'
+    if value is None:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        bad_request('Поле date_added должно быть датой в формате YYYY-MM-DD')
+    return parsed
+
+# curl -i -H "Content-Type: application/json" -X POST http://127.0.0.1:5000/api/content -d '{"show_id": "1", "title": "New Show", "type_id": 1, "director": "Director Name", "cast": "Cast Name", "country_id": 1, "date_added": "2023-01-01", "release_year": 2023, "rating_id": 1, "duration_minutes": 120, "duration_seasons": 3, "listed_in": "Dramas", "description": "Short description"}'
 @app.route('/api/content', methods=['POST'])
 def add_content():
     data = request.json
@@ -365,13 +353,16 @@ def add_content():
         director=data.get('director'),
         cast=data.get('cast'),
         country_id=data.get('country_id'),
-        date_added=data.get('date_added'),
+        date_added=parse_date_added(data.get('date_added')),
         release_year=data.get('release_year'),
         rating_id=data.get('rating_id'),
         duration_minutes=data.get('duration_minutes'),
-        duration_seasons=data.get('duration_seasons')
+        duration_seasons=data.get('duration_seasons'),
+        listed_in=data.get('listed_in'),
+        description=data.get('description')
     )
     db.session.add(new_content)
+    bump_catalog_version(CONTENT)
     db.session.commit()
     return content_schema.dump(new_content)
 
@@ -386,12 +377,16 @@ def update_content(show_id):
     content.director = data.get('director', content.director)
     content.cast = data.get('cast', content.cast)
     content.country_id = data.get('country_id', content.country_id)
-    content.date_added = data.get('date_added', content.date_added)
+    if 'date_added' in data:
+        content.date_added = parse_date_added(data['date_added'])
     content.release_year = data.get('release_year', content.release_year)
     content.rating_id = data.get('rating_id', content.rating_id)
     content.duration_minutes = data.get('duration_minutes', content.duration_minutes)
     content.duration_seasons = data.get('duration_seasons', content.duration_seasons)
+    content.listed_in = data.get('listed_in', content.listed_in)
+    content.description = data.get('description', content.description)
 
+    bump_catalog_version(CONTENT)
     db.session.commit()
     return content_schema.dump(content)
 
@@ -400,46 +395,121 @@ def update_content(show_id):
 def delete_content(show_id):
     content = NetflixContent.query.get_or_404(show_id)
     db.session.delete(content)
+    bump_catalog_version(CONTENT)
     db.session.commit()
     return jsonify({'message': 'Content deleted'})
 
+# Полнотекстовый поиск по названию, режиссёру, актёрам, жанрам и описанию; результаты по убыванию релевантности.
+# next_cursor — смещение следующей страницы, передаётся в after
+# curl -i "http://127.0.0.1:5000/api/search?q=space%20comedy&limit=20"
+@app.route('/api/search', methods=['GET'])
+@catalog_etag
+def search_content():
+    expression = match_expression(request.args.get('q', ''))
+    if expression is None:
+        bad_request('Параметр q должен содержать хотя бы одно слово')
+    limit = parse_limit(DEFAULT_LIMIT)
+    try:
+        offset = int(request.args.get('after', 0))
+    except ValueError:
+        bad_request('Некорректное значение курсора after')
+    if offset < 0:
+        bad_request('Некорректное значение курсора after')
+
+    # Лишняя строка показывает, есть ли следующая страница
+    rows = db.session.execute(search_statement(expression, content_query(), limit + 1, offset)).all()
+    next_cursor = offset + limit if len(rows) > limit else None
+    return jsonify({'items': dump_contents(rows[:limit]), 'next_cursor': next_cursor})
+
+# Пакетные операции: пакет проверяется целиком и применяется одной транзакцией либо не применяется вовсе
+# curl -i -H "Content-Type: application/json" -X POST http://127.0.0.1:5000/api/content/bulk -d '[{"show_id": "n1", "title": "New Show", "type_id": 1}, {"show_id": "n2", "title": "Other Show", "type_id": 2, "date_added": "2023-01-01"}]'
+@app.route('/api/content/bulk', methods=['POST'])
+def add_content_bulk():
+    values, errors = validate_items(request.json, creating=True)
+    if errors is None:
+        bad_request('Ожидается массив объектов контента')
+    return apply_bulk(bulk_create, values, [item.get('show_id') for item in values], errors, 'created')
+
+# curl -i -H "Content-Type: application/json" -X PUT http://127.0.0.1:5000/api/content/bulk -d '[{"show_id": "n1", "title": "Updated Show"}, {"show_id": "n2", "release_year": 2020}]'
+@app.route('/api/content/bulk', methods=['PUT'])
+def update_content_bulk():
+    values, errors = validate_items(request.json, creating=False)
+    if errors is None:
+        bad_request('Ожидается массив объектов контента')
+    return apply_bulk(bulk_update, values, [item.get('show_id') for item in values], errors, 'updated')
+
+# curl -i -H "Content-Type: application/json" -X DELETE http://127.0.0.1:5000/api/content/bulk -d '["n1", "n2"]'
+@app.route('/api/content/bulk', methods=['DELETE'])
+def delete_content_bulk():
+    show_ids = request.json
+    errors = validate_ids(show_ids)
+    if errors is None:
+        bad_request('Ожидается массив show_id')
+    return apply_bulk(bulk_delete, show_ids, show_ids, errors, 'deleted')
+
+def apply_bulk(operation, values, show_ids, errors, status):
+    if any(errors):
+        return jsonify({
+            'message': 'Пакет не применён: есть ошибки',
+            'results': item_results(show_ids, errors, 'valid')
+        }), 400
+    if values:
+        operation(values)
+        bump_catalog_version(CONTENT)
+        db.session.commit()
+    return jsonify({'results': item_results(show_ids, errors, status)})
+
 # curl -i http://127.0.0.1:5000/api/stats/content-by-country
 @app.route('/api/stats/content-by-country', methods=['GET'])
+@catalog_etag
+@cached_result(CONTENT, COUNTRIES)
 def content_by_country():
-    stats = db.session.query(
-        Country.name,
-        func.count(NetflixContent.show_id).label('content_count')
-    ).join(
-        NetflixContent, NetflixContent.country_id == Country.identifier
-    ).group_by(
-        Country.name
-    ).order_by(
-        func.count(NetflixContent.show_id).desc()
-    ).all()
+    # Количество по отдельным странам: запись с "United States, India" учитывается в обеих
+    snapshot = columnar_snapshot()
+    if snapshot is not None:
+        stats = snapshot.count_by_country()
+    else:
+        stats = db.session.query(
+            Country.name,
+            func.sum(CountrySummary.content_count).label('content_count')
+        ).join(
+            CountrySummary, CountrySummary.country_id == Country.identifier
+        ).group_by(
+            Country.name
+        ).order_by(
+            func.sum(CountrySummary.content_count).desc(),
+            Country.name
+        ).all()
 
     return jsonify([{'country': name, 'content_count': count} for name, count in stats])
 
 
 # curl -i http://127.0.0.1:5000/api/stats/min-max-avg-duration
 @app.route('/api/stats/min-max-avg-duration', methods=['GET'])
+@catalog_etag
+@cached_result(CONTENT, CONTENT_TYPES)
 def min_max_avg_duration():
-    stats = db.session.query(
-        NetflixContent.release_year,
-        func.min(NetflixContent.duration_minutes).label('min_duration'),
-        func.max(NetflixContent.duration_minutes).label('max_duration'),
-        func.avg(NetflixContent.duration_minutes).label('avg_duration'),
-        func.count(NetflixContent.show_id).label('movie_count')
-    ).join(
-        ContentType, NetflixContent.type_id == ContentType.identifier
-    ).filter(
-        ContentType.name == 'Movie',
-        NetflixContent.duration_minutes.isnot(None),
-        NetflixContent.release_year.isnot(None)
-    ).group_by(
-        NetflixContent.release_year
-    ).order_by(
-        NetflixContent.release_year.desc()
-    ).all()
+    snapshot = columnar_snapshot()
+    if snapshot is not None:
+        stats = snapshot.duration_by_release_year('Movie')
+    else:
+        stats = db.session.query(
+            NetflixContent.release_year,
+            func.min(NetflixContent.duration_minutes).label('min_duration'),
+            func.max(NetflixContent.duration_minutes).label('max_duration'),
+            func.avg(NetflixContent.duration_minutes).label('avg_duration'),
+            func.count(NetflixContent.show_id).label('movie_count')
+        ).join(
+            ContentType, NetflixContent.type_id == ContentType.identifier
+        ).filter(
+            ContentType.name == 'Movie',
+            NetflixContent.duration_minutes.isnot(None),
+            NetflixContent.release_year.isnot(None)
+        ).group_by(
+            NetflixContent.release_year
+        ).order_by(
+            NetflixContent.release_year.desc()
+        ).all()
 
     return jsonify([{
         'release_year': year,
@@ -452,22 +522,29 @@ def min_max_avg_duration():
 
 # curl -i http://127.0.0.1:5000/api/stats/content-by-type-and-rating
 @app.route('/api/stats/content-by-type-and-rating', methods=['GET'])
+@catalog_etag
+@cached_result(CONTENT, CONTENT_TYPES, RATINGS)
 def content_by_type_and_rating():
-    stats = db.session.query(
-        ContentType.name.label('type_name'),
-        Rating.name.label('rating_name'),
-        func.count(NetflixContent.show_id).label('content_count')
-    ).join(
-        ContentType, NetflixContent.type_id == ContentType.identifier
-    ).join(
-        Rating, NetflixContent.rating_id == Rating.identifier
-    ).group_by(
-        ContentType.name,
-        Rating.name
-    ).order_by(
-        ContentType.name,
-        func.count(NetflixContent.show_id).desc()
-    ).all()
+    snapshot = columnar_snapshot()
+    if snapshot is not None:
+        stats = snapshot.count_by_type_and_rating()
+    else:
+        stats = db.session.query(
+            ContentType.name.label('type_name'),
+            Rating.name.label('rating_name'),
+            func.count(NetflixContent.show_id).label('content_count')
+        ).join(
+            ContentType, NetflixContent.type_id == ContentType.identifier
+        ).join(
+            Rating, NetflixContent.rating_id == Rating.identifier
+        ).group_by(
+            ContentType.name,
+            Rating.name
+        ).order_by(
+            ContentType.name,
+            func.count(NetflixContent.show_id).desc(),
+            Rating.name
+        ).all()
 
     return jsonify([{
         'type': type_name,
@@ -479,46 +556,258 @@ def content_by_type_and_rating():
 
 # curl -i http://127.0.0.1:5000/api/stats/avg-duration
 @app.route('/api/stats/avg-duration', methods=['GET'])
+@catalog_etag
+@cached_result(CONTENT, CONTENT_TYPES)
 def avg_duration():
-    avg_duration = db.session.query(
-        func.avg(NetflixContent.duration_minutes).label('avg_duration')
-    ).join(
-        ContentType, NetflixContent.type_id == ContentType.identifier
-    ).filter(
-        ContentType.name == 'Movie',
-        NetflixContent.duration_minutes.isnot(None)
-    ).scalar()
+    snapshot = columnar_snapshot()
+    if snapshot is not None:
+        avg_duration = snapshot.duration_summary('Movie')[2]
+    else:
+        avg_duration = db.session.query(
+            func.avg(NetflixContent.duration_minutes).label('avg_duration')
+        ).join(
+            ContentType, NetflixContent.type_id == ContentType.identifier
+        ).filter(
+            ContentType.name == 'Movie',
+            NetflixContent.duration_minutes.isnot(None)
+        ).scalar()
 
     return jsonify({'avg_duration': avg_duration})
 
 # curl -i http://127.0.0.1:5000/api/stats/min-duration
 @app.route('/api/stats/min-duration', methods=['GET'])
+@catalog_etag
+@cached_result(CONTENT, CONTENT_TYPES)
 def min_duration():
-    min_duration = db.session.query(
-        func.min(NetflixContent.duration_minutes).label('min_duration')
-    ).join(
-        ContentType, NetflixContent.type_id == ContentType.identifier
-    ).filter(
-        ContentType.name == 'Movie',
-        NetflixContent.duration_minutes.isnot(None)
-    ).scalar()
+    snapshot = columnar_snapshot()
+    if snapshot is not None:
+        min_duration = snapshot.duration_summary('Movie')[0]
+    else:
+        min_duration = db.session.query(
+            func.min(NetflixContent.duration_minutes).label('min_duration')
+        ).join(
+            ContentType, NetflixContent.type_id == ContentType.identifier
+        ).filter(
+            ContentType.name == 'Movie',
+            NetflixContent.duration_minutes.isnot(None)
+        ).scalar()
 
     return jsonify({'min_duration': min_duration})
 
 # curl -i http://127.0.0.1:5000/api/stats/max-duration
 @app.route('/api/stats/max-duration', methods=['GET'])
+@catalog_etag
+@cached_result(CONTENT, CONTENT_TYPES)
 def max_duration():
-    max_duration = db.session.query(
-        func.max(NetflixContent.duration_minutes).label('max_duration')
-    ).join(
-        ContentType, NetflixContent.type_id == ContentType.identifier
-    ).filter(
-        ContentType.name == 'Movie',
-        NetflixContent.duration_minutes.isnot(None)
-    ).scalar()
+    snapshot = columnar_snapshot()
+    if snapshot is not None:
+        max_duration = snapshot.duration_summary('Movie')[1]
+    else:
+        max_duration = db.session.query(
+            func.max(NetflixContent.duration_minutes).label('max_duration')
+        ).join(
+            ContentType, NetflixContent.type_id == ContentType.identifier
+        ).filter(
+            ContentType.name == 'Movie',
+            NetflixContent.duration_minutes.isnot(None)
+        ).scalar()
 
     return jsonify({'max_duration': max_duration})
 
+def parse_measure_args():
+    # Параметры гистограммы: measure — числовой столбец, type — название типа контента
+    measure = request.args.get('measure', 'duration_minutes')
+    if measure not in MEASURES:
+        bad_request(f"Параметр measure должен быть одним из: {', '.join(MEASURES)}")
+    return measure, request.args.get('type')
+
+def measure_query(column, type_name):
+    query = db.session.query(column).filter(column.isnot(None))
+    if type_name is not None:
+        query = query.join(
+            ContentType, NetflixContent.type_id == ContentType.identifier
+        ).filter(
+            ContentType.name == type_name
+        )
+    return query
+
+# Гистограмма значений столбца с корзинами ширины width
+# curl -i "http://127.0.0.1:5000/api/stats/histogram?measure=duration_minutes&type=Movie&width=10"
+@app.route('/api/stats/histogram', methods=['GET'])
+@catalog_etag
+@cached_result(CONTENT, CONTENT_TYPES)
+def histogram():
+    measure, type_name = parse_measure_args()
+    width = request.args.get('width', '10')
+    if not width.isdigit() or int(width) < 1:
+        bad_request('Параметр width должен быть положительным целым числом')
+    width = int(width)
+
+    snapshot = columnar_snapshot()
+    if snapshot is not None:
+        buckets = snapshot.histogram(measure, type_name, width)
+    else:
+        column = getattr(NetflixContent, measure)
+        bucket = (column // width) * width
+        buckets = measure_query(column, type_name).with_entities(
+            bucket, func.count()
+        ).group_by(
+            bucket
+        ).order_by(
+            bucket
+        ).all()
+
+    return jsonify([{'from': start, 'to': start + width, 'count': count} for start, count in buckets])
+
+# Произвольная группировка с агрегатами одним SQL-запросом.
+# group_by: type, rating, release_year, year_added, country, genre, director, actor (до трёх через запятую);
+# metric: count, avg|sum|min|max:<duration_minutes|duration_seasons|release_year|year_added>;
+# filter: <поле><оператор><значение>, несколько — через ';' или повтором параметра;
+# order_by: измерение или метрика, '-' в начале — по убыванию; limit — число строк
+# curl -i "http://127.0.0.1:5000/api/stats/query?group_by=type,rating&metric=count,avg:duration_minutes&filter=release_year>=2015"
+# curl -i "http://127.0.0.1:5000/api/stats/query?group_by=country&metric=count&filter=type=Movie&order_by=-count&limit=10"
+@app.route('/api/stats/query', methods=['GET'])
+@catalog_etag
+@cached_result(CONTENT, CONTENT_TYPES, COUNTRIES, RATINGS)
+def stats_query():
+    shape, values, limit = parse_query_args()
+    rows = db.session.execute(compile_query(shape), query_parameters(values, limit)).all()
+    return jsonify([row._asdict() for row in rows])
+
+def parse_breakdown():
+    dimension = request.args.get('by', 'all')
+    if dimension not in sketches.BREAKDOWNS:
+        bad_request(f"Параметр by должен быть одним из: {', '.join(sketches.BREAKDOWNS)}")
+    return dimension
+
+def parse_sketch_args():
+    # Общие параметры топов: measure — показатель эскиза, by — разрез, exact=1 — точный расчёт по контенту
+    measure = request.args.get('measure', 'duration_minutes')
+    if measure not in sketches.MEASURES:
+        bad_request(f"Параметр measure должен быть одним из: {', '.join(sketches.MEASURES)}")
+    return measure, parse_breakdown(), request.args.get('exact') == '1'
+
+def group_labels(dimension, values):
+    # Значение разреза -> подпись: название типа или рейтинга, год выпуска; для всего каталога — None
+    if dimension == 'type':
+        return dict(db.session.execute(select(ContentType.identifier, ContentType.name)).all())
+    if dimension == 'rating':
+        return dict(db.session.execute(select(Rating.identifier, Rating.name)).all())
+    return {value: None if dimension == 'all' else value for value in values}
+
+def ranked_percentiles(measure, percents):
+    # Весь каталог без снимка: значение нужного ранга берётся по индексу столбца (OFFSET), без чтения всех значений
+    column = getattr(NetflixContent, measure)
+    query = db.session.query(column).filter(column.isnot(None))
+    count = query.count()
+    if not count:
+        return {}
+    return {0: (count, [
+        query.order_by(column).offset(percentile_rank(percent, count) - 1).limit(1).scalar() for percent in percents
+    ])}
+
+# Процентили показателя в каждой группе разреза by (all, type, rating, release_year); p — процентили через запятую.
+# По умолчанию точные значения по методу ближайшего ранга — значение с номером ceil(p * n / 100) в упорядоченной
+# выборке — из снимка NumPy или SQL. exact=0 — оценка по эскизам с погрешностью не больше 1% без чтения контента,
+# только для duration_minutes и duration_seasons: для частых запросов на больших каталогах без NumPy
+# curl -i "http://127.0.0.1:5000/api/stats/percentiles?measure=duration_minutes&by=type&p=50,90,99"
+# curl -i "http://127.0.0.1:5000/api/stats/percentiles?measure=duration_minutes&by=rating&exact=0"
+@app.route('/api/stats/percentiles', methods=['GET'])
+@catalog_etag
+@cached_result(CONTENT, CONTENT_TYPES, RATINGS)
+def percentiles():
+    exact = request.args.get('exact', '1') != '0'
+    measures = MEASURES if exact else sketches.MEASURES
+    measure = request.args.get('measure', 'duration_minutes')
+    if measure not in measures:
+        bad_request(f"Параметр measure должен быть одним из: {', '.join(measures)}")
+    dimension = parse_breakdown()
+    try:
+        percents = [float(value) for value in request.args.get('p', '50,90,95,99').split(',')]
+    except ValueError:
+        bad_request('Параметр p должен быть списком чисел через запятую')
+    if not all(0 < percent <= 100 for percent in percents):
+        bad_request('Процентили должны быть в диапазоне (0, 100]')
+
+    if not exact:
+        groups = sketches.sketch_percentiles(measure, dimension, percents)
+    else:
+        snapshot = columnar_snapshot()
+        if snapshot is not None:
+            groups = snapshot.percentiles(measure, sketches.BREAKDOWNS[dimension], percents)
+        elif dimension == 'all':
+            groups = ranked_percentiles(measure, percents)
+        else:
+            groups = sketches.exact_percentiles(measure, dimension, percents)
+    labels = group_labels(dimension, groups)
+    return jsonify({'measure': measure, 'by': dimension, 'exact': exact, 'groups': [
+        {'group': labels.get(value), 'count': count,
+         'percentiles': [{'p': percent, 'value': estimate} for percent, estimate in zip(percents, estimates)]}
+        for value, (count, estimates) in groups.items()
+    ]})
+
+# Записи с наибольшим значением показателя в каждой группе разреза, k — не больше TOP_K;
+# при равенстве значений — по show_id. exact=1 — расчёт по таблице контента
+# curl -i "http://127.0.0.1:5000/api/stats/top?measure=duration_minutes&by=type&k=5"
+# curl -i "http://127.0.0.1:5000/api/stats/top?measure=duration_seasons&by=rating&k=3&exact=1"
+@app.route('/api/stats/top', methods=['GET'])
+@catalog_etag
+@cached_result(CONTENT, CONTENT_TYPES, RATINGS)
+def top_content():
+    measure, dimension, exact = parse_sketch_args()
+    k = request.args.get('k', '10')
+    if not k.isdigit() or not 1 <= int(k) <= sketches.TOP_K:
+        bad_request(f'Параметр k должен быть целым числом от 1 до {sketches.TOP_K}')
+    k = int(k)
+
+    groups = (sketches.exact_top if exact else sketches.sketch_top)(measure, dimension, k)
+    show_ids = [show_id for items in groups.values() for show_id, _ in items]
+    titles = {}
+    for start in range(0, len(show_ids), sketches.IN_CHUNK_SIZE):
+        titles.update(db.session.execute(select(NetflixContent.show_id, NetflixContent.title).where(
+            NetflixContent.show_id.in_(show_ids[start:start + sketches.IN_CHUNK_SIZE])
+        )).all())
+    labels = group_labels(dimension, groups)
+    return jsonify({'measure': measure, 'by': dimension, 'exact': exact, 'groups': [
+        {'group': labels.get(value), 'items': [
+            {'show_id': show_id, 'title': titles.get(show_id), 'value': amount} for show_id, amount in items
+        ]}
+        for value, items in groups.items()
+    ]})
+
+# Счётчики кэша результатов /api/stats/*, кэша запросов /api/stats/query и кэша фрагментов главной страницы
+# curl -i http://127.0.0.1:5000/api/stats/cache
+@app.route('/api/stats/cache', methods=['GET'])
+def stats_cache_info():
+    return jsonify(dict(stats_cache.stats(), compiled_queries=compile_query.cache_info()._asdict(),
+                        fragments=fragment_cache.stats()))
+
+# Метрики запросов в формате Prometheus
+# curl -i http://127.0.0.1:5000/metrics
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(metrics_text(), mimetype='text/plain; version=0.0.4')
+
+# Самые медленные SQL-запросы с планами; order_by: total_ms, max_ms, avg_ms, count; DELETE очищает сводку.
+# Доступно только при SLOW_QUERY_DEBUG_ENDPOINT или в режиме отладки (проверяется при каждом запросе,
+# поэтому учитывается и app.run(debug=True)); иначе 404, как у несуществующего маршрута
+# curl -i "http://127.0.0.1:5000/api/debug/slow-queries?limit=10&order_by=max_ms"
+@app.route('/api/debug/slow-queries', methods=['GET', 'DELETE'])
+def slow_queries():
+    if not (app.config['SLOW_QUERY_DEBUG_ENDPOINT'] or app.debug):
+        abort(404)
+    if request.method == 'DELETE':
+        slow_query_log.clear()
+        return jsonify({'message': 'Сводка медленных запросов очищена'})
+    order_by = request.args.get('order_by', 'total_ms')
+    if order_by not in SLOW_QUERY_ORDERS:
+        bad_request(f"Параметр order_by должен быть одним из: {', '.join(SLOW_QUERY_ORDERS)}")
+    return jsonify({
+        'threshold_ms': app.config['SLOW_QUERY_MS'],
+        'items': slow_query_log.top(parse_limit(20), order_by)
+    })
+
+
 # Все виды контента
 # curl -i http://127.0.0.1:5000/api/content-types
 
@@ -0,0 +1,109 @@
+from sqlalchemy import func, select, delete, inspect
+from sqlalchemy.dialects.sqlite import insert
+from models import db, NetflixContent, ReleaseYearSummary, YearAddedSummary
+from content_changes import on_content_change, on_content_rebuild
+
+# Поля контента, от которых зависят сводные таблицы
+SUMMARY_FIELDS = ('type_id', 'release_year', 'date_added', 'duration_minutes')
+# Сводка по странам (CountrySummary) считается по отдельным странам и поддерживается в associations.py
+
+
+def year_of(value):
+    # date_added — объект date: строки 'YYYY-MM-DD' из API разбираются до записи (structures/bulk.parse_date)
+    if value is None:
+        return None
+    return str(value)[:4]
+
+
+def upsert_counts(connection, model, key_fields, rows):
+    # Прибавление дельт к строкам сводки одним executemany; обнулившиеся строки удаляются
+    if not rows:
+        return
+    columns = inspect(model).columns
+    statement = insert(model.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=[columns[field] for field in key_fields],
+        set_={
+            columns[field].key: columns[field] + statement.excluded[columns[field].key]
+            for field in rows[0] if field not in key_fields
+        }
+    )
+    connection.execute(statement, [{columns[field].key: value for field, value in row.items()} for row in rows])
+    connection.execute(delete(model.__table__).where(columns['content_count'] == 0))
+
+
+@on_content_change(SUMMARY_FIELDS)
+def apply_summary_delta(connection, removed=(), added=()):
+    # removed и added — словари с полями SUMMARY_FIELDS для удалённых и добавленных записей.
+    # Изменение записи учитывается как удаление старой версии и добавление новой.
+    release_years = {}
+    years_added = {}
+    for sign, rows in ((-1, removed), (1, added)):
+        for row in rows:
+            type_key = row['type_id'] or 0
+            delta = release_years.setdefault((row['release_year'] or 0, type_key), [0, 0, 0])
+            delta[0] += sign
+            if row['duration_minutes'] is not None:
+                delta[1] += sign
+                delta[2] += sign * row['duration_minutes']
+
+            year_added = year_of(row['date_added'])
+            if year_added is not None:
+                key = (year_added, type_key)
+                years_added[key] = years_added.get(key, 0) + sign
+
+    upsert_counts(connection, ReleaseYearSummary, ('release_year', 'type_id'), [
+        {'release_year': year, 'type_id': type_id, 'content_count': count,
+         'minutes_count': minutes_count, 'minutes_sum': minutes_sum}
+        for (year, type_id), (count, minutes_count, minutes_sum) in release_years.items()
+        if count or minutes_count or minutes_sum
+    ])
+    upsert_counts(connection, YearAddedSummary, ('year_added', 'type_id'), [
+        {'year_added': year, 'type_id': type_id, 'content_count': count}
+        for (year, type_id), count in years_added.items() if count
+    ])
+
+
+@on_content_rebuild
+def rebuild_summaries(connection):
+    # Полный пересчёт сводок; используется после полной загрузки CSV
+    for model in (ReleaseYearSummary, YearAddedSummary):
+        connection.execute(delete(model.__table__))
+
+    connection.execute(insert(ReleaseYearSummary.__table__).from_select(
+        [ReleaseYearSummary.release_year, ReleaseYearSummary.type_id, ReleaseYearSummary.content_count,
+         ReleaseYearSummary.minutes_count, ReleaseYearSummary.minutes_sum],
+        select(
+            func.coalesce(NetflixContent.release_year, 0),
+            func.coalesce(NetflixContent.type_id, 0),
+            func.count(),
+            func.count(NetflixContent.duration_minutes),
+            func.coalesce(func.sum(NetflixContent.duration_minutes), 0)
+        ).group_by(
+            func.coalesce(NetflixContent.release_year, 0),
+            func.coalesce(NetflixContent.type_id, 0)
+        )
+    ))
+
+    connection.execute(insert(YearAddedSummary.__table__).from_select(
+        [YearAddedSummary.year_added, YearAddedSummary.type_id, YearAddedSummary.content_count],
+        select(
+            db.cast(NetflixContent.year_added, db.String),
+            func.coalesce(NetflixContent.type_id, 0),
+            func.count()
+        ).where(
+            NetflixContent.year_added.isnot(None)
+        ).group_by(
+            NetflixContent.year_added,
+            func.coalesce(NetflixContent.type_id, 0)
+        )
+    ))
+
+
+def ensure_summaries():
+    # Базы, созданные до появления сводок, заполняются при первом запуске
+    has_content = db.session.execute(select(NetflixContent.show_id).limit(1)).first() is not None
+    has_summary = db.session.execute(select(ReleaseYearSummary.release_year).limit(1)).first() is not None
+    if has_content and not has_summary:
+        rebuild_summaries(db.session.connection())
+        db.session.commit()
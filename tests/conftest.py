@@ -0,0 +1,30 @@
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Тесты работают с копией instance/dataset.db. Конфигурация читается при первом импорте config,
+# поэтому база подменяется здесь, до импорта тестовых модулей
+DATABASE_DIR = tempfile.mkdtemp(prefix='practice_tests_')
+shutil.copy(os.path.join(ROOT, 'instance', 'dataset.db'), os.path.join(DATABASE_DIR, 'dataset.db'))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DATABASE_DIR, 'dataset.db')
+os.environ['SLOW_QUERY_LOG'] = os.path.join(DATABASE_DIR, 'slow_queries.log')
+
+
+@pytest.fixture(scope='session')
+def database():
+    from app import app
+    from init_db import init_database
+    init_database()
+    app.config['COLUMNAR_ENGINE'] = False
+    yield app
+    shutil.rmtree(DATABASE_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client(database):
+    return database.test_client()
@@ -0,0 +1,15 @@
+def test_delete_bulk_rejects_non_string_ids(client):
+    response = client.delete('/api/content/bulk', json=[['s1'], {'a': 1}, 's1', 's1'])
+    assert response.status_code == 400
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['invalid', 'invalid', 'valid', 'invalid']
+    assert results[0]['errors'] == ['Ожидается строка show_id']
+    assert results[1]['errors'] == ['Ожидается строка show_id']
+    assert results[3]['errors'] == ['show_id s1 повторяется в пакете']
+
+
+def test_missing_show_id_is_not_reported_as_duplicate(client):
+    response = client.put('/api/content/bulk', json=[{'title': 'a'}, {'show_id': 5, 'title': 'b'}])
+    assert response.status_code == 400
+    for result in response.get_json()['results']:
+        assert not any('повторяется' in error for error in result['errors'])
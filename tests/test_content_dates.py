@@ -0,0 +1,19 @@
+from models import db, NetflixContent
+
+
+def test_date_added_string_is_parsed(database, client):
+    response = client.post('/api/content', json={
+        'show_id': 'date-test', 'title': 'Date test', 'type_id': 1, 'date_added': '2023-01-15'
+    })
+    assert response.status_code == 200
+    assert client.put('/api/content/date-test', json={'date_added': '2021-06-01'}).status_code == 200
+    with database.app_context():
+        content = db.session.get(NetflixContent, 'date-test')
+        assert (str(content.date_added), content.year_added) == ('2021-06-01', 2021)
+
+
+def test_invalid_date_added_is_rejected(client):
+    response = client.post('/api/content', json={
+        'show_id': 'date-bad', 'title': 'Date test', 'type_id': 1, 'date_added': '15.01.2023'
+    })
+    assert response.status_code == 400
@@ -0,0 +1,51 @@
+from sqlalchemy import select
+from models import db, Country, CountrySummary, ContentCountry
+from associations import rebuild_associations
+
+
+def country_state():
+    # Связи и сводка по названиям стран: после пересборки идентификаторы строк могут отличаться
+    links = db.session.execute(
+        select(ContentCountry.show_id, Country.name).join(Country, Country.identifier == ContentCountry.country_id)
+    ).all()
+    summary = db.session.execute(
+        select(Country.name, CountrySummary.content_count).join(Country, Country.identifier == CountrySummary.country_id)
+    ).all()
+    return sorted(links), sorted(summary)
+
+
+def assert_matches_rebuild(app):
+    with app.app_context():
+        incremental = country_state()
+        rebuild_associations(db.session.connection())
+        rebuilt = country_state()
+        db.session.rollback()
+    assert incremental == rebuilt
+
+
+def country_id(app, name):
+    with app.app_context():
+        return db.session.execute(select(Country.identifier).where(Country.name == name)).scalar()
+
+
+def test_delete_country_matches_rebuild(database, client):
+    identifier = country_id(database, 'South Africa')
+    assert client.delete(f'/api/countries/{identifier}').status_code == 200
+    assert_matches_rebuild(database)
+    with database.app_context():
+        assert not db.session.execute(select(Country).where(Country.name.contains('South Africa'))).first()
+
+
+def test_rename_country_matches_rebuild(database, client):
+    identifier = country_id(database, 'India')
+    assert client.put(f'/api/countries/{identifier}', json={'name': 'Bharat'}).status_code == 200
+    assert_matches_rebuild(database)
+    with database.app_context():
+        assert not db.session.execute(select(Country).where(Country.name.contains('India'))).first()
+
+
+def test_rename_combined_country_matches_rebuild(database, client):
+    with database.app_context():
+        identifier = db.session.execute(select(Country.identifier).where(Country.name.like('%, %')).limit(1)).scalar()
+    assert client.put(f'/api/countries/{identifier}', json={'name': 'France, Japan'}).status_code == 200
+    assert_matches_rebuild(database)
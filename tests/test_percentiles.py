@@ -0,0 +1,38 @@
+import pytest
+from columnar import np, columnar_engine
+from structures.cache import stats_cache
+
+URL = '/api/stats/percentiles?measure=duration_minutes&by=rating&p=10,50,99'
+
+
+def get_percentiles(database, client, url, columnar):
+    database.config['COLUMNAR_ENGINE'] = columnar
+    stats_cache.entries.clear()
+    try:
+        if columnar:
+            client.get(url)
+            columnar_engine.wait()
+            stats_cache.entries.clear()
+        response = client.get(url)
+    finally:
+        database.config['COLUMNAR_ENGINE'] = False
+    assert response.status_code == 200
+    return response.get_json()
+
+
+@pytest.mark.skipif(np is None, reason='NumPy не установлен')
+def test_exact_percentiles_match_sql(database, client):
+    assert get_percentiles(database, client, URL, True) == get_percentiles(database, client, URL, False)
+
+
+def test_sketch_percentiles_within_accuracy(database, client):
+    exact = get_percentiles(database, client, URL, False)['groups']
+    sketch = get_percentiles(database, client, URL + '&exact=0', False)['groups']
+    assert [group['count'] for group in sketch] == [group['count'] for group in exact]
+    for exact_group, sketch_group in zip(exact, sketch):
+        for exact_value, estimate in zip(exact_group['percentiles'], sketch_group['percentiles']):
+            assert abs(estimate['value'] - exact_value['value']) <= 0.01 * exact_value['value'] + 0.01
+
+
+def test_sketch_requires_sketch_measure(client):
+    assert client.get('/api/stats/percentiles?measure=release_year&exact=0').status_code == 400
@@ -0,0 +1,15 @@
+def test_debug_endpoint_hidden_by_default(client):
+    assert client.get('/api/debug/slow-queries').status_code == 404
+    assert client.delete('/api/debug/slow-queries').status_code == 404
+
+
+def test_debug_endpoint_follows_debug_mode_at_request_time(database, client):
+    # app.run(debug=True) включает отладку уже после регистрации маршрутов
+    database.debug = True
+    try:
+        response = client.get('/api/debug/slow-queries')
+    finally:
+        database.debug = False
+    assert response.status_code == 200
+    for item in response.get_json()['items']:
+        assert 'slowest_parameters' not in item
@@ -1,112 +1,421 @@
 import csv
+import hashlib
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from sqlalchemy import insert, select, update, delete, exists
+import click
 from config import app
-from models import db, ContentType, Country, Rating, NetflixContent
+from init_db import init_database
+from models import (
+    db, ContentType, Country, Rating, NetflixContent, ContentFingerprint, SourceFingerprint, ContentCountry
+)
+from versioning import bump_catalog_version
+from content_changes import CONTENT_FIELDS, apply_content_changes, rebuild_content_derived
 
+DATA_PATH = "data/netflix_titles.csv"
 
-def upload_data_from_csv(path):
-    # Очистка базы данных перед загрузкой
+# Увеличивается при изменении правил разбора CSV, чтобы следующий запуск перезагрузил данные
+LOADER_VERSION = 2
+
+# Количество строк в одном блоке чтения и в одном executemany
+BATCH_SIZE = 5000
+
+# Файлы меньшего размера разбираются в текущем процессе: запуск пула обходится дороже
+PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+
+# Ограничение на число параметров в одном IN (...) для SQLite
+IN_CHUNK_SIZE = 500
+
+DATE_FORMATS = ('%B %d, %Y', '%Y-%m-%d')
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.incremental = False
+        self.content_types = 0
+        self.countries = 0
+        self.ratings = 0
+        self.bad_dates = 0
+        self.bad_years = 0
+        self.bad_durations = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_errors(self, other):
+        self.bad_dates += other.bad_dates
+        self.bad_years += other.bad_years
+        self.bad_durations += other.bad_durations
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def __str__(self):
+        if self.incremental:
+            return (f"Обработано записей: {self.rows}, добавлено: {self.inserted}, "
+                    f"изменено: {self.updated}, удалено: {self.deleted}, "
+                    f"без изменений: {self.rows - self.inserted - self.updated} "
+                    f"за {self.elapsed:.2f} с; "
+                    f"ошибок разбора: дат {self.bad_dates}, годов {self.bad_years}, длительностей {self.bad_durations}")
+        return (f"Загружено записей: {self.rows} "
+                f"(типов: {self.content_types}, стран: {self.countries}, рейтингов: {self.ratings}) "
+                f"за {self.elapsed:.2f} с; "
+                f"ошибок разбора: дат {self.bad_dates}, годов {self.bad_years}, длительностей {self.bad_durations}")
+
+
+# Даты и длительности в каталоге сильно повторяются, поэтому результаты разбора кэшируются
+@lru_cache(maxsize=None)
+def parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    return None
+
+
+@lru_cache(maxsize=None)
+def parse_duration(value):
+    # Возвращает пару (минуты, сезоны)
+    try:
+        if 'min' in value:
+            return int(value.replace('min', '').strip()), None
+        if 'Season' in value:
+            return None, int(value.replace('Seasons', '').replace('Season', '').strip())
+    except ValueError:
+        pass
+    return None, None
+
+
+def row_fingerprint(row):
+    # Хэш исходной строки CSV; по нему инкрементальная загрузка находит изменившиеся записи
+    raw = '\x1f'.join(value or '' for value in row.values())
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def normalize_row(row, report):
+    # Приведение строки CSV к полям NetflixContent; справочники пока хранятся по названию
+    date_added = None
+    raw_date = row['date_added'].strip() if row['date_added'] else ''
+    if raw_date:
+        date_added = parse_date(raw_date)
+        if date_added is None:
+            report.bad_dates += 1
+
+    release_year = None
+    raw_year = row['release_year'].strip() if row['release_year'] else ''
+    if raw_year:
+        try:
+            release_year = int(raw_year)
+        except ValueError:
+            report.bad_years += 1
+
+    duration_minutes = None
+    duration_seasons = None
+    raw_duration = row['duration'].strip() if row['duration'] else ''
+    if raw_duration:
+        duration_minutes, duration_seasons = parse_duration(raw_duration)
+        if duration_minutes is None and duration_seasons is None:
+            report.bad_durations += 1
+
+    return {
+        'show_id': row['show_id'].strip(),
+        'title': row['title'].strip(),
+        'type_name': row['type'].strip() if row['type'] else 'Неизвестно',
+        'director': row['director'].strip() if row['director'] else None,
+        'cast': row['cast'].strip() if row['cast'] else None,
+        'country_name': row['country'].strip() if row['country'] else None,
+        'date_added': date_added,
+        'year_added': date_added.year if date_added else None,
+        'release_year': release_year,
+        'rating_name': row['rating'].strip() if row['rating'] else 'Не указан',
+        'duration_minutes': duration_minutes,
+        'duration_seasons': duration_seasons,
+        'listed_in': row['listed_in'].strip() if row['listed_in'] else None,
+        'description': row['description'].strip() if row['description'] else None,
+    }
+
+
+def normalize_chunk(raw_rows):
+    # Выполняется в процессах пула: разбор блока строк и подсчёт ошибок разбора
+    report = ImportReport()
+    rows = []
+    for raw_row in raw_rows:
+        row = normalize_row(raw_row, report)
+        row['row_hash'] = row_fingerprint(raw_row)
+        rows.append(row)
+    return rows, report
+
+
+def read_chunks(path, size=BATCH_SIZE):
+    # Потоковое чтение CSV блоками ограниченного размера
+    with open(path, 'r', encoding='utf-8') as f:
+        chunk = []
+        for raw_row in csv.DictReader(f):
+            chunk.append(raw_row)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def default_workers(path):
+    if os.path.getsize(path) < PARALLEL_MIN_BYTES:
+        return 1
+    return os.cpu_count() or 1
+
+
+def normalized_chunks(path, report, workers=None):
+    # Разобранные блоки в порядке следования в файле.
+    # В пул одновременно отправляется не больше 2 * workers блоков, поэтому память не растёт с размером файла.
+    if workers is None:
+        workers = default_workers(path)
+
+    if workers <= 1:
+        for raw_rows in read_chunks(path):
+            rows, chunk_report = normalize_chunk(raw_rows)
+            report.add_errors(chunk_report)
+            yield rows
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for raw_rows in read_chunks(path):
+            pending.append(executor.submit(normalize_chunk, raw_rows))
+            if len(pending) >= 2 * workers:
+                rows, chunk_report = pending.popleft().result()
+                report.add_errors(chunk_report)
+                yield rows
+        while pending:
+            rows, chunk_report = pending.popleft().result()
+            report.add_errors(chunk_report)
+            yield rows
+
+
+def load_dimension(model):
+    return dict(db.session.execute(select(model.name, model.identifier)).all())
+
+
+def resolve_dimension(model, names, known):
+    # Вставка недостающих значений справочника одним executemany; known пополняется новыми идентификаторами.
+    # Порядок вставки совпадает с порядком первого появления в файле.
+    missing = list(dict.fromkeys(name for name in names if name is not None and name not in known))
+    if missing:
+        db.session.execute(insert(model), [{'name': name} for name in missing])
+        for ids in chunked(missing, IN_CHUNK_SIZE):
+            known.update(db.session.execute(
+                select(model.name, model.identifier).where(model.name.in_(ids))
+            ).all())
+    return known
+
+
+def resolve_dimensions(rows, content_types, countries, ratings):
+    resolve_dimension(ContentType, (row['type_name'] for row in rows), content_types)
+    resolve_dimension(Country, (row['country_name'] for row in rows), countries)
+    resolve_dimension(Rating, (row['rating_name'] for row in rows), ratings)
+
+
+def resolve_row(row, content_types, countries, ratings):
+    # Замена названий справочников на идентификаторы
+    row = dict(row)
+    row.pop('row_hash', None)
+    row['type_id'] = content_types[row.pop('type_name')]
+    country_name = row.pop('country_name')
+    row['country_id'] = countries[country_name] if country_name else None
+    row['rating_id'] = ratings[row.pop('rating_name')]
+    return row
+
+
+def chunked(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def insert_content(rows, content_types, countries, ratings):
+    # render_nulls не даёт разбивать пакет на части по набору пустых полей
+    db.session.execute(insert(NetflixContent).execution_options(render_nulls=True), [
+        resolve_row(row, content_types, countries, ratings) for row in rows
+    ])
+    db.session.execute(insert(ContentFingerprint), [
+        {'show_id': row['show_id'], 'row_hash': row['row_hash']} for row in rows
+    ])
+
+
+def upload_data_from_csv(path, workers=None):
+    report = ImportReport()
+
+    # Очистка и загрузка выполняются в одной транзакции
+    db.session.query(ContentFingerprint).delete()
     db.session.query(NetflixContent).delete()
     db.session.query(ContentType).delete()
     db.session.query(Country).delete()
     db.session.query(Rating).delete()
+
+    content_types, countries, ratings = {}, {}, {}
+
+    # Блоки разбираются параллельно, а записывает их один писатель в порядке файла
+    for rows in normalized_chunks(path, report, workers):
+        resolve_dimensions(rows, content_types, countries, ratings)
+        insert_content(rows, content_types, countries, ratings)
+        report.rows += len(rows)
+
+    rebuild_content_derived(db.session.connection())
+    bump_catalog_version()
     db.session.commit()
 
-    content_types = {}
-    countries = {}
-    ratings = {}
+    report.content_types = len(content_types)
+    report.countries = len(countries)
+    report.ratings = len(ratings)
+    report.finish()
+    print("Данные успешно загружены в базу данных!")
+    print(report)
+    return report
 
-    with open(path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-
-        for row in reader:
-            # Обработка типа контента
-            type_name = row['type'].strip() if row['type'] else 'Неизвестно'
-            if type_name not in content_types:
-                content_type = ContentType(type_name)
-                db.session.add(content_type)
-                db.session.commit()
-                content_types[type_name] = content_type
-
-            # Обработка страны
-            country_name = row['country'].strip() if row['country'] else None
-            country_id = None
-            if country_name:
-                if country_name not in countries:
-                    country = Country(country_name)
-                    db.session.add(country)
-                    db.session.commit()
-                    countries[country_name] = country
-                country_id = countries[country_name].identifier
-
-            # Обработка рейтинга
-            rating_name = row['rating'].strip() if row['rating'] else 'Не указан'
-            if rating_name not in ratings:
-                rating = Rating(rating_name)
-                db.session.add(rating)
-                db.session.commit()
-                ratings[rating_name] = rating
-
-            # Обработка даты добавления
-            date_added = None
-            if row['date_added'] and row['date_added'].strip():
-                try:
-                    date_added = datetime.strptime(row['date_added'].strip(), '%B %d, %Y').date()
-                except ValueError:
-                    try:
-                        date_added = datetime.strptime(row['date_added'].strip(), '%Y-%m-%d').date()
-                    except ValueError:
-                        print(f"Не удалось обработать дату: {row['date_added']}")
-
-            # Обработка года выпуска
-            release_year = None
-            if row['release_year'] and row['release_year'].strip():
-                try:
-                    release_year = int(row['release_year'])
-                except ValueError:
-                    print(f"Не удалось обработать год: {row['release_year']}")
-
-            # Обработка длительности
-            duration_minutes = None
-            duration_seasons = None
-
-            if row['duration'] and row['duration'].strip():
-                duration = row['duration'].strip()
-                if 'min' in duration:
-                    try:
-                        duration_minutes = int(duration.replace('min', '').strip())
-                    except ValueError:
-                        print(f"Не удалось обработать длительность в минутах: {duration}")
-                elif 'Season' in duration or 'Seasons' in duration:
-                    try:
-                        duration_seasons = int(duration.replace('Seasons', '').replace('Season', '').strip())
-                    except ValueError:
-                        print(f"Не удалось обработать количество сезонов: {duration}")
-
-            # Добавление записи о контенте
-            content = NetflixContent(
-                show_id=row['show_id'].strip(),
-                title=row['title'].strip(),
-                type_id=content_types[type_name].identifier,
-                director=row['director'].strip() if row['director'] else None,
-                cast=row['cast'].strip() if row['cast'] else None,
-                country_id=country_id,
-                date_added=date_added,
-                release_year=release_year,
-                rating_id=ratings[rating_name].identifier,
-                duration_minutes=duration_minutes,
-                duration_seasons=duration_seasons
-            )
-            db.session.add(content)
-            print(f"Добавлен контент: {row['title']}")
 
+def sync_data_from_csv(path, workers=None):
+    # Инкрементальная загрузка: изменяются только записи, чей хэш строки отличается от сохранённого
+    report = ImportReport()
+    report.incremental = True
+
+    stored = dict(db.session.execute(select(ContentFingerprint.show_id, ContentFingerprint.row_hash)).all())
+    if not stored:
+        # Отпечатков ещё нет (база загружена старой версией) — нужна полная загрузка
+        return upload_data_from_csv(path, workers)
+
+    # Сравнение выполняется до начала записи, чтобы транзакция охватывала только изменения
+    inserted = []
+    updated = []
+    seen = set()
+    for rows in normalized_chunks(path, report, workers):
+        for row in rows:
+            report.rows += 1
+            show_id = row['show_id']
+            seen.add(show_id)
+            if stored.get(show_id) == row['row_hash']:
+                continue
+            (updated if show_id in stored else inserted).append(row)
+    deleted = [show_id for show_id in stored if show_id not in seen]
+
+    report.inserted = len(inserted)
+    report.updated = len(updated)
+    report.deleted = len(deleted)
+
+    if inserted or updated or deleted:
+        content_types = load_dimension(ContentType)
+        countries = load_dimension(Country)
+        ratings = load_dimension(Rating)
+        resolve_dimensions(inserted + updated, content_types, countries, ratings)
+
+        # Прежние значения изменяемых и удаляемых записей нужны для производных данных и поиска осиротевших справочников
+        previous = []
+        stale_countries = set()
+        for ids in chunked([row['show_id'] for row in updated] + deleted, IN_CHUNK_SIZE):
+            previous.extend(row._asdict() for row in db.session.execute(
+                select(*[getattr(NetflixContent, field) for field in CONTENT_FIELDS])
+                .where(NetflixContent.show_id.in_(ids))))
+            stale_countries.update(db.session.execute(
+                select(ContentCountry.country_id).where(ContentCountry.show_id.in_(ids))).scalars())
+        stale_types = {row['type_id'] for row in previous}
+        stale_countries.update(row['country_id'] for row in previous)
+        stale_ratings = {row['rating_id'] for row in previous}
+
+        for batch in chunked(inserted, BATCH_SIZE):
+            insert_content(batch, content_types, countries, ratings)
+
+        for batch in chunked(updated, BATCH_SIZE):
+            db.session.execute(update(NetflixContent), [
+                resolve_row(row, content_types, countries, ratings)
+                for row in batch
+            ])
+            db.session.execute(update(ContentFingerprint), [
+                {'show_id': row['show_id'], 'row_hash': row['row_hash']} for row in batch
+            ])
+
+        for ids in chunked(deleted, IN_CHUNK_SIZE):
+            db.session.execute(delete(NetflixContent).where(NetflixContent.show_id.in_(ids)))
+            db.session.execute(delete(ContentFingerprint).where(ContentFingerprint.show_id.in_(ids)))
+
+        apply_content_changes(db.session.connection(), removed=previous, added=[
+            resolve_row(row, content_types, countries, ratings) for row in inserted + updated
+        ])
+
+        # Справочники, на которые ссылались изменённые и удалённые записи, удаляются,
+        # только если на них больше никто не ссылается (страны — ещё и через ContentCountry)
+        for model, columns, stale in ((ContentType, (NetflixContent.type_id,), stale_types),
+                                      (Country, (NetflixContent.country_id, ContentCountry.country_id), stale_countries),
+                                      (Rating, (NetflixContent.rating_id,), stale_ratings)):
+            stale.discard(None)
+            for ids in chunked(stale, IN_CHUNK_SIZE):
+                db.session.execute(delete(model).where(
+                    model.identifier.in_(ids),
+                    *[~exists().where(column == model.identifier) for column in columns]
+                ))
+
+        bump_catalog_version()
         db.session.commit()
-        print("Данные успешно загружены в базу данных!")
 
-def init_data():
+    report.finish()
+    print(report)
+    return report
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def init_data(path=DATA_PATH, force=False, workers=None):
+    # Загрузка при старте выполняется, только если файл изменился с прошлой загрузки.
+    # Сначала сравниваются размер и время изменения, хэш содержимого считается только при расхождении.
+    init_database()
     with app.app_context():
-        upload_data_from_csv("data/netflix_titles.csv")
+        stat = os.stat(path)
+        source = db.session.get(SourceFingerprint, path)
+        if not force and source is not None and source.loader_version == LOADER_VERSION:
+            if source.size == stat.st_size and source.mtime == stat.st_mtime:
+                print("Файл данных не изменился, загрузка пропущена")
+                return None
+            content_hash = file_hash(path)
+            if source.content_hash == content_hash:
+                source.size = stat.st_size
+                source.mtime = stat.st_mtime
+                db.session.commit()
+                print("Файл данных не изменился, загрузка пропущена")
+                return None
+        else:
+            content_hash = file_hash(path)
+
+        if force or source is None or source.loader_version != LOADER_VERSION:
+            report = upload_data_from_csv(path, workers)
+        else:
+            report = sync_data_from_csv(path, workers)
+
+        db.session.merge(SourceFingerprint(path, stat.st_size, stat.st_mtime, content_hash, LOADER_VERSION))
+        db.session.commit()
+        return report
+
+
+# flask --app app reload-data [--force]
+@app.cli.command('reload-data')
+@click.option('--path', default=DATA_PATH, help='Путь к CSV-файлу каталога')
+@click.option('--force', is_flag=True, help='Полная перезагрузка, даже если файл не изменился')
+@click.option('--workers', type=int, default=None,
+              help='Число процессов для разбора CSV (по умолчанию зависит от размера файла)')
+def reload_data_command(path, force, workers):
+    init_data(path, force=force, workers=workers)
+
 
-# Загрузка данных в таблицы
-with app.app_context():
-    upload_data_from_csv("data/netflix_titles.csv")
+if __name__ == "__main__":
+    init_data(force=True)
@@ -0,0 +1,56 @@
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from models import db, CatalogVersion
+
+# Версия каталога хранится в единственной строке таблицы
+CATALOG_VERSION_ID = 1
+
+# Области каталога, которые затрагивает изменение
+CONTENT = 'content'
+CONTENT_TYPES = 'content_types'
+COUNTRIES = 'countries'
+RATINGS = 'ratings'
+ALL_SCOPES = (CONTENT, CONTENT_TYPES, COUNTRIES, RATINGS)
+
+# Функции listener(version, scopes), вызываемые после commit изменения каталога
+change_listeners = []
+
+
+def on_catalog_change(listener):
+    change_listeners.append(listener)
+    return listener
+
+
+def bump_catalog_version(*scopes):
+    # Вызывается перед commit в каждом изменяющем обработчике и при загрузке CSV,
+    # чтобы новая версия стала видна вместе с изменениями.
+    # scopes — затронутые области; без аргументов считается, что изменилось всё.
+    statement = insert(CatalogVersion).values(identifier=CATALOG_VERSION_ID, version=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=[CatalogVersion.identifier],
+        set_={CatalogVersion.version: CatalogVersion.version + 1}
+    ).returning(CatalogVersion.version)
+    version = db.session.execute(statement).scalar()
+    db.session.info.setdefault('catalog_changes', []).append((version, frozenset(scopes or ALL_SCOPES)))
+    return version
+
+
+def get_catalog_version(connection=None):
+    # connection — соединение вне сессии запроса (фоновые построения читают версию в своей транзакции)
+    version = (connection if connection is not None else db.session).execute(
+        select(CatalogVersion.version).where(CatalogVersion.identifier == CATALOG_VERSION_ID)
+    ).scalar()
+    return version or 0
+
+
+@event.listens_for(Session, 'after_commit')
+def notify_catalog_change(session):
+    for version, scopes in session.info.pop('catalog_changes', ()):
+        for listener in change_listeners:
+            listener(version, scopes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_catalog_change(session):
+    session.info.pop('catalog_changes', None)